@@ -0,0 +1,107 @@
+"""
+Cache for the summarization LLM call, keyed on what the answer depends on.
+
+The key is (intent, linked entities, hash of the DB rows) for template routes,
+and (Cypher, params, row hash) for LLM-generated queries, so paraphrases of
+the same question that return the same rows share one summarized answer.
+Entries are evicted LRU beyond max_entries and dropped whenever the graph
+version changes.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+CJK_CHARS = re.compile(r'[　-〿㐀-鿿＀-￯]')
+
+
+def result_hash(rows):
+    """Order-sensitive hash of a result set (rows are dicts or scalars)."""
+    payload = json.dumps(rows, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def estimate_tokens(text):
+    """Rough token count when the API reports no usage: one per CJK character, ~4 characters per token otherwise."""
+    cjk = len(CJK_CHARS.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def answer_key(intent, entities, rows, cypher=None, params=None):
+    if intent:
+        parts = [intent, sorted(entities or ())]
+    else:
+        parts = [None, cypher, params]
+    parts.append(result_hash(rows))
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class AnswerCache:
+    """
+    In-memory LRU of summarized answers.
+
+    version is an optional callable returning the current graph version; it is
+    polled at most every check_interval seconds and a change clears the cache.
+    """
+
+    def __init__(self, max_entries=2048, version=None, check_interval=5.0):
+        self.max_entries = max_entries
+        self.version_source = version
+        self.check_interval = check_interval
+        self.version = None
+        self.checked_at = None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0, 'tokens_saved': 0}
+
+    def _check_version(self):
+        if self.version_source is None:
+            return
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < self.check_interval:
+            return
+        self.checked_at = now
+        self.set_version(self.version_source())
+
+    def set_version(self, version):
+        """Clear the cache when the graph version differs from the one the entries were built on."""
+        with self.lock:
+            if version == self.version:
+                return
+            if self.entries:
+                self.stats['invalidations'] += 1
+            self.entries.clear()
+            self.version = version
+
+    def get(self, key):
+        self._check_version()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            self.stats['tokens_saved'] += entry[1]
+            return entry[0]
+
+    def put(self, key, answer, tokens=None, prompt=''):
+        """Store an answer; tokens is the call's total usage, estimated from prompt + answer when None."""
+        if tokens is None:
+            tokens = estimate_tokens(prompt) + estimate_tokens(answer)
+        self._check_version()
+        with self.lock:
+            self.entries[key] = (answer, tokens)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def metrics(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return dict(self.stats,
+                    hit_ratio=self.stats['hits'] / lookups if lookups else 0.0,
+                    entries=len(self.entries),
+                    version=self.version)
@@ -0,0 +1,432 @@
+"""
+Asyncio QA service: many questions in flight at once.
+
+Uses the async OpenAI client and the neo4j AsyncGraphDatabase driver. A semaphore
+bounds concurrency, every stage has its own timeout, and rate-limited or dropped
+LLM calls are retried with backoff (honouring Retry-After). Results stream back
+in completion order, so a batch of N questions takes roughly
+N / concurrency round trips instead of the sum of them.
+"""
+import argparse
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+
+from neo4j import AsyncGraphDatabase, Query
+from openai import APIConnectionError, APITimeoutError, AsyncOpenAI, InternalServerError, RateLimitError
+
+from answer_cache import AnswerCache, answer_key
+from context_pack import ContextPacker
+from cypher_cache import CypherCache, cache_path
+from cypher_guard import CypherGuard, GuardError, feedback_prompt
+from entity_index import EntityIndex, format_entities, rewrite_cypher
+from graph_backend import Neo4jBackend
+from graph_pool import template_result, template_statement, traversal_result
+from graph_stats import render
+from intent_router import DIAGNOSIS, IntentRouter
+from qa_engine import ANSWER_GENERATION_PROMPT, CYPHER_GENERATION_PROMPT
+from telemetry import Telemetry, log, openai_usage, render_metrics, serve_metrics, setup_logging
+from neo4j_llm_interface import API_KEY, BASE_URL, GRAPH_SCHEMA, NEO4J_PASSWORD, NEO4J_URI, NEO4J_USER
+
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+
+class AsyncQAService:
+    def __init__(self, neo4j_uri, neo4j_user, neo4j_password, api_key, base_url, model="qwen-plus",
+                 concurrency=16, llm_timeout=30.0, db_timeout=10.0, max_retries=4, backoff=0.5,
+                 database=None, schema=GRAPH_SCHEMA, router=None, cypher_cache=None, answer_cache=None,
+                 entity_index=None, guard=None, telemetry=None, packer=None, disease_count=None):
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self.driver = AsyncGraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+        self.model = model
+        self.database = database
+        self.schema = schema
+        # Diagnosis IDF weights use the graph's Disease count, as GraphQA does (None: the diseases listed)
+        self.disease_count = disease_count
+        self.concurrency = concurrency
+        self.llm_timeout = llm_timeout
+        self.db_timeout = db_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.router = router or IntentRouter.from_csv()
+        # The schema is fixed for the process; GRAPH_SCHEMA (statistics unreadable) keeps the entries of the real one
+        self.cypher_cache = cypher_cache or CypherCache(schema=schema, path=cache_path("async"),
+                                                        purge=schema != GRAPH_SCHEMA)
+        self.answer_cache = answer_cache or AnswerCache()
+        self.entity_index = entity_index or EntityIndex.from_csv()
+        # Fits the rows into the answer prompt's token budget
+        self.packer = packer or ContextPacker.from_csv()
+        # Plans are checked here with the async driver, so the guard itself has no explain callable
+        self.guard = guard or CypherGuard(timeout=db_timeout)
+        self.semaphore = None
+        # Spans live in a contextvar, so concurrent questions keep separate trees
+        self.telemetry = telemetry or Telemetry("async")
+
+    async def close(self):
+        await self.driver.close()
+        await self.client.close()
+        await asyncio.to_thread(self.cypher_cache.close)
+
+    async def _create(self, prompt, temperature, stream=False):
+        """chat.completions.create with a timeout and retries; a stream is retried only until it opens."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await asyncio.wait_for(
+                    self.client.chat.completions.create(
+                        model=self.model,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=temperature,
+                        stream=stream
+                    ),
+                    timeout=self.llm_timeout
+                )
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                response = getattr(e, 'response', None)
+                retry_after = response.headers.get('retry-after') if response is not None else None
+                if retry_after:
+                    try:
+                        delay = max(delay, float(retry_after))
+                    except ValueError:
+                        pass
+                await asyncio.sleep(delay)
+
+    async def generate_cypher(self, question, feedback=""):
+        with self.telemetry.span("entity_link"):
+            entities = format_entities(self.entity_index.link(question))
+        prompt = CYPHER_GENERATION_PROMPT.format(schema=self.schema, question=question, entities=entities,
+                                                 feedback=feedback)
+        with self.telemetry.span("cypher_llm", retry=bool(feedback)):
+            response = await self._create(prompt, temperature=0)
+            self.telemetry.llm_usage("cypher", *openai_usage(response))
+        cypher = response.choices[0].message.content.strip()
+        cypher = cypher.replace("```cypher", "").replace("```", "").strip()
+        return rewrite_cypher(cypher, self.entity_index)
+
+    async def explain(self, cypher, params=None):
+        async with self.driver.session(database=self.database) as session:
+            result = await session.run("EXPLAIN " + cypher, params)
+            return (await result.consume()).plan
+
+    async def _check(self, cypher):
+        with self.telemetry.span("guard"):
+            text = self.guard.validate(cypher)
+            self.guard.check_plan(await asyncio.wait_for(self.explain(text), timeout=self.db_timeout))
+            return text
+
+    async def guarded_cypher(self, question, cypher, llm_seconds=None):
+        """
+        Guard-approved query text; a rejected query gets one regeneration with the reason as feedback.
+
+        As in GraphQA, LLM text is cached only once approved, as the guard returned it.
+        """
+        try:
+            text = await self._check(cypher)
+        except GuardError as e:
+            log.warning(f"[Guard] Rejected generated Cypher: {e}")
+            await asyncio.to_thread(self.cypher_cache.invalidate, question)
+            start = time.perf_counter()
+            cypher = await self.generate_cypher(question, feedback=feedback_prompt(cypher, e))
+            llm_seconds = (llm_seconds or 0.0) + time.perf_counter() - start
+            text = await self._check(cypher)
+        if llm_seconds is not None:
+            await asyncio.to_thread(self.cypher_cache.put, question, text, llm_seconds=llm_seconds)
+        return text
+
+    async def question_cypher(self, question):
+        """Guard-approved Cypher for a question: the cached text, or LLM-generated."""
+        cached = await asyncio.to_thread(self.cypher_cache.get, question)
+        self.telemetry.cache("cypher", cached is not None)
+        if cached:
+            return await self.guarded_cypher(question, cached)
+        start = time.perf_counter()
+        cypher = await self.generate_cypher(question)
+        return await self.guarded_cypher(question, cypher, llm_seconds=time.perf_counter() - start)
+
+    async def execute_cypher(self, cypher, params=None):
+        async def run():
+            async with self.driver.session(database=self.database) as session:
+                result = await session.run(cypher, params)
+                return [record.data() async for record in result]
+        with self.telemetry.span("db"):
+            rows = await asyncio.wait_for(run(), timeout=self.db_timeout)
+            self.telemetry.rows(len(rows))
+            return rows
+
+    async def template_rows(self, route):
+        """
+        Rows of a template route, read and ranked as graph_pool.template_rows_batch does for GraphQA.
+
+        Symptom -> disease and diagnosis reads use the precomputed Symptom.diseases
+        lists, with the traversal template on graphs imported without them.
+        """
+        params = dict(route.params, total=self.disease_count) if route.intent == DIAGNOSIS else route.params
+        rows = template_result(route.intent, params,
+                               await self.execute_cypher(*template_statement(route.intent, params)))
+        if rows is None:
+            rows = traversal_result(route.intent, params,
+                                    await self.execute_cypher(*template_statement(route.intent, params, True)))
+        return rows
+
+    def pack(self, question, rows):
+        context = self.packer.pack(rows, question)
+        self.telemetry.context(context.tokens, context.baseline_tokens)
+        return context
+
+    async def generate_answer(self, question, context, key=None):
+        """Summarize a PackedContext; with an answer-cache key, reuse or store the answer under it."""
+        if key is not None:
+            cached = await asyncio.to_thread(self.answer_cache.get, key)
+            self.telemetry.cache("answer", cached is not None)
+            if cached is not None:
+                return cached
+        prompt = ANSWER_GENERATION_PROMPT.format(question=question, context=context.text)
+        with self.telemetry.span("answer_llm"):
+            response = await self._create(prompt, temperature=0)
+            self.telemetry.llm_usage("answer", *openai_usage(response))
+        answer = response.choices[0].message.content.strip()
+        if key is not None:
+            await asyncio.to_thread(self.answer_cache.put, key, answer,
+                                    response.usage.total_tokens if response.usage else None, prompt=prompt)
+        return answer
+
+    async def stream_answer(self, question, context, key=None):
+        """Async iterator over answer text chunks as the LLM produces them; a cached answer is one chunk."""
+        if key is not None:
+            cached = await asyncio.to_thread(self.answer_cache.get, key)
+            self.telemetry.cache("answer", cached is not None)
+            if cached is not None:
+                yield cached
+                return
+        prompt = ANSWER_GENERATION_PROMPT.format(question=question, context=context.text)
+        chunks = []
+        with self.telemetry.span("answer_llm", stream=True):
+            stream = await self._create(prompt, temperature=0, stream=True)
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    chunks.append(chunk.choices[0].delta.content)
+                    yield chunks[-1]
+        if key is not None:
+            await asyncio.to_thread(self.answer_cache.put, key, "".join(chunks).strip(), prompt=prompt)
+
+    async def answer(self, question):
+        """Answer one question; failures are reported in the result instead of raised."""
+        result = {"question": question, "cypher": None, "params": None, "intent": None,
+                  "rows": None, "result": None, "error": None, "timings": {}}
+        timings = result["timings"]
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with self.semaphore, self._question(question) as root:
+            started = time.perf_counter()
+            stage = "cypher"
+            try:
+                with self.telemetry.span("route"):
+                    route = self.router.route(question)
+                if route:
+                    result.update(cypher=route.cypher, params=route.params, intent=route.intent)
+                else:
+                    result["cypher"] = await self.question_cypher(question)
+                timings["cypher"] = time.perf_counter() - started
+
+                stage = "db"
+                t = time.perf_counter()
+                if route:
+                    result["rows"] = await self.template_rows(route)
+                else:
+                    result["rows"] = await self.execute_cypher(Query(result["cypher"], timeout=self.guard.timeout))
+                timings["db"] = time.perf_counter() - t
+
+                stage = "answer"
+                t = time.perf_counter()
+                context = self.pack(question, result["rows"])
+                key = (answer_key(route.intent, route.entities, context.rows) if route
+                       else answer_key(None, (), context.rows, result["cypher"], None))
+                result["result"] = await self.generate_answer(question, context, key)
+                timings["answer"] = time.perf_counter() - t
+            except asyncio.TimeoutError:
+                result["error"] = f"{stage} timed out"
+            except Exception as e:
+                result["error"] = f"{stage}: {e.__class__.__name__}: {e}"
+            if result["error"]:
+                root.status = f"error: {result['error']}"
+            timings["total"] = time.perf_counter() - started
+        return result
+
+    async def answer_stream(self, question):
+        """
+        Answer one question as an async stream of events.
+
+        Same events as MedicalKnowledgeGraphQA.query_stream: "cypher", "rows", one
+        "token" per answer chunk, then "done" with per-stage timings including
+        first_token, or "error" as the last event.
+        """
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with self.semaphore, self._question(question) as root:
+            started = time.perf_counter()
+            timings = {}
+            stage = "cypher"
+            try:
+                with self.telemetry.span("route"):
+                    route = self.router.route(question)
+                if route:
+                    cypher, params, intent = route.cypher, route.params, route.intent
+                else:
+                    cypher = await self.question_cypher(question)
+                    params, intent = None, None
+                timings["cypher"] = time.perf_counter() - started
+                yield {"event": "cypher", "elapsed": timings["cypher"], "cypher": cypher, "params": params,
+                       "intent": intent}
+
+                stage = "db"
+                t = time.perf_counter()
+                if route:
+                    rows = await self.template_rows(route)
+                else:
+                    rows = await self.execute_cypher(Query(cypher, timeout=self.guard.timeout))
+                timings["db"] = time.perf_counter() - t
+                yield {"event": "rows", "elapsed": time.perf_counter() - started, "rows": rows}
+
+                stage = "answer"
+                t = time.perf_counter()
+                chunks = []
+                context = self.pack(question, rows)
+                key = (answer_key(intent, route.entities, context.rows) if route
+                       else answer_key(None, (), context.rows, cypher, None))
+                async for text in self.stream_answer(question, context, key):
+                    if not chunks:
+                        timings["first_token"] = time.perf_counter() - started
+                        self.telemetry.observe("first_token", timings["first_token"])
+                    chunks.append(text)
+                    yield {"event": "token", "elapsed": time.perf_counter() - started, "text": text}
+                timings["answer"] = time.perf_counter() - t
+                timings["total"] = time.perf_counter() - started
+                yield {"event": "done", "elapsed": timings["total"], "answer": "".join(chunks).strip(),
+                       "timings": timings}
+            except asyncio.TimeoutError:
+                root.status = f"error: {stage} timed out"
+                yield {"event": "error", "elapsed": time.perf_counter() - started, "stage": stage,
+                       "error": f"{stage} timed out"}
+            except Exception as e:
+                root.status = f"error: {e.__class__.__name__}"
+                yield {"event": "error", "elapsed": time.perf_counter() - started, "stage": stage,
+                       "error": f"{e.__class__.__name__}: {e}"}
+
+    @asynccontextmanager
+    async def _question(self, question):
+        """Telemetry.question() for async code (the sync context manager is entered and exited around the body)."""
+        with self.telemetry.question(question) as root:
+            yield root
+
+    async def stream(self, questions):
+        """Yield results as they complete."""
+        tasks = [asyncio.ensure_future(self.answer(q)) for q in questions]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def answer_batch(self, questions):
+        """All results, in the order of the input questions."""
+        return await asyncio.gather(*(self.answer(q) for q in questions))
+
+
+async def run_batch(service, questions):
+    start = time.perf_counter()
+    done = 0
+    failed = 0
+    async for result in service.stream(questions):
+        done += 1
+        if result["error"]:
+            failed += 1
+            log.info(f"[{done}/{len(questions)}] ✗ {result['question']}: {result['error']}")
+        else:
+            log.info(f"[{done}/{len(questions)}] ✓ {result['question']} ({result['timings']['total']:.2f}s)")
+    elapsed = time.perf_counter() - start
+    log.info(f"\n{done} questions in {elapsed:.2f}s ({done / elapsed:.1f} q/s, "
+             f"concurrency {service.concurrency}, {failed} failed)")
+    log.info(f"Answer cache: {await asyncio.to_thread(service.answer_cache.metrics)}")
+
+
+async def run_stream(service, question):
+    """Print one answer as it is generated, then the time to first token."""
+    async for event in service.answer_stream(question):
+        if event["event"] == "cypher":
+            print(f"Cypher: {event['cypher']}  params={event['params']}")
+        elif event["event"] == "rows":
+            print(f"{len(event['rows'])} rows after {event['elapsed']:.2f}s")
+        elif event["event"] == "token":
+            print(event["text"], end="", flush=True)
+        elif event["event"] == "done":
+            timings = event["timings"]
+            print(f"\nfirst token {timings.get('first_token', timings['total']):.2f}s, total {timings['total']:.2f}s")
+        else:
+            print(f"✗ {event['stage']}: {event['error']}")
+
+
+def load_stats(neo4j_uri, neo4j_user=NEO4J_USER, neo4j_password=NEO4J_PASSWORD):
+    """The measured graph statistics (cached per graph version), or None if unreadable."""
+    backend = None
+    try:
+        backend = Neo4jBackend(neo4j_uri, neo4j_user, neo4j_password, pool_size=1, warmup=False)
+        return backend.graph_stats()
+    except Exception as e:
+        log.error(f"Schema fetch failed: {e}")
+        return None
+    finally:
+        if backend:
+            backend.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a batch of questions concurrently")
+    parser.add_argument("questions", nargs="?", help="text file with one question per line")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--api-key", default=API_KEY)
+    parser.add_argument("--neo4j-uri", default=NEO4J_URI)
+    parser.add_argument("--stream", action="store_true", help="stream each answer's tokens instead of batching")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port while running")
+    parser.add_argument("--trace-log", help="append logs and one span tree per question to this JSONL file")
+    args = parser.parse_args()
+    setup_logging(jsonl_path=args.trace_log)
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    else:
+        questions = ["宫外孕有哪些症状？", "腰椎间盘突出的症状有哪些？", "哪些疾病会导致胃疼？"]
+
+    # Prompt schema and Disease count from the statistics; GRAPH_SCHEMA if they cannot be read
+    stats = load_stats(args.neo4j_uri)
+    schema = render(stats) if stats else GRAPH_SCHEMA
+    disease_count = stats['nodes'].get('Disease', {}).get('count') if stats else None
+
+    async def run():
+        service = AsyncQAService(args.neo4j_uri, NEO4J_USER, NEO4J_PASSWORD, args.api_key, args.base_url,
+                                 concurrency=args.concurrency, schema=schema, disease_count=disease_count)
+        try:
+            if args.stream:
+                for question in questions:
+                    print(f"\n{question}")
+                    await run_stream(service, question)
+            else:
+                await run_batch(service, questions)
+        finally:
+            await service.close()
+        log.debug(render_metrics())
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
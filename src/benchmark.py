@@ -0,0 +1,527 @@
+"""
+Offline benchmark for the QA pipeline and both importers.
+
+Nothing leaves the machine: the LLM is llm_stub.StubLLMServer (deterministic
+replies, configurable latency) and the graph is graph_backend.MemoryBackend over
+GraphSnapshot.from_csv(data/). MedicalKnowledgeGraphQA answers the labelled
+question set in data/benchmark_questions.jsonl through query_stream() from a
+thread pool; per-stage latencies come from the span trees telemetry logs for
+each question. The importers write into recording stand-ins for py2neo and the
+neo4j driver that charge a simulated round trip per batch, which measures the
+client side (CSV parsing, batching) at a fixed server cost. Their reads return
+no rows, so the importers' read-back passes cost one round trip each.
+
+Replica routing is measured against stand-in endpoints (MemoryBackend with a
+latency profile: a steady one, one with a slow tail, one that drops out
+half-way): template reads through a single endpoint, through ReplicaBackend
+without hedging, and with hedging.
+
+Diagnosis ranking is measured on the snapshot: symptom sets drawn from
+diseases with at least three symptoms, timed per ranking, with the share of
+sets whose source disease makes the top k.
+
+The report (throughput, p50/p95/p99 per stage, accuracy, import rows/sec,
+replica read latency) is printed, optionally written as JSON, and compared
+with a stored baseline.
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from neo4j.exceptions import ServiceUnavailable
+
+from intent_router import DATA_DIR
+from llm_stub import StubLLM, StubLLMServer, load_gold
+from telemetry import trace_log
+
+QUESTIONS_PATH = os.path.join(DATA_DIR, "benchmark_questions.jsonl")
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cache", "benchmark_baseline.json")
+
+# Context rows the QA classes pass to the summary, and the template LIMIT the gold answers are cut to
+RESULT_LIMIT = 20
+PERCENTILES = (50, 95, 99)
+STAGE_ORDER = ('route', 'entity_link', 'cypher_llm', 'guard', 'db', 'answer_llm', 'first_token', 'total')
+
+
+class WriteRecorder:
+    """Shared bookkeeping of the importer stand-ins: a round trip per batch plus a per-row cost."""
+
+    def __init__(self, batch_latency=0.005, row_latency=0.0):
+        self.batch_latency = batch_latency
+        self.row_latency = row_latency
+        self.batches = 0
+        self.rows = 0
+
+    def write(self, params):
+        rows = params.get('rows') if 'rows' in params else next(iter(params.values()), [])
+        self.batches += 1
+        self.rows += len(rows)
+        time.sleep(self.batch_latency + self.row_latency * len(rows))
+
+
+class RecordingPy2neoGraph(WriteRecorder):
+    """The part of py2neo.Graph that import_to_neo4j.import_bulk uses."""
+
+    class Cursor:
+        def data(self):
+            return []
+
+    class Transaction:
+        def __init__(self, graph):
+            self.graph = graph
+
+        def run(self, query, parameters=None):
+            self.graph.write(parameters or {})
+
+    def begin(self):
+        return self.Transaction(self)
+
+    def run(self, query, parameters=None, **kwparameters):
+        time.sleep(self.batch_latency)
+        return self.Cursor()
+
+    def commit(self, tx):
+        pass
+
+
+class RecordingDriver(WriteRecorder):
+    """The part of a neo4j driver that TuGraphImporter.import_data uses."""
+
+    class Result:
+        def consume(self):
+            return None
+
+        def data(self):
+            return []
+
+    class Transaction:
+        def __init__(self, recorder):
+            self.recorder = recorder
+
+        def run(self, cypher, params=None):
+            self.recorder.write(params or {})
+            return RecordingDriver.Result()
+
+        def commit(self):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    class Session:
+        def __init__(self, recorder):
+            self.recorder = recorder
+
+        def begin_transaction(self):
+            return RecordingDriver.Transaction(self.recorder)
+
+        def run(self, cypher, params=None, **kwparams):
+            time.sleep(self.recorder.batch_latency)
+            return RecordingDriver.Result()
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    def session(self, database=None):
+        return self.Session(self)
+
+    def close(self):
+        pass
+
+
+class TraceCollector(logging.Handler):
+    """Collects the span tree telemetry logs for each finished question."""
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.traces = []
+        self.saved_level = None
+
+    def emit(self, record):
+        trace = getattr(record, 'trace', None)
+        if trace is not None:
+            self.traces.append(trace)
+
+    def __enter__(self):
+        self.saved_level = trace_log.level
+        trace_log.setLevel(logging.INFO)
+        trace_log.addHandler(self)
+        return self
+
+    def __exit__(self, *exc):
+        trace_log.removeHandler(self)
+        trace_log.setLevel(self.saved_level)
+
+    def stage_seconds(self):
+        """{stage: [seconds, ...]} over every span of every collected trace."""
+        stages = {}
+
+        def walk(span):
+            if span['duration'] is not None:
+                stages.setdefault(span['name'], []).append(span['duration'])
+            for child in span['children']:
+                walk(child)
+
+        for trace in self.traces:
+            walk(trace)
+        return stages
+
+
+def load_questions(path=QUESTIONS_PATH):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def latency_summary(seconds):
+    values = np.asarray(seconds, dtype=float) * 1000
+    summary = {'count': int(len(values)), 'mean_ms': float(values.mean())}
+    summary.update({f'p{p}_ms': float(np.percentile(values, p)) for p in PERCENTILES})
+    return summary
+
+
+def result_names(rows):
+    return [next(iter(row.values())) for row in rows]
+
+
+def score(item, events):
+    """(route correct, answer correct) for one question's event list."""
+    by_type = {event['event']: event for event in events}
+    if 'error' in by_type or 'rows' not in by_type:
+        return False, False
+    route_ok = (by_type['cypher']['intent'] is not None) == (item['route'] == 'template')
+    returned = set(result_names(by_type['rows']['rows']))
+    expected = set(item['answers'])
+    return route_ok, returned <= expected and len(returned) == min(len(expected), RESULT_LIMIT)
+
+
+def bench_qa(questions, repeat=3, concurrency=8, llm_latency=0.2, token_latency=0.005, jitter=0.0,
+             db_latency=0.002, seed=0, questions_path=QUESTIONS_PATH):
+    """Run the question set `repeat` times through MedicalKnowledgeGraphQA against the stand-ins."""
+    from cypher_cache import CypherCache
+    from cypher_guard import CypherGuard
+    from graph_backend import MemoryBackend
+    from neo4j_llm_interface import MedicalKnowledgeGraphQA
+    from telemetry import Telemetry
+
+    graph = MemoryBackend.from_csv(latency=db_latency)
+    llm = StubLLM(load_gold(questions_path), llm_latency, token_latency, jitter, seed=seed)
+    with StubLLMServer(llm) as server, TraceCollector() as collector:
+        qa = MedicalKnowledgeGraphQA("bolt://127.0.0.1:7687", "neo4j", "", "stub", server.base_url,
+                                     cypher_cache=CypherCache(schema=graph.schema(detail=False), path=':memory:'),
+                                     guard=CypherGuard(explain=graph.explain), telemetry=Telemetry("benchmark"),
+                                     backend=graph)
+
+        items = questions * repeat
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(lambda item: list(qa.query_stream(item['question'])), items))
+        finally:
+            wall = time.perf_counter() - started
+            qa.close()
+
+    scores = [score(item, events) for item, events in zip(items, results)]
+    errors = [events[-1]['error'] for events in results if events[-1]['event'] == 'error']
+    stages = collector.stage_seconds()
+    first_tokens = [events[-1]['timings']['first_token'] for events in results
+                    if events[-1]['event'] == 'done' and 'first_token' in events[-1]['timings']]
+    if first_tokens:
+        stages['first_token'] = first_tokens
+    return {
+        'questions': len(items),
+        'errors': len(errors),
+        'error_samples': errors[:3],
+        'wall_seconds': wall,
+        'throughput_qps': len(items) / wall if wall > 0 else 0.0,
+        'route_accuracy': sum(route for route, _ in scores) / len(items),
+        'answer_accuracy': sum(answer for _, answer in scores) / len(items),
+        'cypher_cache': qa.cypher_cache.metrics(),
+        'answer_cache': qa.answer_cache.metrics(),
+        'context': qa.packer.metrics(),
+        'backends': qa.backend_stats(),
+        'llm': dict(llm.stats),
+        'stages': {stage: latency_summary(stages[stage])
+                   for stage in sorted(stages, key=lambda s: (STAGE_ORDER + (s,)).index(s))},
+    }
+
+
+class StandInEndpoint:
+    """
+    Latency profile and outage switch for a MemoryBackend used as one graph endpoint.
+
+    Each call sleeps `latency`, or `tail_latency` with probability `tail`;
+    after `fail_after` calls it raises ServiceUnavailable like a node that went away.
+    """
+
+    def __init__(self, snapshot, name, latency, tail=0.0, tail_latency=0.0, fail_after=None, seed=0):
+        from graph_backend import MemoryBackend
+
+        self.backend = MemoryBackend(snapshot, name=name)
+        self.backend._wait = self.wait
+        self.latency = latency
+        self.tail = tail
+        self.tail_latency = tail_latency
+        self.fail_after = fail_after
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def wait(self):
+        with self.lock:
+            self.calls += 1
+            calls = self.calls
+            slow = self.rng.random() < self.tail
+        if self.fail_after is not None and calls > self.fail_after:
+            raise ServiceUnavailable(f"{self.backend.name} is down")
+        time.sleep(self.tail_latency if slow else self.latency)
+
+
+def bench_replicas(reads=600, concurrency=8, latency=0.002, tail=0.05, tail_latency=0.05, seed=0):
+    """p50/p95/p99 of template reads: one endpoint vs ReplicaBackend without and with hedging."""
+    from graph_backend import ReplicaBackend
+    from graph_snapshot import GraphSnapshot
+    from intent_router import DISEASE_SYMPTOMS, SYMPTOM_DISEASES
+
+    snapshot = GraphSnapshot.from_csv(DATA_DIR)
+    requests = [(DISEASE_SYMPTOMS, {'name': name}) for name in snapshot.diseases[:50]]
+    requests += [(SYMPTOM_DISEASES, {'name': name}) for name in snapshot.symptoms[:50]]
+    requests = [requests[i % len(requests)] for i in range(reads)]
+
+    def endpoints():
+        # The primary has the slow tail; one replica is steady, the other drops out part-way through
+        return [StandInEndpoint(snapshot, 'primary', latency, tail, tail_latency, seed=seed).backend,
+                StandInEndpoint(snapshot, 'replica-1', latency * 1.5, seed=seed + 1).backend,
+                StandInEndpoint(snapshot, 'replica-2', latency, tail / 2, tail_latency, fail_after=reads // 6,
+                                seed=seed + 2).backend]
+
+    setups = [
+        ('single', lambda: endpoints()[0]),
+        ('routed', lambda: ReplicaBackend(endpoints(), hedge=False, cooldown=60)),
+        ('hedged', lambda: ReplicaBackend(endpoints(), hedge=True, cooldown=60, hedge_min=latency * 2)),
+    ]
+    report = {}
+    for name, build in setups:
+        backend = build()
+        errors = 0
+
+        def read(request):
+            nonlocal errors
+            start = time.perf_counter()
+            try:
+                backend.template_rows(*request)
+            except ServiceUnavailable:
+                errors += 1
+            return time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            seconds = list(pool.map(read, requests))
+        report[name] = dict(latency_summary(seconds), errors=errors)
+        if isinstance(backend, ReplicaBackend):
+            report[name]['endpoints'] = backend.stats()
+        backend.close()
+    return report
+
+
+def bench_diagnosis(queries=500, symptoms=3, k=10, seed=0):
+    """Latency of GraphSnapshot.rank_diseases and how often the disease a symptom set came from ranks in the top k."""
+    from graph_snapshot import GraphSnapshot
+
+    snapshot = GraphSnapshot.from_csv(DATA_DIR)
+    rng = np.random.default_rng(seed)
+    sources = [name for name in snapshot.diseases if len(snapshot.symptoms_of(name)) >= symptoms]
+    seconds = []
+    hits = 0
+    for name in rng.choice(sources, size=queries):
+        sample = list(rng.choice(snapshot.symptoms_of(name), size=symptoms, replace=False))
+        start = time.perf_counter()
+        rows = snapshot.rank_diseases(sample, k)
+        seconds.append(time.perf_counter() - start)
+        hits += any(row['d.name'] == name for row in rows)
+    return dict(latency_summary(seconds), queries=queries, symptoms=symptoms, k=k,
+                candidates=len(sources), hit_rate=hits / queries if queries else 0.0)
+
+
+def bench_imports(batch_latency=0.005, row_latency=0.00002, data_dir=DATA_DIR):
+    """Rows/sec of import_to_neo4j.import_bulk and TuGraphImporter.import_data against recording stand-ins."""
+    from import_to_aliyun_tugraph import TuGraphImporter
+    from import_to_neo4j import BATCH_SIZE, import_bulk
+
+    report = {}
+    targets = [
+        ('neo4j_bulk', RecordingPy2neoGraph, lambda target: import_bulk(target, data_dir, BATCH_SIZE)),
+        ('tugraph', RecordingDriver, lambda target: TuGraphImporter(driver=target).import_data(
+            os.path.join(data_dir, 'diseases.csv'), os.path.join(data_dir, 'disease_details.csv'),
+            os.path.join(data_dir, 'symptoms.csv'))),
+    ]
+    for name, stand_in, run in targets:
+        target = stand_in(batch_latency, row_latency)
+        start = time.perf_counter()
+        # The importers print per-batch progress; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            run(target)
+        elapsed = time.perf_counter() - start
+        report[name] = {'rows': target.rows, 'batches': target.batches, 'seconds': elapsed,
+                        'rows_per_sec': target.rows / elapsed if elapsed > 0 else 0.0}
+    return report
+
+
+# (path in the report, True when higher is better)
+COMPARED_METRICS = [
+    (('qa', 'throughput_qps'), True),
+    (('qa', 'answer_accuracy'), True),
+    (('qa', 'route_accuracy'), True),
+    (('qa', 'context', 'tokens_per_question'), False),
+] + [(('qa', 'stages', stage, f'p{p}_ms'), False) for stage in STAGE_ORDER for p in PERCENTILES] + [
+    (('import', name, 'rows_per_sec'), True) for name in ('neo4j_bulk', 'tugraph')
+] + [(('replicas', setup, f'p{p}_ms'), False) for setup in ('routed', 'hedged') for p in PERCENTILES] + [
+    (('diagnosis', 'hit_rate'), True), (('diagnosis', 'p99_ms'), False),
+]
+
+
+def lookup(report, path):
+    for key in path:
+        if not isinstance(report, dict) or key not in report:
+            return None
+        report = report[key]
+    return report
+
+
+def compare(report, baseline, tolerance=0.1):
+    """[(metric, baseline, current, relative change, regressed)] for metrics present in both reports."""
+    rows = []
+    for path, higher_is_better in COMPARED_METRICS:
+        old, new = lookup(baseline, path), lookup(report, path)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        rows.append(('.'.join(path[1:]), old, new, change, regressed))
+    return rows
+
+
+def print_report(report):
+    qa = report.get('qa')
+    if qa:
+        print(f"\nQA: {qa['questions']} questions in {qa['wall_seconds']:.2f}s "
+              f"({qa['throughput_qps']:.1f} q/s), {qa['errors']} errors")
+        for error in qa['error_samples']:
+            print(f"  ✗ {error}")
+        print(f"  route accuracy {qa['route_accuracy']:.1%}, answer accuracy {qa['answer_accuracy']:.1%}")
+        print(f"  LLM requests {qa['llm']['requests']} (cypher {qa['llm']['cypher']}, answer {qa['llm']['answer']}), "
+              f"answer cache hit ratio {qa['answer_cache']['hit_ratio']:.1%}")
+        context = qa['context']
+        print(f"  answer context {context['tokens_per_question']:.0f} tokens/question "
+              f"(JSON layout {context['baseline_per_question']:.0f}, saved {context['saved_per_question']:.0f}), "
+              f"{context['dropped']} rows over budget, {context['described']} descriptions")
+        print(f"\n  {'stage':<12}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for stage, summary in qa['stages'].items():
+            print(f"  {stage:<12}{summary['count']:>7}{summary['p50_ms']:>10.1f}"
+                  f"{summary['p95_ms']:>10.1f}{summary['p99_ms']:>10.1f}")
+    for name, result in report.get('import', {}).items():
+        print(f"\nImport {name}: {result['rows']} rows in {result['batches']} batches, "
+              f"{result['seconds']:.2f}s ({result['rows_per_sec']:.0f} rows/sec)")
+
+
+def print_replicas(replicas):
+    print(f"\nReplica reads: {'setup':<8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for setup, result in replicas.items():
+        print(f"               {setup:<8}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+              f"{result['p99_ms']:>10.1f}{result['errors']:>8}")
+    for endpoint, stats in replicas.get('hedged', {}).get('endpoints', {}).items():
+        print(f"  {endpoint}: {stats['reads']} reads, {stats['failures']} failures, "
+              f"{stats['hedge_wins']}/{stats['hedges']} hedges won")
+
+
+def print_diagnosis(diagnosis):
+    print(f"\nDiagnosis ranking: {diagnosis['queries']} sets of {diagnosis['symptoms']} symptoms, "
+          f"p50 {diagnosis['p50_ms']:.3f} ms, p99 {diagnosis['p99_ms']:.3f} ms, "
+          f"source disease in top {diagnosis['k']} for {diagnosis['hit_rate']:.1%}")
+
+
+def print_comparison(rows, tolerance):
+    print(f"\nAgainst baseline (tolerance {tolerance:.0%}):")
+    for metric, old, new, change, regressed in rows:
+        print(f"  {metric:<28}{old:>12.2f}{new:>12.2f}{change:>+9.1%}{'  REGRESSION' if regressed else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark with a stub LLM and an in-memory graph")
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the question set")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="stub seconds to the first token")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="stub seconds per further token")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--db-latency", type=float, default=0.002, help="seconds per graph call")
+    parser.add_argument("--batch-latency", type=float, default=0.005, help="seconds per import batch")
+    parser.add_argument("--row-latency", type=float, default=0.00002, help="seconds per imported row")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-qa", action="store_true")
+    parser.add_argument("--skip-import", action="store_true")
+    parser.add_argument("--skip-replicas", action="store_true")
+    parser.add_argument("--replica-reads", type=int, default=600, help="template reads per replica setup")
+    parser.add_argument("--skip-diagnosis", action="store_true")
+    parser.add_argument("--diagnosis-queries", type=int, default=500, help="symptom sets to rank")
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative change counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    report = {'config': {key: value for key, value in vars(args).items()
+                         if key not in ('output', 'baseline', 'save_baseline', 'fail_on_regression',
+                                        'skip_qa', 'skip_import', 'skip_replicas', 'skip_diagnosis')}}
+    if not args.skip_qa:
+        report['qa'] = bench_qa(load_questions(args.questions), args.repeat, args.concurrency, args.llm_latency,
+                                args.token_latency, args.jitter, args.db_latency, args.seed, args.questions)
+    if not args.skip_import:
+        report['import'] = bench_imports(args.batch_latency, args.row_latency)
+    if not args.skip_replicas:
+        report['replicas'] = bench_replicas(args.replica_reads, args.concurrency, seed=args.seed)
+    if not args.skip_diagnosis:
+        report['diagnosis'] = bench_diagnosis(args.diagnosis_queries, seed=args.seed)
+    print_report(report)
+    if 'replicas' in report:
+        print_replicas(report['replicas'])
+    if 'diagnosis' in report:
+        print_diagnosis(report['diagnosis'])
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    regressions = []
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != report['config']:
+            print("\nNote: baseline was recorded with different settings")
+        rows = compare(report, baseline, args.tolerance)
+        print_comparison(rows, args.tolerance)
+        regressions = [row[0] for row in rows if row[4]]
+
+    if regressions and args.fail_on_regression:
+        raise SystemExit(f"Regressions: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
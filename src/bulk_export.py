@@ -0,0 +1,244 @@
+"""
+Offline bulk export for cold starts.
+
+Reads data/diseases.csv, data/disease_details.csv and data/symptoms.csv once,
+normalizes and dedupes them through csv_ingest, and writes node/relationship files for
+
+  * neo4j-admin database import full   (export/neo4j/)
+  * TuGraph lgraph_import              (export/tugraph/)
+
+so a fresh database can be loaded without any Bolt round trips. The Neo4j profile
+follows import_to_neo4j.py (forward edges only to catalogued symptoms), the TuGraph
+profile follows TuGraphImporter (symptoms are created from the disease tables). Both
+add the symptom->disease links of symptoms.csv (Related Disease 1..5), merged with
+the forward edges, creating name-only Disease nodes for related diseases that no
+disease table lists, and carry the importers' provenance and adjacency properties.
+manifest.json in each directory records the node/edge counts to compare against verify().
+"""
+import argparse
+import csv
+import json
+import os
+
+from csv_ingest import iter_nodes, iter_records, iter_related_diseases
+from graph_sync import (HASH_PROPERTY, adjacency_properties, content_hash, encode_list, group_edge_sources,
+                        merge_edge_sources)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "export")
+
+NODE_PROPERTIES = ['name', 'website', 'aliases', 'description']
+DISEASE_PROPERTIES = NODE_PROPERTIES + ['symptom_count']
+SYMPTOM_PROPERTIES = NODE_PROPERTIES + ['diseases', 'disease_count']
+
+
+def iter_edges(*paths):
+    for path in paths:
+        for record in iter_records(path):
+            if record.symptom:
+                yield record.disease, record.symptom
+
+
+def edge_sources(diseases_csv, details_csv, symptoms_csv=None):
+    """(source file, (disease, symptom) pairs) for the disease tables and the symptom table's related diseases."""
+    sources = [(os.path.basename(path), iter_edges(path)) for path in (diseases_csv, details_csv)]
+    if symptoms_csv:
+        sources.append((os.path.basename(symptoms_csv), iter_related_diseases(symptoms_csv)))
+    return sources
+
+
+def collect_edges(diseases_csv, details_csv, symptoms_csv=None):
+    """{(disease, symptom): [source file, ...]} over the disease tables and the symptom table's related diseases."""
+    return merge_edge_sources(*edge_sources(diseases_csv, details_csv, symptoms_csv))
+
+
+def iter_edge_records(diseases_csv, details_csv, symptoms_csv=None):
+    """
+    (disease, symptom, source file) per edge record, in collect_edges() order but not merged.
+
+    The streaming imports merge the sources of repeated pairs as they write them.
+    """
+    for source, pairs in edge_sources(diseases_csv, details_csv, symptoms_csv):
+        for disease, symptom in pairs:
+            yield disease, symptom, source
+
+
+def add_adjacency(diseases, symptoms, edges):
+    """Set the precomputed degree/reverse-lookup properties and the content hash on every node."""
+    disease_props, symptom_props = adjacency_properties(edges, diseases, symptoms)
+    sources_by_disease = group_edge_sources(edges)
+    for name, props in diseases.items():
+        props.update(disease_props[name])
+        props[HASH_PROPERTY] = content_hash(dict(props), sources_by_disease.get(name, {}))
+    for name, props in symptoms.items():
+        props.update(symptom_props[name])
+        props[HASH_PROPERTY] = content_hash(dict(props))
+
+
+def related_disease_node(name):
+    """Name-only Disease node for a related disease of symptoms.csv that diseases.csv does not list."""
+    return {'name': name, 'website': '', 'aliases': '', 'description': ''}
+
+
+def build_neo4j_graph(diseases_csv, symptoms_csv, details_csv):
+    """
+    Disease and Symptom nodes come from their own tables; edges only join existing nodes.
+
+    Related diseases of symptoms.csv that diseases.csv does not list get name-only
+    nodes (related_disease_node), as the TuGraph profile and the intent router and
+    entity index already have them, so every symptom->disease link is kept.
+    Forward edges to uncatalogued symptoms are skipped.
+    Returns (diseases, symptoms, edges) with edges as {(disease, symptom): sources}.
+    """
+    diseases = {props['name']: props for props in iter_nodes(diseases_csv)}
+    symptoms = {props['name']: props for props in iter_nodes(symptoms_csv)}
+    for disease, _ in iter_related_diseases(symptoms_csv):
+        diseases.setdefault(disease, related_disease_node(disease))
+    edges = {pair: sources for pair, sources in collect_edges(diseases_csv, details_csv, symptoms_csv).items()
+             if pair[0] in diseases and pair[1] in symptoms}
+    add_adjacency(diseases, symptoms, edges)
+    return diseases, symptoms, edges
+
+
+def tugraph_nodes(diseases_csv, details_csv, edges):
+    """(disease names, symptom names) in first-seen order: every disease row plus the edges' endpoints."""
+    disease_names = {}
+    for path in (diseases_csv, details_csv):
+        for record in iter_records(path):
+            disease_names[record.disease] = None
+    disease_names.update(dict.fromkeys(d for d, _ in edges))
+    return list(disease_names), list(dict.fromkeys(s for _, s in edges))
+
+
+def build_tugraph_graph(diseases_csv, details_csv, symptoms_csv=None):
+    """Nodes are created from the edges' endpoints and every disease row, as TuGraphImporter does."""
+    edges = collect_edges(diseases_csv, details_csv, symptoms_csv)
+    disease_names, symptom_names = tugraph_nodes(diseases_csv, details_csv, edges)
+
+    diseases = {name: {'name': name} for name in disease_names}
+    symptoms = {name: {'name': name} for name in symptom_names}
+    add_adjacency(diseases, symptoms, edges)
+    return diseases, symptoms, edges
+
+
+def write_csv(path, header, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(header)
+        writer.writerows(rows)
+
+
+def neo4j_value(value):
+    """Array properties use neo4j-admin's default ';' delimiter."""
+    return ';'.join(value) if isinstance(value, list) else value
+
+
+def export_neo4j(out_dir, diseases, symptoms, edges):
+    os.makedirs(out_dir, exist_ok=True)
+    types = {'symptom_count': 'int', 'disease_count': 'int', 'diseases': 'string[]'}
+
+    for label, nodes, filename, properties in (('Disease', diseases, 'diseases', DISEASE_PROPERTIES),
+                                               ('Symptom', symptoms, 'symptoms', SYMPTOM_PROPERTIES)):
+        columns = properties + [HASH_PROPERTY]
+        header = ([f'name:ID({label})'] + [f'{c}:{types[c]}' if c in types else c for c in columns[1:]]
+                  + [':LABEL'])
+        write_csv(os.path.join(out_dir, f'{filename}_header.csv'), header, [])
+        write_csv(os.path.join(out_dir, f'{filename}.csv'), None,
+                  ([neo4j_value(props[c]) for c in columns] + [label] for props in nodes.values()))
+
+    write_csv(os.path.join(out_dir, 'has_symptom_header.csv'),
+              [':START_ID(Disease)', ':END_ID(Symptom)', 'sources:string[]', ':TYPE'], [])
+    write_csv(os.path.join(out_dir, 'has_symptom.csv'), None,
+              ([d, s, neo4j_value(sources), 'HAS_SYMPTOM'] for (d, s), sources in edges.items()))
+
+    # picocli argument file: neo4j-admin database import full @import.args neo4j
+    args = [
+        '--nodes=Disease=diseases_header.csv,diseases.csv',
+        '--nodes=Symptom=symptoms_header.csv,symptoms.csv',
+        '--relationships=HAS_SYMPTOM=has_symptom_header.csv,has_symptom.csv',
+        '--multiline-fields=true',
+        '--overwrite-destination=true',
+    ]
+    with open(os.path.join(out_dir, 'import.args'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(args) + '\n')
+
+
+def export_tugraph(out_dir, diseases, symptoms, edges):
+    os.makedirs(out_dir, exist_ok=True)
+    # TuGraph has no list properties; lists are stored as JSON strings, as TuGraphImporter writes them
+    write_csv(os.path.join(out_dir, 'diseases.csv'), None,
+              ([p['name'], p['symptom_count'], p[HASH_PROPERTY]] for p in diseases.values()))
+    write_csv(os.path.join(out_dir, 'symptoms.csv'), None,
+              ([p['name'], encode_list(p['diseases']), p['disease_count'], p[HASH_PROPERTY]]
+               for p in symptoms.values()))
+    write_csv(os.path.join(out_dir, 'has_symptom.csv'), None,
+              ([d, s, encode_list(sources)] for (d, s), sources in edges.items()))
+
+    # lgraph_import resolves relative paths against its working directory
+    abs_dir = os.path.abspath(out_dir)
+    hash_property = {'name': HASH_PROPERTY, 'type': 'STRING', 'optional': True}
+    config = {
+        'schema': [
+            {'label': 'Disease', 'type': 'VERTEX', 'primary': 'name', 'properties': [
+                {'name': 'name', 'type': 'STRING'},
+                {'name': 'symptom_count', 'type': 'INT64', 'optional': True},
+                hash_property,
+            ]},
+            {'label': 'Symptom', 'type': 'VERTEX', 'primary': 'name', 'properties': [
+                {'name': 'name', 'type': 'STRING'},
+                {'name': 'diseases', 'type': 'STRING', 'optional': True},
+                {'name': 'disease_count', 'type': 'INT64', 'optional': True},
+                hash_property,
+            ]},
+            {'label': 'HAS_SYMPTOM', 'type': 'EDGE', 'constraints': [['Disease', 'Symptom']],
+             'properties': [{'name': 'sources', 'type': 'STRING', 'optional': True}]},
+        ],
+        'files': [
+            {'path': os.path.join(abs_dir, 'diseases.csv'), 'format': 'CSV', 'label': 'Disease', 'header': 0,
+             'columns': ['name', 'symptom_count', HASH_PROPERTY]},
+            {'path': os.path.join(abs_dir, 'symptoms.csv'), 'format': 'CSV', 'label': 'Symptom', 'header': 0,
+             'columns': ['name', 'diseases', 'disease_count', HASH_PROPERTY]},
+            {'path': os.path.join(abs_dir, 'has_symptom.csv'), 'format': 'CSV', 'label': 'HAS_SYMPTOM', 'header': 0,
+             'SRC_ID': 'Disease', 'DST_ID': 'Symptom', 'columns': ['SRC_ID', 'DST_ID', 'sources']},
+        ],
+    }
+    with open(os.path.join(out_dir, 'import.conf'), 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+
+def write_manifest(out_dir, diseases, symptoms, edges):
+    manifest = {'Disease': len(diseases), 'Symptom': len(symptoms), 'HAS_SYMPTOM': len(edges)}
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the CSVs as neo4j-admin / lgraph_import input files")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--out-dir", default=EXPORT_DIR)
+    parser.add_argument("--target", choices=["neo4j", "tugraph", "all"], default="all")
+    args = parser.parse_args()
+
+    diseases_csv = os.path.join(args.data_dir, "diseases.csv")
+    symptoms_csv = os.path.join(args.data_dir, "symptoms.csv")
+    details_csv = os.path.join(args.data_dir, "disease_details.csv")
+
+    if args.target in ("neo4j", "all"):
+        out_dir = os.path.join(args.out_dir, "neo4j")
+        graph = build_neo4j_graph(diseases_csv, symptoms_csv, details_csv)
+        export_neo4j(out_dir, *graph)
+        print(f"\nNeo4j export -> {out_dir}: {write_manifest(out_dir, *graph)}")
+        print(f"  cd {out_dir} && neo4j-admin database import full @import.args neo4j")
+
+    if args.target in ("tugraph", "all"):
+        out_dir = os.path.join(args.out_dir, "tugraph")
+        graph = build_tugraph_graph(diseases_csv, details_csv, symptoms_csv)
+        export_tugraph(out_dir, *graph)
+        print(f"\nTuGraph export -> {out_dir}: {write_manifest(out_dir, *graph)}")
+        print(f"  lgraph_import -c {os.path.join(out_dir, 'import.conf')} --dir <db_dir> --graph default")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Token-budgeted packing of graph rows into the answer prompt's context.
+
+The summary prompts used to carry the first 20 rows as indented JSON (or a
+comma join), which spends most of its tokens on whitespace and repeated keys.
+ContextPacker writes the rows as a small table instead: one header line with
+the column names, then one line per row with the values separated by " | ".
+Duplicate rows are dropped, rows naming something the question mentions come
+first, and rows are added until the token budget is reached. If budget is
+left, the top rows get a short entity description from data/*.csv, capped by
+a separate, smaller description budget so descriptions do not undo the
+saving on small results.
+
+Tokens are counted with tiktoken (cl100k_base, close enough to qwen's
+tokenizer for budgeting); when the encoding cannot be loaded, e.g. offline
+without a cached BPE file, answer_cache.estimate_tokens is used instead.
+Every pack also counts the tokens the old JSON layout would have taken, so
+the saving per question can be reported.
+"""
+import json
+import threading
+from collections import namedtuple
+from functools import lru_cache
+
+import tiktoken
+
+from answer_cache import estimate_tokens
+from entity_index import collect_entities
+from intent_router import DATA_DIR
+from telemetry import log
+
+ENCODING = "cl100k_base"
+TOKEN_BUDGET = 200
+# Share of the budget descriptions may take, so they stay a garnish on small results
+DESCRIPTION_BUDGET = 40
+DESCRIPTION_CHARS = 40
+MAX_DESCRIPTIONS = 3
+# Rows the old prompts passed, for the baseline token count
+BASELINE_ROWS = 20
+SEPARATOR = " | "
+
+PackedContext = namedtuple('PackedContext', ['text', 'rows', 'tokens', 'baseline_tokens', 'dropped', 'described'])
+
+
+@lru_cache(maxsize=None)
+def token_counter(encoding=ENCODING):
+    """count(text) -> tokens; falls back to estimate_tokens when the encoding is unavailable."""
+    try:
+        enc = tiktoken.get_encoding(encoding)
+    except Exception as e:
+        log.warning(f"tiktoken encoding {encoding} unavailable ({e.__class__.__name__}), estimating tokens")
+        return estimate_tokens
+    return lambda text: len(enc.encode(text, disallowed_special=()))
+
+
+def format_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    return str(value).replace("\n", " ")
+
+
+def baseline_context(rows):
+    """The layout the prompts used before packing: first 20 rows as indented JSON."""
+    return json.dumps(rows[:BASELINE_ROWS], ensure_ascii=False, indent=2)
+
+
+def load_descriptions(data_dir=DATA_DIR, chars=DESCRIPTION_CHARS):
+    """{name: first `chars` characters of its description} for every Disease and Symptom."""
+    descriptions = {}
+    for (name, _), entry in collect_entities(data_dir).items():
+        text = " ".join(entry['description'].split())
+        if text and name not in descriptions:
+            descriptions[name] = text[:chars] + ("…" if len(text) > chars else "")
+    return descriptions
+
+
+class ContextPacker:
+    """
+    Packs result rows (dicts, or scalars) into at most `budget` tokens.
+
+    descriptions: {name: short description}; at most max_descriptions rows get
+    one, and only while both the overall budget and description_budget allow.
+    """
+
+    def __init__(self, budget=TOKEN_BUDGET, descriptions=None, description_budget=DESCRIPTION_BUDGET,
+                 max_descriptions=MAX_DESCRIPTIONS, encoding=ENCODING):
+        self.budget = budget
+        self.descriptions = descriptions or {}
+        self.description_budget = description_budget
+        self.max_descriptions = max_descriptions
+        self.count = token_counter(encoding)
+        self.lock = threading.Lock()
+        self.stats = {'packed': 0, 'tokens': 0, 'baseline_tokens': 0, 'rows': 0, 'dropped': 0, 'described': 0}
+
+    @classmethod
+    def from_csv(cls, data_dir=DATA_DIR, **kwargs):
+        return cls(descriptions=load_descriptions(data_dir), **kwargs)
+
+    def rank(self, rows, question=""):
+        """Distinct rows, those with a value the question mentions first, otherwise in result order."""
+        distinct = {}
+        for row in rows:
+            key = json.dumps(row, ensure_ascii=False, sort_keys=True, default=str)
+            distinct.setdefault(key, row)
+        rows = list(distinct.values())
+
+        def mentioned(row):
+            values = row.values() if isinstance(row, dict) else [row]
+            return any(isinstance(v, str) and v and v in question for v in values)
+
+        return sorted(rows, key=lambda row: not mentioned(row))
+
+    def describe(self, row):
+        values = row.values() if isinstance(row, dict) else [row]
+        return next((self.descriptions[v] for v in values if isinstance(v, str) and v in self.descriptions), None)
+
+    def pack(self, rows, question=""):
+        ranked = self.rank(rows, question)
+        columns = list(ranked[0].keys()) if ranked and isinstance(ranked[0], dict) else ["value"]
+        lines = [SEPARATOR.join(format_value(v) for v in (row.values() if isinstance(row, dict) else [row]))
+                 for row in ranked]
+
+        header = SEPARATOR.join(columns)
+        used = self.count(header) + 1
+        # Room for the "(+N more rows)" note is kept free while rows are still left out
+        note_cost = self.count(f"(+{len(lines)} more rows)") + 1
+        kept = 0
+        for line in lines:
+            cost = self.count(line) + 1
+            more = kept + 1 < len(lines)
+            if kept and used + cost + (note_cost if more else 0) > self.budget:
+                break
+            used += cost
+            kept += 1
+        dropped = len(lines) - kept
+        if dropped:
+            used += note_cost
+
+        body = lines[:kept]
+        described = 0
+        spent = 0
+        if self.descriptions and self.max_descriptions:
+            extra_header = self.count(SEPARATOR + "description")
+            for i, row in enumerate(ranked[:kept]):
+                if described >= self.max_descriptions:
+                    break
+                description = self.describe(row)
+                if not description:
+                    continue
+                cost = self.count(SEPARATOR + description) + (extra_header if not described else 0)
+                if used + cost > self.budget or spent + cost > self.description_budget:
+                    break
+                body[i] += SEPARATOR + description
+                used += cost
+                spent += cost
+                described += 1
+        if described:
+            header += SEPARATOR + "description"
+
+        text = "\n".join([header] + body + ([f"(+{dropped} more rows)"] if dropped else []))
+        packed = PackedContext(text, ranked[:kept], self.count(text), self.count(baseline_context(rows)),
+                               dropped, described)
+        with self.lock:
+            self.stats['packed'] += 1
+            self.stats['tokens'] += packed.tokens
+            self.stats['baseline_tokens'] += packed.baseline_tokens
+            self.stats['rows'] += kept
+            self.stats['dropped'] += dropped
+            self.stats['described'] += described
+        return packed
+
+    def metrics(self):
+        with self.lock:
+            stats = dict(self.stats)
+        packed = stats['packed'] or 1
+        stats['tokens_per_question'] = stats['tokens'] / packed
+        stats['baseline_per_question'] = stats['baseline_tokens'] / packed
+        stats['saved_per_question'] = (stats['baseline_tokens'] - stats['tokens']) / packed
+        return stats
@@ -0,0 +1,153 @@
+"""
+Streaming CSV ingestion shared by the importers.
+
+The encoding is detected once from a bounded prefix of the file, rows are read
+through a generator, and symptom lists are split with one set of rules, so both
+importers see the same records and never hold a whole crawl in memory.
+"""
+import codecs
+import csv
+import re
+from collections import namedtuple
+from itertools import islice
+
+ENCODINGS = ['utf-8-sig', 'gb18030']
+SAMPLE_SIZE = 64 * 1024
+
+NAME_COLUMNS = ['Name', '疾病名称']
+LIST_COLUMNS = ['Typical Symptoms', '典型症状', '症状']
+META_COLUMNS = ['Name', '疾病名称', 'Website', '网址', 'Aliases', '别名', 'Description', '描述']
+
+# Related Disease 1..5 of symptoms.csv
+RELATED_DISEASE_COLUMN = re.compile(r'^(Related Disease|相关疾病)\s*\d*$')
+
+# 、 , ， ; ； and runs of tabs/newlines (disease_details.csv pads list items with tabs); spaces stay
+# inside an item, e.g. "chest pain" in the English-header Typical Symptoms column
+SYMPTOM_SEPARATORS = re.compile(r'[、,，;；\t\r\n]+')
+ALIAS_SEPARATORS = re.compile(r'[、,，;；/]+')
+
+Record = namedtuple('Record', ['disease', 'symptom', 'attributes'])
+
+
+def detect_encoding(filepath, sample_size=SAMPLE_SIZE, candidates=ENCODINGS):
+    """Pick the first candidate encoding that decodes the first sample_size bytes."""
+    with open(filepath, 'rb') as f:
+        sample = f.read(sample_size)
+        at_eof = not f.read(1)
+
+    for encoding in candidates:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            # final=False tolerates a multi-byte character cut off by the sample boundary
+            decoder.decode(sample, final=at_eof)
+        except UnicodeDecodeError:
+            continue
+        return encoding
+    raise ValueError(f"Cannot decode {filepath} with any of {candidates}")
+
+
+def iter_rows(filepath, encoding=None):
+    """Yield each CSV row as a dict with stripped header names."""
+    encoding = encoding or detect_encoding(filepath)
+    with open(filepath, 'r', encoding=encoding, newline='') as f:
+        reader = csv.reader(f)
+        header = [col.strip().lstrip('\ufeff') for col in next(reader, [])]
+        for values in reader:
+            yield dict(zip(header, values))
+
+
+def clean(value):
+    return (value or '').strip()
+
+
+def row_name(row):
+    for col in NAME_COLUMNS:
+        if clean(row.get(col)):
+            return clean(row[col])
+    return ''
+
+
+def node_properties(row):
+    return {
+        'name': row_name(row),
+        'website': clean(row.get('Website') or row.get('网址')),
+        'aliases': clean(row.get('Aliases') or row.get('别名')),
+        'description': clean(row.get('Description') or row.get('描述')),
+    }
+
+
+def split_symptoms(text):
+    return [s.strip() for s in SYMPTOM_SEPARATORS.split(text or '') if s.strip()]
+
+
+def split_aliases(text):
+    """'(痔核，痔病，痔疾...)' -> ['痔核', '痔病']; the crawler truncates long lists with '...'."""
+    text = (text or '').strip().strip('()（）')
+    aliases = []
+    for alias in ALIAS_SEPARATORS.split(text):
+        alias = alias.strip()
+        if alias and '...' not in alias and '…' not in alias:
+            aliases.append(alias)
+    return aliases
+
+
+def row_symptoms(row):
+    """Yield (symptom, column) for the symptom-per-column and symptom-list columns of a row."""
+    for col, val in row.items():
+        if not col or col in META_COLUMNS:
+            continue
+        if col in LIST_COLUMNS:
+            for symptom in split_symptoms(val):
+                yield symptom, col
+        elif ('症状' in col or 'Symptom' in col) and clean(val):
+            yield clean(val), col
+
+
+def iter_nodes(filepath):
+    """Yield the node properties of every named row."""
+    for row in iter_rows(filepath):
+        props = node_properties(row)
+        if props['name']:
+            yield props
+
+
+def iter_records(filepath, source=None):
+    """
+    Yield one Record(disease, symptom, attributes) per symptom of every row.
+
+    A row without symptoms yields a single record with symptom None, so callers
+    still see every disease. attributes holds the node properties plus the source
+    file and column the symptom came from.
+    """
+    source = source or filepath
+    for row in iter_rows(filepath):
+        props = node_properties(row)
+        if not props['name']:
+            continue
+        found = False
+        for symptom, col in row_symptoms(row):
+            found = True
+            yield Record(props['name'], symptom, dict(props, source=source, column=col))
+        if not found:
+            yield Record(props['name'], None, dict(props, source=source, column=None))
+
+
+def iter_related_diseases(filepath):
+    """Yield (disease, symptom) for every Related Disease column of the symptom table."""
+    for row in iter_rows(filepath):
+        symptom = row_name(row)
+        if not symptom:
+            continue
+        for col, val in row.items():
+            if col and RELATED_DISEASE_COLUMN.match(col) and clean(val):
+                yield clean(val), symptom
+
+
+def batched(iterable, size):
+    """Yield lists of up to size items."""
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
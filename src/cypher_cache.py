@@ -0,0 +1,161 @@
+"""
+Cache from normalized question text to validated Cypher.
+
+Two tiers: an in-memory LRU in front of a SQLite table, both with a TTL. Keys
+include a hash of the graph schema string, so a schema change invalidates every
+entry generated against the old schema. Hits skip the Text-to-Cypher LLM call.
+
+Each front end keeps its own file (cache_path(name)): front ends prompt with
+different schemas, and switching to a new schema purges the entries of the
+old one from that file only. The QA engines call set_schema() again when the
+graph statistics move; a fallback schema (statistics unreadable) is switched
+to without purging.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from cypher_guard import write_clause
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cache")
+DEFAULT_PATH = os.path.join(CACHE_DIR, "cypher_cache.sqlite3")
+TRAILING_PUNCTUATION = '?？!！。.,，;； '
+
+
+def normalize_question(question):
+    """NFKC, lower-case, collapse whitespace and drop trailing punctuation."""
+    text = unicodedata.normalize('NFKC', question).lower()
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.rstrip(TRAILING_PUNCTUATION)
+
+
+def is_cacheable(cypher):
+    """Only keep read queries that look complete."""
+    return bool(cypher) and 'RETURN' in cypher.upper() and write_clause(cypher) is None
+
+
+def cache_path(name):
+    """SQLite file of one front end's cache."""
+    return os.path.join(CACHE_DIR, f"cypher_cache_{name}.sqlite3")
+
+
+class CypherCache:
+    def __init__(self, schema='', path=DEFAULT_PATH, max_entries=1024, ttl=7 * 24 * 3600, purge=True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0,
+                      'llm_calls': 0, 'llm_seconds': 0.0, 'saved_seconds': 0.0}
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS cypher_cache (
+                key TEXT PRIMARY KEY,
+                question TEXT,
+                cypher TEXT,
+                schema_hash TEXT,
+                expires_at REAL
+            )
+        """)
+        self.conn.commit()
+        self.schema_hash = None
+        self.set_schema(schema, purge)
+
+    def set_schema(self, schema, purge=True):
+        """
+        Switch to a new schema string. With purge, entries generated for any
+        other schema are dropped; without (a fallback schema), they are kept
+        for when the real schema is back.
+        """
+        schema_hash = hashlib.sha1(schema.encode('utf-8')).hexdigest()
+        if schema_hash == self.schema_hash:
+            return
+        with self.lock:
+            self.schema_hash = schema_hash
+            self.memory.clear()
+            if purge:
+                self.conn.execute("DELETE FROM cypher_cache WHERE schema_hash != ? OR expires_at < ?",
+                                  (schema_hash, time.time()))
+            else:
+                self.conn.execute("DELETE FROM cypher_cache WHERE expires_at < ?", (time.time(),))
+            self.conn.commit()
+
+    def _key(self, question):
+        return hashlib.sha1(f"{self.schema_hash}:{normalize_question(question)}".encode('utf-8')).hexdigest()
+
+    def _avg_llm_seconds(self):
+        return self.stats['llm_seconds'] / self.stats['llm_calls'] if self.stats['llm_calls'] else 0.0
+
+    def get(self, question):
+        key = self._key(question)
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry and entry[1] > now:
+                self.memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                self.stats['saved_seconds'] += self._avg_llm_seconds()
+                return entry[0]
+
+            row = self.conn.execute("SELECT cypher, expires_at FROM cypher_cache WHERE key = ?", (key,)).fetchone()
+            if row and row[1] > now:
+                self._remember(key, row[0], row[1])
+                self.stats['disk_hits'] += 1
+                self.stats['saved_seconds'] += self._avg_llm_seconds()
+                return row[0]
+
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, question, cypher, llm_seconds=None):
+        if llm_seconds is not None:
+            self.stats['llm_calls'] += 1
+            self.stats['llm_seconds'] += llm_seconds
+        if not is_cacheable(cypher):
+            return False
+
+        key = self._key(question)
+        expires_at = time.time() + self.ttl
+        with self.lock:
+            self._remember(key, cypher, expires_at)
+            self.conn.execute("INSERT OR REPLACE INTO cypher_cache VALUES (?, ?, ?, ?, ?)",
+                              (key, normalize_question(question), cypher, self.schema_hash, expires_at))
+            self.conn.commit()
+        return True
+
+    def invalidate(self, question=None):
+        """Drop one question, or everything when question is None."""
+        with self.lock:
+            if question is None:
+                self.memory.clear()
+                self.conn.execute("DELETE FROM cypher_cache")
+            else:
+                key = self._key(question)
+                self.memory.pop(key, None)
+                self.conn.execute("DELETE FROM cypher_cache WHERE key = ?", (key,))
+            self.conn.commit()
+
+    def _remember(self, key, cypher, expires_at):
+        self.memory[key] = (cypher, expires_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def metrics(self):
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        lookups = hits + self.stats['misses']
+        return dict(self.stats,
+                    hit_rate=hits / lookups if lookups else 0.0,
+                    avg_llm_seconds=self._avg_llm_seconds(),
+                    memory_entries=len(self.memory))
+
+    def close(self):
+        self.conn.close()
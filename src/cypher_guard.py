@@ -0,0 +1,230 @@
+"""
+Pre-execution guard for LLM-generated Cypher.
+
+validate() works on the query text with string literals and comments masked:
+it rejects write clauses and procedure calls outside a read-only allowlist,
+bounds variable-length relationships to max_hops, and injects or clamps the
+final LIMIT of every UNION branch (a LIMIT $param is clamped to the value
+passed with the query). check_plan() looks at the EXPLAIN plan and refuses Cartesian
+products and plans whose estimated row count at any operator exceeds
+max_estimated_rows. Accepted queries run as neo4j.Query objects carrying a
+transaction timeout, which the server enforces.
+
+A GuardError message is written to be fed back to the LLM for one
+regeneration attempt.
+"""
+import re
+import threading
+
+from neo4j import Query
+
+from graph_schema import plan_operators
+
+MAX_ROWS = 100
+MAX_HOPS = 3
+MAX_ESTIMATED_ROWS = 100_000
+TIMEOUT = 10.0
+
+WRITE_CLAUSES = re.compile(
+    r'\b(CREATE|MERGE|DELETE|DETACH|SET|REMOVE|DROP|LOAD\s+CSV|FOREACH|USING\s+PERIODIC\s+COMMIT|IN\s+TRANSACTIONS)\b',
+    re.IGNORECASE)
+# A write keyword only starts a clause after the end of an expression or clause; after these words
+# (or after '.', ',', '(', an operator...) it is an identifier, e.g. RETURN d.name AS set
+EXPRESSION_WORDS = {
+    'AS', 'RETURN', 'WITH', 'WHERE', 'AND', 'OR', 'XOR', 'NOT', 'IN', 'IS', 'DISTINCT', 'BY', 'UNWIND',
+    'CASE', 'WHEN', 'THEN', 'ELSE', 'STARTS', 'ENDS', 'CONTAINS', 'YIELD', 'MATCH', 'OPTIONAL',
+}
+PREVIOUS_TOKEN = re.compile(r'(\w+|\S)\s*$')
+BACKTICK_NAME = re.compile(r'`[^`]*`')
+CALL_PROCEDURE = re.compile(r'\bCALL\s+([\w.]+)', re.IGNORECASE)
+READ_PROCEDURES = {
+    'db.labels', 'db.relationshiptypes', 'db.propertykeys', 'db.schema.visualization',
+    'db.vertexlabels', 'db.edgelabels', 'db.index.fulltext.querynodes',
+}
+STRING_OR_COMMENT = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|//[^\n]*|/\*.*?\*/", re.DOTALL)
+VAR_LENGTH = re.compile(r'(\[[^\[\]]*?)\*\s*(\d*)\s*(?:(\.\.)\s*(\d*))?(\s*[^\[\]]*\])')
+LIMIT_KEYWORD = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+# A LIMIT followed by one of these (or by a closing brace) is not the branch's final one
+LATER_CLAUSE = re.compile(r'\b(RETURN|WITH|MATCH|OPTIONAL|UNWIND|CALL|ORDER|SKIP|WHERE|LIMIT)\b', re.IGNORECASE)
+SIMPLE_LIMIT = re.compile(r'(\d+)|\$(\w+)')
+UNION = re.compile(r'\bUNION(?:\s+ALL)?\b', re.IGNORECASE)
+RETURN_CLAUSE = re.compile(r'\bRETURN\b', re.IGNORECASE)
+EXPENSIVE_OPERATORS = ('CartesianProduct',)
+
+
+class GuardError(ValueError):
+    """The query was refused; the message says why in terms the LLM can act on."""
+
+
+def mask_literals(cypher):
+    """Same-length copy with string literals and comments blanked, so regexes only see Cypher syntax."""
+    return STRING_OR_COMMENT.sub(lambda m: ' ' * len(m.group(0)), cypher)
+
+
+def write_clause(cypher):
+    """The first write keyword of a query that sits in clause position, or None."""
+    # Literals and quoted names become plain tokens, so `set` is a name and n.a = 'x' SET ... is still a write
+    text = STRING_OR_COMMENT.sub(lambda m: ' ' if m.group(0).startswith('/') else "''", cypher)
+    text = BACKTICK_NAME.sub('name', text)
+    for m in WRITE_CLAUSES.finditer(text):
+        previous = PREVIOUS_TOKEN.search(text, 0, m.start())
+        if previous is None:
+            return m.group(1)
+        token = previous.group(1)
+        if m.group(1).upper().startswith('IN'):
+            # CALL { ... } IN TRANSACTIONS, not x IN transactions
+            if token == '}':
+                return m.group(1)
+        elif token in (')', ']', '}', "'") or re.match(r'\w', token) and token.upper() not in EXPRESSION_WORDS:
+            return m.group(1)
+    return None
+
+
+def final_limit(masked):
+    """The match of a branch's final top-level LIMIT keyword (masked text), or None when it has none."""
+    # Not n.limit, `limit` or AS limit; quoted names become a same-length plain name
+    masked = BACKTICK_NAME.sub(lambda m: 'x' * len(m.group(0)), masked)
+    keywords = [m for m in LIMIT_KEYWORD.finditer(masked)
+                if (PREVIOUS_TOKEN.search(masked, 0, m.start()) or m).group(1).upper() not in ('.', 'AS')]
+    if not keywords:
+        return None
+    tail = masked[keywords[-1].end():]
+    if tail.count('}') > tail.count('{') or tail.count(')') > tail.count('(') or LATER_CLAUSE.search(tail):
+        return None
+    return keywords[-1]
+
+
+def union_branches(masked):
+    """(start, end) of each top-level UNION branch; a UNION inside braces belongs to a subquery."""
+    bounds, start = [], 0
+    for m in UNION.finditer(masked):
+        if masked.count('{', 0, m.start()) == masked.count('}', 0, m.start()):
+            bounds.append((start, m.start()))
+            start = m.end()
+    return bounds + [(start, len(masked))]
+
+
+def estimated_rows(plan):
+    """Largest EstimatedRows of any operator in a Neo4j plan dict."""
+    if not isinstance(plan, dict):
+        return None
+    estimates = [plan.get('args', {}).get('EstimatedRows')]
+    estimates += [estimated_rows(child) for child in plan.get('children', [])]
+    estimates = [e for e in estimates if e is not None]
+    return max(estimates) if estimates else None
+
+
+class CypherGuard:
+    def __init__(self, explain=None, max_rows=MAX_ROWS, max_hops=MAX_HOPS,
+                 max_estimated_rows=MAX_ESTIMATED_ROWS, timeout=TIMEOUT):
+        """explain(query, params) returns a plan (see graph_schema.session_explain); None skips plan checks."""
+        self.explain = explain
+        self.max_rows = max_rows
+        self.max_hops = max_hops
+        self.max_estimated_rows = max_estimated_rows
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.stats = {'checked': 0, 'rewritten': 0, 'rejected': 0}
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def validate(self, cypher, params=None):
+        """
+        Static checks; returns the (possibly rewritten) query text or raises GuardError.
+
+        params: the parameters the query runs with, for a LIMIT given as a parameter.
+        """
+        self._count('checked')
+        text = cypher.strip().rstrip(';').strip()
+        masked = mask_literals(text)
+        if ';' in masked:
+            self._reject("Multiple statements are not allowed; write a single read-only query.")
+
+        write = write_clause(text)
+        if write:
+            self._reject(f"Write clause {write.upper()} is not allowed; the query must be read-only "
+                         f"(MATCH ... RETURN).")
+        for procedure in CALL_PROCEDURE.findall(masked):
+            if procedure.lower() not in READ_PROCEDURES:
+                self._reject(f"Procedure {procedure} is not allowed; use MATCH patterns instead.")
+        if not RETURN_CLAUSE.search(masked):
+            self._reject("The query has no RETURN clause.")
+
+        rewritten = self._bound_paths(text, masked)
+        rewritten = self._clamp_limits(rewritten, params or {})
+        if rewritten != text:
+            self._count('rewritten')
+        return rewritten
+
+    def _bound_paths(self, text, masked):
+        """[*], [*2..], [:R*..9] -> at most max_hops; edits are applied right to left so offsets stay valid."""
+        for m in reversed(list(VAR_LENGTH.finditer(masked))):
+            low, dots, high = m.group(2), m.group(3), m.group(4)
+            lower = int(low) if low else 1
+            if lower > self.max_hops:
+                self._reject(f"Paths of at least {lower} hops are not allowed; use at most {self.max_hops} hops.")
+            if low and not dots:
+                continue
+            upper = min(int(high), self.max_hops) if high else self.max_hops
+            text = text[:m.end(1)] + f"*{lower}..{upper}" + text[m.start(5):]
+        return text
+
+    def _clamp_limits(self, text, params):
+        """The final LIMIT of every UNION branch, each clamped on its own; right to left so offsets stay valid."""
+        masked = mask_literals(text)
+        for start, end in reversed(union_branches(masked)):
+            # Trailing whitespace and comments stay after the LIMIT
+            stop = start + len(masked[start:end].rstrip())
+            text = text[:start] + self._clamp_limit(text[start:stop], params) + text[stop:]
+        return text
+
+    def _clamp_limit(self, text, params):
+        masked = mask_literals(text)
+        keyword = final_limit(masked)
+        if keyword is None:
+            return f"{text} LIMIT {self.max_rows}"
+        start = keyword.end() + len(masked[keyword.end():]) - len(masked[keyword.end():].lstrip())
+        m = SIMPLE_LIMIT.fullmatch(masked[start:].rstrip())
+        if m is None:
+            # An expression (toInteger($k), 5 + 1000000, ...) cannot be bounded without evaluating it
+            self._reject(f"LIMIT {text[start:].strip()} is not allowed; write the LIMIT as a number "
+                         f"(at most {self.max_rows}).")
+        if m.group(2):
+            # A parameter can be larger than max_rows at run time; the clamped value is written in instead
+            value = params.get(m.group(2))
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                self._reject(f"LIMIT ${m.group(2)} has no integer value; write the LIMIT as a number.")
+            return f"{text[:start]}{min(value, self.max_rows)}"
+        if int(m.group(1)) > self.max_rows:
+            return f"{text[:start]}{self.max_rows}"
+        return text
+
+    def check_plan(self, plan):
+        """Refuse plans the server estimates to be expensive."""
+        expensive = sorted(set(plan_operators(plan)) & set(EXPENSIVE_OPERATORS))
+        if expensive:
+            self._reject(f"The plan contains {', '.join(expensive)}; connect every MATCH pattern "
+                         f"instead of matching disconnected nodes.")
+        rows = estimated_rows(plan)
+        if rows is not None and rows > self.max_estimated_rows:
+            self._reject(f"The plan is estimated to touch {rows:.0f} rows (limit {self.max_estimated_rows}); "
+                         f"anchor the pattern on a named Disease or Symptom.")
+
+    def prepare(self, cypher, params=None):
+        """validate() + plan check; returns a neo4j.Query with the transaction timeout set."""
+        text = self.validate(cypher, params)
+        if self.explain is not None:
+            self.check_plan(self.explain(text, params))
+        return Query(text, timeout=self.timeout)
+
+    def _reject(self, reason):
+        self._count('rejected')
+        raise GuardError(reason)
+
+
+def feedback_prompt(cypher, error):
+    """Text appended to the Text-to-Cypher prompt for the regeneration attempt."""
+    return (f"\nA previous attempt produced this query:\n{cypher}\n"
+            f"It was rejected: {error}\nWrite a corrected read-only query.\n")
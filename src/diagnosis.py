@@ -0,0 +1,46 @@
+"""
+Multi-symptom diagnosis: rank diseases by IDF-weighted overlap with a set of symptoms.
+
+A symptom few diseases share says more than one most of them list, so every
+matched symptom adds idf = log(1 + diseases / degree) to a disease's score,
+degree being the number of diseases with that symptom. Ties are broken by the
+number of matched symptoms, then by name, so every backend ranks the same way.
+
+GraphSnapshot.rank_diseases() scores over the snapshot's CSR arrays (a sparse
+symptom x disease matrix) in well under a millisecond. Against a database,
+graph_pool fetches each symptom's precomputed Symptom.diseases list (one index
+seek per symptom, one round trip per question) and scores with rank_lists().
+"""
+import math
+
+from intent_router import TEMPLATE_LIMIT
+
+
+def symptom_idf(degree, total):
+    return math.log1p(total / degree) if degree else 0.0
+
+
+def ranked_rows(candidates, limit=TEMPLATE_LIMIT):
+    """Rows like record.data(), best first, from {disease: (score, [matched symptom, ...])}."""
+    # Scores summed in another order may differ in the last bits; rounding keeps the order stable
+    order = sorted(candidates.items(), key=lambda item: (-round(item[1][0], 9), -len(item[1][1]), item[0]))
+    return [{'d.name': name, 'score': round(score, 3), 'matched': matched}
+            for name, (score, matched) in order[:limit]]
+
+
+def rank_lists(symptom_diseases, total=None, limit=TEMPLATE_LIMIT):
+    """
+    Ranked rows from {symptom: [disease, ...]}.
+
+    total: number of Disease nodes; when unknown, the distinct diseases listed.
+    """
+    if total is None:
+        total = len({disease for diseases in symptom_diseases.values() for disease in diseases})
+    candidates = {}
+    for symptom, diseases in symptom_diseases.items():
+        diseases = list(dict.fromkeys(diseases))
+        weight = symptom_idf(len(diseases), total)
+        for disease in diseases:
+            score, matched = candidates.get(disease, (0.0, []))
+            candidates[disease] = (score + weight, matched + [symptom])
+    return ranked_rows(candidates, limit)
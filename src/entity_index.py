@@ -0,0 +1,275 @@
+"""
+Fuzzy entity linking over Disease and Symptom names.
+
+Every name and alias in data/*.csv, plus each entity's description at a lower
+weight, becomes a character n-gram TF-IDF vector. The vectors are stored
+column-wise (n-gram -> rows) in NumPy arrays under cache/entity_index/ and
+loaded memory-mapped, so a query only touches the postings of its own
+n-grams. Search returns the top-k entities by cosine similarity; resolve()
+turns a user phrase such as "胃脘痛" into the canonical node name "胃疼" so
+the generated Cypher can match on {name: ...} instead of scanning with
+CONTAINS.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from csv_ingest import iter_nodes, iter_records, iter_related_diseases, split_aliases
+from intent_router import DATA_DIR, DISEASE_CUES, SYMPTOM_CUES
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cache", "entity_index")
+
+NGRAM_RANGE = (1, 3)
+DESCRIPTION_WEIGHT = 0.5
+DESCRIPTION_CHARS = 200
+RESOLVE_THRESHOLD = 0.6
+# link() keeps only matches this close to the best one for the same phrase
+LINK_MARGIN = 0.05
+
+# Question words that carry no entity information
+STOP_PHRASES = sorted(set(SYMPTOM_CUES + DISEASE_CUES + [
+    '有哪些', '有什么', '哪些', '什么', '怎么', '如何', '会', '是', '的', '了', '吗', '呢', '和', '与', '及', '或',
+]), key=len, reverse=True)
+NON_WORD = re.compile(r'[\s?？!！。.,，;；:：、"“”\'‘’()（）]+')
+
+Match = namedtuple('Match', ['name', 'label', 'score', 'matched'])
+
+ARRAYS = ('indptr', 'rows', 'weights', 'row_entity', 'idf')
+
+
+def ngrams(text, ngram_range=NGRAM_RANGE):
+    text = text.lower()
+    lo, hi = ngram_range
+    return [text[i:i + n] for n in range(lo, hi + 1) for i in range(len(text) - n + 1)]
+
+
+def source_fingerprint(paths):
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def collect_entities(data_dir=DATA_DIR):
+    """{(name, label): {'aliases': set, 'description': str}} from the same CSVs the importers read."""
+    entities = {}
+
+    def add(name, label, aliases=(), description=''):
+        entry = entities.setdefault((name, label), {'aliases': set(), 'description': ''})
+        entry['aliases'].update(a for a in aliases if a != name)
+        if description and not entry['description']:
+            entry['description'] = description
+
+    for filename in ("diseases.csv", "disease_details.csv"):
+        path = os.path.join(data_dir, filename)
+        for props in iter_nodes(path):
+            add(props['name'], 'Disease', split_aliases(props['aliases']), props['description'])
+        for record in iter_records(path):
+            if record.symptom:
+                add(record.symptom, 'Symptom')
+    for props in iter_nodes(os.path.join(data_dir, "symptoms.csv")):
+        add(props['name'], 'Symptom', split_aliases(props['aliases']), props['description'])
+    for disease, _ in iter_related_diseases(os.path.join(data_dir, "symptoms.csv")):
+        add(disease, 'Disease')
+    return entities
+
+
+class EntityIndex:
+    def __init__(self, entities, surfaces, vocab, indptr, rows, weights, row_entity, idf):
+        self.entities = entities            # [(name, label)] by entity id
+        self.surfaces = surfaces            # matched text by row id; None for description rows
+        self.vocab = vocab                  # n-gram -> column
+        self.indptr = indptr                # column -> slice of rows/weights
+        self.rows = rows
+        self.weights = weights
+        self.row_entity = row_entity
+        self.idf = idf
+
+    @classmethod
+    def build(cls, data_dir=DATA_DIR):
+        entities, surfaces, row_entity, row_weight, docs = [], [], [], [], []
+        for entity_id, ((name, label), entry) in enumerate(sorted(collect_entities(data_dir).items())):
+            entities.append((name, label))
+            for surface in [name] + sorted(entry['aliases']):
+                docs.append(Counter(ngrams(surface)))
+                surfaces.append(surface)
+                row_entity.append(entity_id)
+                row_weight.append(1.0)
+            if entry['description']:
+                docs.append(Counter(ngrams(entry['description'][:DESCRIPTION_CHARS])))
+                surfaces.append(None)
+                row_entity.append(entity_id)
+                row_weight.append(DESCRIPTION_WEIGHT)
+
+        df = Counter(gram for doc in docs for gram in doc)
+        vocab = {gram: i for i, gram in enumerate(sorted(df))}
+        idf = np.array([math.log((1 + len(docs)) / (1 + df[gram])) + 1 for gram in sorted(df)], dtype=np.float32)
+
+        postings = [[] for _ in vocab]
+        for row, doc in enumerate(docs):
+            weights = {gram: (1 + math.log(count)) * idf[vocab[gram]] for gram, count in doc.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for gram, w in weights.items():
+                postings[vocab[gram]].append((row, row_weight[row] * w / norm))
+
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in postings], out=indptr[1:])
+        rows = np.fromiter((r for p in postings for r, _ in p), dtype=np.int32, count=indptr[-1])
+        weights = np.fromiter((w for p in postings for _, w in p), dtype=np.float32, count=indptr[-1])
+        return cls(entities, surfaces, vocab, indptr, rows, weights, np.array(row_entity, dtype=np.int32), idf)
+
+    def save(self, path=CACHE_DIR, fingerprint=None):
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint, "entities": self.entities, "surfaces": self.surfaces,
+                       "vocab": self.vocab}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path=CACHE_DIR):
+        """Arrays are memory-mapped, not read into memory."""
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in ARRAYS}
+        index = cls([tuple(e) for e in meta["entities"]], meta["surfaces"], meta["vocab"], **arrays)
+        index.fingerprint = meta.get("fingerprint")
+        return index
+
+    @classmethod
+    def from_csv(cls, data_dir=DATA_DIR, path=CACHE_DIR):
+        """Load the persisted index, rebuilding it when the CSVs changed since it was saved."""
+        fingerprint = source_fingerprint(
+            [os.path.join(data_dir, name) for name in ("diseases.csv", "disease_details.csv", "symptoms.csv")])
+        try:
+            index = cls.load(path)
+            if index.fingerprint == fingerprint:
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+        cls.build(data_dir).save(path, fingerprint)
+        return cls.load(path)
+
+    def query_vector(self, text):
+        counts = Counter(gram for gram in ngrams(text) if gram in self.vocab)
+        if not counts:
+            return [], np.zeros(0, dtype=np.float32)
+        columns = [self.vocab[gram] for gram in counts]
+        weights = np.array([1 + math.log(c) for c in counts.values()], dtype=np.float32) * self.idf[columns]
+        return columns, weights / np.linalg.norm(weights)
+
+    def search(self, text, k=5, label=None):
+        """Top-k entities by cosine similarity; each entity scores as its best-matching row."""
+        columns, weights = self.query_vector(text)
+        if not columns:
+            return []
+        starts, ends = self.indptr[columns], self.indptr[np.array(columns) + 1]
+        hit_rows = np.concatenate([self.rows[s:e] for s, e in zip(starts, ends)])
+        hit_weights = np.concatenate([self.weights[s:e] * w for s, e, w in zip(starts, ends, weights)])
+        row_scores = np.bincount(hit_rows, weights=hit_weights, minlength=len(self.row_entity))
+
+        candidates = np.flatnonzero(row_scores)
+        order = candidates[np.argsort(-row_scores[candidates], kind='stable')]
+        matches, seen = [], set()
+        for row in order:
+            entity_id = int(self.row_entity[row])
+            if entity_id in seen:
+                continue
+            name, entity_label = self.entities[entity_id]
+            if label and entity_label != label:
+                continue
+            seen.add(entity_id)
+            matches.append(Match(name, entity_label, float(row_scores[row]), self.surfaces[row]))
+            if len(matches) == k:
+                break
+        return matches
+
+    def resolve(self, text, label=None, threshold=RESOLVE_THRESHOLD):
+        """Canonical name for a phrase, or None when nothing is similar enough."""
+        matches = self.search(text, k=1, label=label)
+        return matches[0].name if matches and matches[0].score >= threshold else None
+
+    def containing(self, text, label=None):
+        """Names that contain text, i.e. the nodes `name CONTAINS text` matches."""
+        return [name for name, entity_label in self.entities
+                if text in name and (label is None or entity_label == label)]
+
+    def link(self, question, k=3, threshold=RESOLVE_THRESHOLD):
+        """Entities mentioned in a question: question words are stripped and each remaining phrase is resolved."""
+        text = question
+        for phrase in STOP_PHRASES:
+            text = text.replace(phrase, ' ')
+        linked = []
+        for phrase in NON_WORD.split(text):
+            if not phrase:
+                continue
+            matches = self.search(phrase, k=k)
+            for match in matches:
+                if match.score >= max(threshold, matches[0].score - LINK_MARGIN) and match not in linked:
+                    linked.append(match)
+        return linked
+
+
+def format_entities(matches):
+    """Prompt line listing linked entities with their exact node names."""
+    if not matches:
+        return "(none)"
+    return "; ".join(f"{m.label} '{m.name}'" + (f" (mentioned as '{m.matched}')" if m.matched and m.matched != m.name else "")
+                     for m in matches)
+
+
+# Literal name matches in generated Cypher: `x.name CONTAINS 'foo'`, `x.name = 'foo'` and `{name: 'foo'}`
+NAME_PREDICATE = re.compile(r"(\w+)\.name\s+(CONTAINS|=)\s+(['\"])(.+?)\3", re.IGNORECASE)
+NAME_PROPERTY = re.compile(r"(\w+):(\w+)\s*\{\s*name\s*:\s*(['\"])(.+?)\3\s*\}")
+PATTERN_LABEL = re.compile(r"\(\s*(\w+)\s*:\s*(\w+)")
+
+
+def rewrite_cypher(cypher, index, threshold=RESOLVE_THRESHOLD):
+    """
+    Replace fuzzy or unresolved name literals with exact canonical names.
+
+    `s.name CONTAINS '胃脘痛'` becomes `s.name = '胃疼'` when the phrase
+    resolves for the variable's label, so the query can use the name index.
+    A CONTAINS literal that is part of some node name (`CONTAINS '肝炎'`)
+    matches all of those nodes and is left unchanged, as are literals that
+    do not resolve.
+    """
+    labels = dict(PATTERN_LABEL.findall(cypher))
+
+    def predicate(m):
+        variable, operator, quote, text = m.groups()
+        if operator.upper() == 'CONTAINS' and index.containing(text, labels.get(variable)):
+            return m.group(0)
+        name = index.resolve(text, labels.get(variable), threshold)
+        return f"{variable}.name = {quote}{name}{quote}" if name else m.group(0)
+
+    def prop(m):
+        variable, label, quote, text = m.groups()
+        name = index.resolve(text, label, threshold)
+        return f"{variable}:{label} {{name: {quote}{name or text}{quote}}}"
+
+    return NAME_PROPERTY.sub(prop, NAME_PREDICATE.sub(predicate, cypher))
+
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    index = EntityIndex.from_csv()
+    print(f"{len(index.entities)} entities, {len(index.row_entity)} rows, {len(index.vocab)} n-grams "
+          f"({time.perf_counter() - start:.2f}s)")
+    for phrase in ["胃脘痛", "胃痛", "腰间盘突出", "糖尿", "头晕眼花"]:
+        print(phrase, '->', index.search(phrase, k=3))
+    print(index.link("胃脘痛是什么病引起的？"))
+    print(rewrite_cypher("MATCH (d:Disease)-[:HAS_SYMPTOM]->(s:Symptom) WHERE s.name CONTAINS '胃脘痛' RETURN d.name",
+                         index))
+    start = time.perf_counter()
+    for _ in range(1000):
+        index.search("腰间盘突出", k=5)
+    print(f"search: {(time.perf_counter() - start):.3f}ms per query")
@@ -24,16 +24,16 @@ prompt_strategies = {
 # 定义三种不同的 Temperature
 temperatures = [0, 0.5, 1.0]
 
-results = []
 
-print("开始执行提取实验 (3种 Temperature x 3种 Prompt)...")
-print("-" * 50)
+def main():
+    # 单条文本的演示；在标注集上并行对比多个模型/Schema 并评分、统计耗时和成本见 experiment_grid.py
+    results = []
 
-for temp in temperatures:
-    for p_name, p_desc in prompt_strategies.items():
-        print(f"Testing: Temp={temp}, Prompt={p_name}")
-        
-        # 1. 初始化 LLM
+    print("开始执行提取实验 (3种 Temperature x 3种 Prompt)...")
+    print("-" * 50)
+
+    for temp in temperatures:
+        # 1. 初始化 LLM (同一 Temperature 的三种 Prompt 共用一个客户端)
         llm = ChatOpenAI(
             model="qwen-plus",
             temperature=temp,
@@ -41,43 +41,50 @@ for temp in temperatures:
             base_url=BASE_URL
         )
 
-        # 2. 动态定义 Schema (根据当前的 Prompt 策略)
-        disease_schema = Object(
-            id="disease_info",
-            description=p_desc, # 这里动态插入不同的 Prompt 描述
-            attributes=[
-                Text(id="name", description="疾病名称"),
-                Text(id="cause", description="发病原因"),
-                Text(id="symptom", description="临床表现/症状")
-            ],
-            examples=[] # 为简化实验，此处不使用 Few-shot 示例，纯测 Prompt 效果
-        )
+        for p_name, p_desc in prompt_strategies.items():
+            print(f"Testing: Temp={temp}, Prompt={p_name}")
+
+            # 2. 动态定义 Schema (根据当前的 Prompt 策略)
+            disease_schema = Object(
+                id="disease_info",
+                description=p_desc, # 这里动态插入不同的 Prompt 描述
+                attributes=[
+                    Text(id="name", description="疾病名称"),
+                    Text(id="cause", description="发病原因"),
+                    Text(id="symptom", description="临床表现/症状")
+                ],
+                examples=[] # 为简化实验，此处不使用 Few-shot 示例，纯测 Prompt 效果
+            )
 
-        # 3. 创建并执行 Chain
-        try:
-            chain = create_extraction_chain(llm, disease_schema)
-            output = chain.invoke(test_text)['data']
+            # 3. 创建并执行 Chain
+            try:
+                chain = create_extraction_chain(llm, disease_schema)
+                output = chain.invoke(test_text)['data']
             
-            # 记录结果
-            results.append({
-                "Temperature": temp,
-                "Prompt_Strategy": p_name,
-                "Extracted_Data": output
-            })
-        except Exception as e:
-            print(f"Error: {e}")
+                # 记录结果
+                results.append({
+                    "Temperature": temp,
+                    "Prompt_Strategy": p_name,
+                    "Extracted_Data": output
+                })
+            except Exception as e:
+                print(f"Error: {e}")
+
+    print("-" * 50)
+    print("实验结束，正在生成对比表格...")
+
+    # 4. 展示结果
+    df_results = pd.DataFrame(results)
 
-print("-" * 50)
-print("实验结束，正在生成对比表格...")
+    # 设置 pandas 显示选项以便查看完整内容
+    pd.set_option('display.max_colwidth', None)
+    pd.set_option('display.max_rows', None)
 
-# 4. 展示结果
-df_results = pd.DataFrame(results)
+    print(df_results)
 
-# 设置 pandas 显示选项以便查看完整内容
-pd.set_option('display.max_colwidth', None)
-pd.set_option('display.max_rows', None)
+    # 可选：保存到 Excel 方便截图提交
+    # df_results.to_excel("extraction_experiment_results.xlsx", index=False)
 
-print(df_results)
 
-# 可选：保存到 Excel 方便截图提交
-# df_results.to_excel("extraction_experiment_results.xlsx", index=False)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
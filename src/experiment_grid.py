@@ -0,0 +1,367 @@
+# coding=utf-8
+"""
+抽取实验网格: Prompt 策略 x Temperature x 模型 x Schema 变体。
+
+每个格子 (cell) 在标注集 data/extraction_gold.jsonl 的全部文本上运行一遍，
+所有 (cell, 文本) 任务放进同一个线程池并行执行，并共享 extraction_pipeline 的
+token 预算限流。大模型响应按 (Prompt, Schema, 模型, Temperature, 输入文本) 缓存在
+SQLite 中，重复运行不再调用接口；缓存中同时保存首次调用的耗时和 token 用量，
+所以重跑得到的耗时/成本统计不变。
+
+每个格子按标注计算症状/成因的 precision/recall/F1 和名称准确率，连同平均/P95 耗时、
+token 用量和费用写入列式结果文件 (Parquet，未安装 pyarrow 时为 CSV)，
+并给出达到准确率要求的格子中最便宜、最快的一个。
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from kor.extraction import create_extraction_chain
+from kor.nodes import Object, Text
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langchain_openai import ChatOpenAI
+
+from answer_cache import estimate_tokens
+from experiment_extraction import prompt_strategies, temperatures
+from extraction_pipeline import BASE_URL, MAX_OUTPUT_TOKENS, PROMPT_OVERHEAD_TOKENS, TokenBudget
+from intent_router import DATA_DIR
+
+load_dotenv()
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cache")
+GOLD_PATH = os.path.join(DATA_DIR, "extraction_gold.jsonl")
+RESPONSE_CACHE_PATH = os.path.join(CACHE_DIR, "experiment_responses.sqlite3")
+OUTPUT_DIR = os.path.join(CACHE_DIR, "experiments")
+
+DEFAULT_SCHEMAS = {
+    # experiment_extraction.py 中的 Schema
+    "basic": {
+        "name": "疾病名称",
+        "cause": "发病原因",
+        "symptom": "临床表现/症状",
+    },
+    # 成因、症状逐项列出
+    "itemized": {
+        "name": "疾病名称",
+        "cause": {"description": "发病原因，每个原因单独一项", "many": True},
+        "symptom": {"description": "单个症状，每个症状单独一项", "many": True},
+    },
+}
+
+# 元/千 tokens (输入, 输出)，以阿里云百炼价格页为准，可在 spec 的 prices 中覆盖
+DEFAULT_PRICES = {
+    "qwen-turbo": (0.0003, 0.0006),
+    "qwen-plus": (0.0008, 0.002),
+    "qwen-max": (0.0024, 0.0096),
+}
+
+ITEM_SEPARATORS = re.compile(r'[、，,；;。\n]+|以及|和|及|或')
+
+Cell = namedtuple('Cell', ['prompt', 'temperature', 'model', 'schema'])
+
+
+def default_spec():
+    return {
+        "name": "extraction",
+        "prompts": dict(prompt_strategies),
+        "temperatures": list(temperatures),
+        "models": ["qwen-plus"],
+        "schemas": DEFAULT_SCHEMAS,
+        "gold": GOLD_PATH,
+        "prices": {},
+    }
+
+
+def load_spec(path=None):
+    """JSON spec 中给出的键覆盖默认网格"""
+    spec = default_spec()
+    if path:
+        with open(path, encoding='utf-8') as f:
+            spec.update(json.load(f))
+    return spec
+
+
+def load_gold(path=GOLD_PATH):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def build_schema(description, attributes):
+    """attributes: {id: 描述} 或 {id: {"description": ..., "many": bool}}"""
+    nodes = []
+    for attr_id, attr in attributes.items():
+        attr = attr if isinstance(attr, dict) else {"description": attr}
+        nodes.append(Text(id=attr_id, description=attr["description"], many=attr.get("many", False)))
+    return Object(id="disease_info", description=description, attributes=nodes, examples=[])
+
+
+def response_key(cell, spec, text):
+    payload = [spec["prompts"][cell.prompt], spec["schemas"][cell.schema], cell.model, cell.temperature, text]
+    return hashlib.sha1(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """SQLite 中的大模型响应缓存: key -> (抽取结果, 首次调用的耗时和 token 用量)"""
+
+    def __init__(self, path=RESPONSE_CACHE_PATH):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?)",
+                              (key, json.dumps(value, ensure_ascii=False)))
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def extracted_items(data, field):
+    """kor 输出中某个字段的全部取值，按顿号/逗号等拆成单项"""
+    items = []
+
+    def walk(value):
+        if isinstance(value, dict):
+            for key, inner in value.items():
+                if key == field:
+                    collect(inner)
+                elif isinstance(inner, (dict, list)):
+                    walk(inner)
+        elif isinstance(value, list):
+            for inner in value:
+                walk(inner)
+
+    def collect(value):
+        for text in value if isinstance(value, list) else [value]:
+            for item in ITEM_SEPARATORS.split(str(text or '')):
+                item = item.strip().rstrip('等').strip()
+                if item and item not in items:
+                    items.append(item)
+
+    walk(data or {})
+    return items
+
+
+def matches(predicted, gold):
+    return predicted == gold or (len(predicted) >= 2 and (predicted in gold or gold in predicted))
+
+
+def match_counts(predicted, gold):
+    """(tp, fp, fn): 标注项被任一预测项匹配即算命中，未匹配任何标注项的预测项算误报"""
+    tp = sum(any(matches(p, g) for p in predicted) for g in gold)
+    fp = sum(not any(matches(p, g) for g in gold) for p in predicted)
+    return tp, fp, len(gold) - tp
+
+
+def prf(tp, fp, fn):
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
+
+
+def score_item(item, data):
+    names = extracted_items(data, 'name')
+    row = {'name_correct': any(matches(n, item['name']) for n in names)}
+    for field, gold_key in (('symptom', 'symptoms'), ('cause', 'causes')):
+        row[f'{field}_tp'], row[f'{field}_fp'], row[f'{field}_fn'] = match_counts(
+            extracted_items(data, field), item[gold_key])
+    return row
+
+
+class GridRunner:
+    def __init__(self, spec, api_key, base_url=BASE_URL, concurrency=8, tokens_per_minute=100_000,
+                 requests_per_minute=600, cache=None, refresh=False, max_retries=3, timeout=60):
+        self.spec = spec
+        self.api_key = api_key
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.budget = TokenBudget(tokens_per_minute, requests_per_minute)
+        self.cache = cache or ResponseCache()
+        self.refresh = refresh
+        self.prices = dict(DEFAULT_PRICES, **{k: tuple(v) for k, v in spec.get("prices", {}).items()})
+        self.llms = {}
+        self.chains = {}
+        self.lock = threading.Lock()
+
+    def cells(self):
+        return [Cell(*values) for values in itertools.product(
+            self.spec["prompts"], self.spec["temperatures"], self.spec["models"], self.spec["schemas"])]
+
+    def _chain(self, cell):
+        """每个 (模型, Temperature) 一个客户端，每个格子一条抽取链，均在首次使用时创建"""
+        with self.lock:
+            chain = self.chains.get(cell)
+            if chain is None:
+                llm = self.llms.get((cell.model, cell.temperature))
+                if llm is None:
+                    llm = ChatOpenAI(model=cell.model, temperature=cell.temperature, api_key=self.api_key,
+                                     base_url=self.base_url, max_retries=self.max_retries, timeout=self.timeout)
+                    self.llms[(cell.model, cell.temperature)] = llm
+                schema = build_schema(self.spec["prompts"][cell.prompt], self.spec["schemas"][cell.schema])
+                chain = self.chains[cell] = create_extraction_chain(llm, schema)
+            return chain
+
+    def run_item(self, cell, item):
+        key = response_key(cell, self.spec, item["text"])
+        cached = None if self.refresh else self.cache.get(key)
+        if cached is not None:
+            return dict(cached, cached=True)
+
+        reserved = self.budget.acquire(estimate_tokens(item["text"]) + PROMPT_OVERHEAD_TOKENS + MAX_OUTPUT_TOKENS)
+        usage = UsageMetadataCallbackHandler()
+        used = reserved
+        start = time.perf_counter()
+        try:
+            output = self._chain(cell).invoke(item["text"], config={"callbacks": [usage]})
+        except Exception as e:
+            return {'data': None, 'error': f"{e.__class__.__name__}: {e}", 'seconds': time.perf_counter() - start,
+                    'prompt_tokens': 0, 'completion_tokens': 0, 'cached': False}
+        else:
+            totals = usage.usage_metadata.values()
+            result = {'data': output['data'], 'error': None, 'seconds': time.perf_counter() - start,
+                      'prompt_tokens': sum(u.get('input_tokens', 0) for u in totals),
+                      'completion_tokens': sum(u.get('output_tokens', 0) for u in totals)}
+            used = result['prompt_tokens'] + result['completion_tokens'] or reserved
+            self.cache.put(key, result)
+            return dict(result, cached=False)
+        finally:
+            self.budget.settle(reserved, used)
+
+    def run(self, gold):
+        """返回 (逐条结果, 每格汇总) 两个 DataFrame"""
+        tasks = [(cell, item) for cell in self.cells() for item in gold]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            results = list(pool.map(lambda task: self.run_item(*task), tasks))
+
+        rows = []
+        for (cell, item), result in zip(tasks, results):
+            row = dict(cell._asdict(), item=item["id"], seconds=result['seconds'], cached=result['cached'],
+                       prompt_tokens=result['prompt_tokens'], completion_tokens=result['completion_tokens'],
+                       error=result['error'], data=json.dumps(result['data'], ensure_ascii=False))
+            row.update(score_item(item, result['data']))
+            rows.append(row)
+        items = pd.DataFrame(rows)
+        return items, self.summarize(items)
+
+    def cost(self, model, prompt_tokens, completion_tokens):
+        input_price, output_price = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * input_price + completion_tokens * output_price) / 1000
+
+    def summarize(self, items):
+        cells = []
+        for cell, group in items.groupby(list(Cell._fields), sort=False):
+            cell = Cell(*cell)
+            row = cell._asdict()
+            row['items'] = len(group)
+            row['errors'] = int(group['error'].notna().sum())
+            row['cached'] = int(group['cached'].sum())
+            for field in ('symptom', 'cause'):
+                row[f'{field}_precision'], row[f'{field}_recall'], row[f'{field}_f1'] = prf(
+                    group[f'{field}_tp'].sum(), group[f'{field}_fp'].sum(), group[f'{field}_fn'].sum())
+            row['f1'] = (row['symptom_f1'] + row['cause_f1']) / 2
+            row['name_accuracy'] = float(group['name_correct'].mean())
+            row['latency_mean_s'] = float(group['seconds'].mean())
+            row['latency_p95_s'] = float(np.percentile(group['seconds'], 95))
+            row['prompt_tokens'] = int(group['prompt_tokens'].sum())
+            row['completion_tokens'] = int(group['completion_tokens'].sum())
+            row['cost'] = self.cost(cell.model, row['prompt_tokens'], row['completion_tokens'])
+            cells.append(row)
+        return pd.DataFrame(cells)
+
+    def close(self):
+        self.cache.close()
+
+
+def pick(cells, min_f1):
+    """达到 min_f1 的格子中费用最低的，费用相同时取平均耗时最短的；没有达标的返回 None"""
+    eligible = cells[(cells['f1'] >= min_f1) & (cells['errors'] == 0)]
+    if eligible.empty:
+        return None
+    return eligible.sort_values(['cost', 'latency_mean_s']).iloc[0]
+
+
+def write_table(df, path):
+    """写入 Parquet；未安装 pyarrow 时改写为同名 CSV，返回实际写入的路径"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if path.endswith('.parquet'):
+        try:
+            df.to_parquet(path, index=False)
+            return path
+        except ImportError:
+            path = path[:-len('.parquet')] + '.csv'
+            print(f"未安装 pyarrow，结果改为写入 {path}")
+    df.to_csv(path, index=False, encoding='utf-8-sig')
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抽取实验网格: Prompt x Temperature x 模型 x Schema")
+    parser.add_argument("--spec", help="JSON 网格定义 (prompts/temperatures/models/schemas/gold/prices)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tpm", type=int, default=100_000, help="每分钟 token 上限")
+    parser.add_argument("--rpm", type=int, default=600, help="每分钟请求数上限")
+    parser.add_argument("--min-f1", type=float, default=0.6, help="选择策略时要求的最低 F1")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--refresh", action="store_true", help="忽略响应缓存重新调用")
+    parser.add_argument("--base-url", default=BASE_URL)
+    args = parser.parse_args()
+
+    api_key = os.getenv('DASHSCOPE_API_KEY')
+    if not api_key:
+        raise SystemExit("未找到 API Key，请检查环境变量 DASHSCOPE_API_KEY")
+
+    spec = load_spec(args.spec)
+    gold = load_gold(spec["gold"])
+    runner = GridRunner(spec, api_key, args.base_url, args.concurrency, args.tpm, args.rpm, refresh=args.refresh)
+    print(f"实验 {spec['name']}: {len(runner.cells())} 个格子 x {len(gold)} 条标注文本 (并发 {args.concurrency})")
+    start = time.perf_counter()
+    try:
+        items, cells = runner.run(gold)
+    finally:
+        runner.close()
+    print(f"完成，耗时 {time.perf_counter() - start:.1f}s，缓存命中 {int(items['cached'].sum())}/{len(items)}")
+
+    cells_path = write_table(cells, os.path.join(args.output_dir, f"{spec['name']}_cells.parquet"))
+    items_path = write_table(items, os.path.join(args.output_dir, f"{spec['name']}_items.parquet"))
+    print(f"结果已写入 {cells_path} 和 {items_path}")
+
+    pd.set_option('display.max_rows', None)
+    pd.set_option('display.width', 200)
+    columns = list(Cell._fields) + ['f1', 'symptom_f1', 'cause_f1', 'name_accuracy', 'latency_mean_s', 'cost', 'errors']
+    print(cells.sort_values('f1', ascending=False)[columns].to_string(index=False, float_format='%.3f'))
+
+    best = pick(cells, args.min_f1)
+    if best is None:
+        print(f"\n没有 F1 >= {args.min_f1} 且无错误的格子")
+    else:
+        print(f"\n推荐 (F1 >= {args.min_f1} 中费用最低、耗时最短): prompt={best['prompt']}, "
+              f"temperature={best['temperature']}, model={best['model']}, schema={best['schema']} "
+              f"(F1 {best['f1']:.3f}, {best['latency_mean_s']:.2f}s/条, {best['cost']:.4f} 元)")
+
+
+if __name__ == "__main__":
+    main()
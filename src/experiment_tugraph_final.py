@@ -1,54 +1,51 @@
 import os
-from openai import OpenAI
-from neo4j import GraphDatabase
 from dotenv import load_dotenv
 
+from cypher_guard import GuardError
+from graph_backend import ReplicaBackend, TuGraphBackend
+from graph_pool import POOL_SIZE
+from qa_engine import GraphQA
+from telemetry import Telemetry, log, render_metrics, setup_logging
+
 load_dotenv()
 
-class TuGraphQA:
-    def __init__(self):
-        # 1. 连接 TuGraph 
-        uri = os.getenv('TUGRAPH_URI', 'bolt://59.110.166.54:7687')
-        user = os.getenv('TUGRAPH_USERNAME', 'admin')
-        password = os.getenv('TUGRAPH_PASSWORD', '73@TuGraph')
-        
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
-        
-        # 2. 连接阿里云大模型
+BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+
+class TuGraphQA(GraphQA):
+    """GraphQA over TuGraph，使用中文 Prompt；Schema 由导入时统计的标签、属性、数量和度分布生成，按图版本缓存"""
+
+    # 总结回答保留一定的多样性
+    answer_temperature = 0.5
+
+    def __init__(self, use_snapshot=False, pool_size=POOL_SIZE, warmup=True, schema_refresh_interval=60,
+                 telemetry=None, backend=None, read_backends=()):
+        # 1. 连接 TuGraph (进程内共享 driver，会话长期复用)，未传入 backend 时从环境变量读取连接信息
+        #    TUGRAPH_REPLICA_URIS (逗号分隔) 配置只读副本: 读请求发往负载最低的健康节点，
+        #    慢请求对冲、连接失败自动切换；导入程序只使用 TUGRAPH_URI，写入固定在主库
+        if backend is None:
+            uri = os.getenv('TUGRAPH_URI', 'bolt://59.110.166.54:7687')
+            user = os.getenv('TUGRAPH_USERNAME', 'admin')
+            password = os.getenv('TUGRAPH_PASSWORD', '73@TuGraph')
+            replicas = [u.strip() for u in os.getenv('TUGRAPH_REPLICA_URIS', '').split(',') if u.strip()]
+            endpoints = [TuGraphBackend(u, user, password, pool_size=pool_size, warmup=warmup,
+                                        schema_refresh_interval=schema_refresh_interval) for u in [uri] + replicas]
+            backend = ReplicaBackend(endpoints) if replicas else endpoints[0]
+            log.info(f"系统初始化完成，已连接到 TuGraph: {uri}" + (f" (只读副本: {', '.join(replicas)})" if replicas else ""))
+
+        # 2. 阿里云大模型客户端在首次调用时创建
         api_key = os.getenv('DASHSCOPE_API_KEY')
         if not api_key:
             raise ValueError("未找到 API Key，请检查环境变量")
 
-        self.client = OpenAI(
-            api_key=api_key,
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-        )
-        
-        print(f"系统初始化完成，已连接到 TuGraph: {uri}")
-        self.schema = self.get_schema()
+        # 3. Schema 统计 (每隔 schema_refresh_interval 秒检查一次图版本，版本不变时不重新生成)、Cypher/回答缓存、
+        #    模板路由、实体链接、Cypher 检查以及按查询形态选择读库均由 GraphQA 完成
+        super().__init__(backend, api_key, BASE_URL, read_backends=read_backends, use_snapshot=use_snapshot,
+                         telemetry=telemetry or Telemetry("tugraph"))
+        log.info(f"读取到数据库 Schema:\n{self.schema}")
 
-    def get_schema(self):
-        """获取数据库真实的 Schema，用于构建 Prompt"""
-        with self.driver.session(database='default') as session:
-            try:
-                # 获取节点标签
-                v_res = session.run("CALL db.vertexLabels()")
-                labels = [r[0] for r in v_res]
-                
-                # 获取关系标签
-                e_res = session.run("CALL db.edgeLabels()")
-                rels = [r[0] for r in e_res]
-                
-                schema_info = f"Node Labels: {labels}\nRelationship Types: {rels}"
-                print(f"读取到数据库 Schema:\n{schema_info}")
-                return schema_info
-            except Exception as e:
-                print(f"获取 Schema 失败: {e}")
-                return "Schema fetch failed"
-
-    def generate_cypher(self, question):
-        """让大模型将自然语言转为 Cypher"""
-        prompt = f"""你是一个 TuGraph 图数据库查询专家。
+    def cypher_prompt(self, question, entities, feedback=""):
+        limit = self.backend.dialect.result_limit
+        return f"""你是一个 TuGraph 图数据库查询专家。
 请根据以下 Schema 编写 Cypher 查询语句。
 
 Database Schema:
@@ -60,81 +57,96 @@ Schema 解释:
 - 它们通过 HAS_SYMPTOM 关系连接: (:Disease)-[:HAS_SYMPTOM]->(:Symptom)
 
 用户问题: "{question}"
-
+已链接的实体: {entities}
+{feedback}
 要求:
 1. 仅输出 Cypher 语句，不要有任何 Markdown 标记或解释。
-2. 使用 CONTAINS 进行模糊匹配以提高召回率。
-3. 限制返回结果数量 (LIMIT 10)。
+2. 使用 {{name: '...'}} 精确匹配节点名称，名称取自上面已链接的实体，不要使用 CONTAINS。
+3. 限制返回结果数量 (LIMIT {limit})。
+4. 不要使用 APOC 过程、CALL 子查询或列表推导式；Symptom.diseases 是 JSON 字符串，请通过 HAS_SYMPTOM 关系查询。
 
 示例:
 问: 感冒有什么症状?
-Cypher: MATCH (d:Disease)-[:HAS_SYMPTOM]->(s:Symptom) WHERE d.name CONTAINS '感冒' RETURN s.name
+Cypher: MATCH (d:Disease {{name: '感冒'}})-[:HAS_SYMPTOM]->(s:Symptom) RETURN s.name LIMIT {limit}
 
 问: 什么病会导致头痛?
-Cypher: MATCH (d:Disease)-[:HAS_SYMPTOM]->(s:Symptom) WHERE s.name CONTAINS '头痛' RETURN d.name
+Cypher: MATCH (d:Disease)-[:HAS_SYMPTOM]->(s:Symptom {{name: '头痛'}}) RETURN d.name LIMIT {limit}
 
 生成的 Cypher:"""
 
-        response = self.client.chat.completions.create(
-            model="qwen-plus",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0
-        )
-        return response.choices[0].message.content.strip()
+    def answer_prompt(self, question, context):
+        # context 为按 token 预算压缩后的表格 (PackedContext)
+        return f"用户问：'{question}'。数据库查询结果为：\n{context.text}\n请用自然流畅的中文回答用户，列举主要几项即可。"
+
+    # 与早期版本保持一致的名称
+    answer_stream = GraphQA.query_stream
+
+    def get_schema(self):
+        """获取 Prompt 使用的数据库 Schema"""
+        return self.schema
 
     def execute_query(self, cypher):
-        """执行 Cypher 查询"""
-        with self.driver.session(database='default') as session:
-            result = session.run(cypher)
-            return [r.values()[0] for r in result]
+        """执行 Cypher 查询，按早期版本的格式返回每行第一列的值"""
+        return [next(iter(row.values()), None) for row in self.execute_cypher(cypher)]
 
     def answer_question(self, question):
-        print(f"\n{'='*40}")
-        print(f"用户提问: {question}")
-        print(f"{'='*40}")
+        with self.telemetry.question(question) as root:
+            self._answer_question(question, root)
+
+    def _answer_question(self, question, root):
+        log.info(f"\n{'='*40}")
+        log.info(f"用户提问: {question}")
+        log.info(f"{'='*40}")
         
-        # 1. 生成 Cypher
-        cypher = self.generate_cypher(question)
-        print(f"[1] 生成的 Cypher 语句:\n{cypher}")
+        # 1. 生成 Cypher (优先匹配模板)
+        try:
+            route, cypher, params = self.plan(question)
+        except GuardError as e:
+            root.status = f"error: {e.__class__.__name__}"
+            log.error(f"[Error] 重新生成后 Cypher 仍未通过检查: {e}")
+            return
+        if route:
+            log.info(f"[1] 模板 Cypher 语句 ({route.intent}):\n{cypher}  参数: {params}")
+        else:
+            log.info(f"[1] 生成的 Cypher 语句:\n{cypher}")
         
-        # 2. 查询数据库
+        # 2. 查询数据库 (由最快的读库执行)
         try:
-            results = self.execute_query(cypher)
-            print(f"[2] 数据库返回结果数: {len(results)}")
+            results = self.fetch(route, cypher, params)
+            log.info(f"[2] 数据库返回结果数: {len(results)}")
             
             if not results:
-                print("    (未找到匹配结果)")
-                final_answer = "抱歉，数据库中没有找到相关信息。"
-            else:
-                # 3. 生成最终回复
-                context = ",".join([str(r) for r in results[:20]]) # 限制上下文长度
-                summary_prompt = f"用户问：'{question}'。数据库查询结果为：{context}。请用自然流畅的中文回答用户，列举主要几项即可。"
+                log.info("    (未找到匹配结果)")
+            # 3. 生成最终回复，没有结果时不调用大模型；结果按 token 预算压缩后放入 Prompt
+            final_answer = self.cached_answer(question, route, cypher, params, results)
                 
-                resp = self.client.chat.completions.create(
-                    model="qwen-plus",
-                    messages=[{"role": "user", "content": summary_prompt}],
-                    temperature=0.5
-                )
-                final_answer = resp.choices[0].message.content.strip()
-                
-            print(f"[3] 最终回答:\n{final_answer}")
+            log.info(f"[3] 最终回答:\n{final_answer}")
             
         except Exception as e:
-            print(f"[Error] 查询执行失败: {e}")
-
-    def close(self):
-        self.driver.close()
+            root.status = f"error: {e.__class__.__name__}"
+            log.error(f"[Error] 查询执行失败: {e}", exc_info=True)
 
 if __name__ == "__main__":
+    setup_logging()
     qa = TuGraphQA()
     
     # 测试两个问题：一个是正向查症状，一个是反向查疾病
     questions = [
         "腰椎间盘突出有哪些症状？",  # 测试 diseases.csv 的数据
-        "什么病会导致肚子疼？"      # 测试 disease_details.csv 的数据 
+        "什么病会导致肚子疼？",     # 测试 disease_details.csv 的数据
+        "头晕、恶心、乏力可能是什么病？"  # 多症状诊断排序 (IDF 加权重合度)
     ]
     
     for q in questions:
         qa.answer_question(q)
-        
+
+    log.info(f"\n模板命中统计: {qa.router.stats}")
+    log.info(f"Cypher 缓存统计: {qa.cypher_cache.metrics()}")
+    log.info(f"回答缓存统计: {qa.answer_cache.metrics()}")
+    log.info(f"上下文压缩统计: {qa.packer.metrics()}")
+    log.info(f"Cypher 检查统计: {qa.guard.stats}")
+    log.info(f"各读库按查询形态的延迟: {qa.backend_stats()}")
+    if isinstance(qa.backend, ReplicaBackend):
+        log.info(f"各节点延迟与健康状态: {qa.backend.stats()}")
+    log.debug(render_metrics())
     qa.close()
\ No newline at end of file
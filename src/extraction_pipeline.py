@@ -0,0 +1,283 @@
+# coding=utf-8
+"""
+全量语料的成因/症状抽取流水线。
+
+逐条读取 disease_details.csv 的 Overview 和 diseases.csv 的 Description，
+用 experiment_extraction.py 中 Strategy_3_Strict 的 kor Schema 抽取 (名称、成因、症状)，
+另设 many=True，一段正文可抽出多个疾病，结果为列表：
+
+* 有界并发: 固定数量的工作线程，在途任务数不超过 2 x 并发数，语料再大内存也不增长
+* 复用客户端: 整个进程只创建一个 ChatOpenAI 和一条抽取链，由所有线程共享
+* 按 token 预算限流: 每分钟 token 数和请求数两个令牌桶，调用前按估算值预扣，
+  调用后按实际用量 (usage_metadata) 多退少补
+* 断点续跑: 每条结果立即追加写入 JSONL 检查点；重启时已成功抽取的输入哈希直接跳过，
+  失败的记录下次重试；输入哈希包含模型和 temperature，换参数后重新抽取
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from dotenv import load_dotenv
+from kor.extraction import create_extraction_chain
+from kor.nodes import Object, Text
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langchain_openai import ChatOpenAI
+
+from answer_cache import estimate_tokens
+from csv_ingest import clean, iter_rows, row_name
+from intent_router import DATA_DIR
+
+load_dotenv()
+
+BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+MODEL = "qwen-plus"
+CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cache", "extraction.jsonl")
+SOURCES = [os.path.join(DATA_DIR, "disease_details.csv"), os.path.join(DATA_DIR, "diseases.csv")]
+
+# 依次尝试的正文列 (详情表为 Overview，主表为 Description)
+TEXT_COLUMNS = ['Overview', '概述', 'Description', '描述']
+
+# Prompt/Schema 变化时递增，旧检查点中的结果随之失效 (哈希不同)
+PROMPT_VERSION = 1
+SCHEMA_DESCRIPTION = "仅提取明确提及的实体。忽略所有修饰性形容词。如果文本中未提及，请不要编造信息。"
+
+# kor 生成的 Prompt 除正文外的固定部分，以及预留的输出长度，用于调用前的 token 估算
+PROMPT_OVERHEAD_TOKENS = 400
+MAX_OUTPUT_TOKENS = 300
+
+Record = namedtuple('Record', ['source', 'name', 'text', 'input_hash'])
+
+
+def input_hash(name, text, model=MODEL, temperature=0):
+    # temperature 统一为 float，0 与 0.0 得到相同的哈希
+    payload = f"{PROMPT_VERSION}\n{model}\n{float(temperature)}\n{name}\n{text}"
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def iter_corpus(paths=SOURCES, model=MODEL, temperature=0):
+    """逐行产出待抽取的记录，跳过没有正文的行"""
+    for path in paths:
+        source = os.path.basename(path)
+        for row in iter_rows(path):
+            name = row_name(row)
+            text = next((clean(row[col]) for col in TEXT_COLUMNS if clean(row.get(col))), '')
+            if name and text:
+                yield Record(source, name, text, input_hash(name, text, model, temperature))
+
+
+def build_schema():
+    return Object(
+        id="disease_info",
+        description=SCHEMA_DESCRIPTION,
+        attributes=[
+            Text(id="name", description="疾病名称"),
+            Text(id="cause", description="发病原因"),
+            Text(id="symptom", description="临床表现/症状")
+        ],
+        examples=[],
+        many=True
+    )
+
+
+class TokenBudget:
+    """
+    每分钟 token 数 / 请求数的令牌桶，多个线程共享。
+
+    acquire() 按估算值预扣并在额度不足时阻塞；settle() 用实际用量修正，
+    实际用量超出估算时余额可以为负，后续请求等待补齐。
+    """
+
+    def __init__(self, tokens_per_minute, requests_per_minute=None):
+        self.token_capacity = tokens_per_minute
+        self.tokens = float(tokens_per_minute)
+        self.request_capacity = requests_per_minute
+        self.requests = float(requests_per_minute or 0)
+        self.updated = time.monotonic()
+        self.cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        self.tokens = min(self.token_capacity, self.tokens + elapsed * self.token_capacity / 60)
+        if self.request_capacity:
+            self.requests = min(self.request_capacity, self.requests + elapsed * self.request_capacity / 60)
+
+    def acquire(self, tokens):
+        """预扣 tokens (单次不超过桶容量)，返回实际预扣的数量"""
+        tokens = min(tokens, self.token_capacity)
+        with self.cond:
+            while True:
+                self._refill()
+                token_wait = max(0.0, tokens - self.tokens) * 60 / self.token_capacity
+                request_wait = (max(0.0, 1 - self.requests) * 60 / self.request_capacity
+                                if self.request_capacity else 0.0)
+                if token_wait == 0 and request_wait == 0:
+                    self.tokens -= tokens
+                    if self.request_capacity:
+                        self.requests -= 1
+                    return tokens
+                self.cond.wait(max(token_wait, request_wait))
+
+    def settle(self, reserved, used):
+        with self.cond:
+            self._refill()
+            self.tokens = min(self.token_capacity, self.tokens + reserved - used)
+            self.cond.notify_all()
+
+
+class Checkpoint:
+    """追加写入的 JSONL 检查点，记录每条输入哈希的抽取结果"""
+
+    def __init__(self, path=CHECKPOINT_PATH):
+        self.path = path
+        self.done = set()
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        ends_cleanly = True
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    ends_cleanly = line.endswith('\n')
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 进程崩溃时最后一行可能只写了一半，忽略，该记录会重新抽取
+                        continue
+                    if not entry.get('error'):
+                        self.done.add(entry['input_hash'])
+        self.file = open(path, 'a', encoding='utf-8')
+        if not ends_cleanly:
+            self.file.write('\n')
+
+    def write(self, entry):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            if not entry.get('error'):
+                self.done.add(entry['input_hash'])
+
+    def close(self):
+        self.file.close()
+
+
+class ExtractionPipeline:
+    def __init__(self, api_key, base_url=BASE_URL, model=MODEL, temperature=0, concurrency=8,
+                 tokens_per_minute=100_000, requests_per_minute=600, checkpoint_path=CHECKPOINT_PATH,
+                 max_retries=3, timeout=60):
+        # 所有线程共用一个客户端和一条抽取链，连接池随之复用
+        self.llm = ChatOpenAI(model=model, temperature=temperature, api_key=api_key, base_url=base_url,
+                              max_retries=max_retries, timeout=timeout)
+        self.chain = create_extraction_chain(self.llm, build_schema())
+        self.model = model
+        self.temperature = temperature
+        self.concurrency = concurrency
+        self.budget = TokenBudget(tokens_per_minute, requests_per_minute)
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.stats = {'extracted': 0, 'skipped': 0, 'failed': 0, 'tokens': 0}
+        self.stats_lock = threading.Lock()
+
+    def _count(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def extract(self, record):
+        """抽取一条记录并写入检查点；失败时写入 error，下次运行重试"""
+        reserved = self.budget.acquire(estimate_tokens(record.text) + PROMPT_OVERHEAD_TOKENS + MAX_OUTPUT_TOKENS)
+        usage = UsageMetadataCallbackHandler()
+        used = reserved
+        entry = {'input_hash': record.input_hash, 'source': record.source, 'name': record.name,
+                 'model': self.model, 'temperature': self.temperature,
+                 'prompt_version': PROMPT_VERSION}
+        start = time.perf_counter()
+        try:
+            output = self.chain.invoke(record.text, config={"callbacks": [usage]})
+            used = sum(u.get('total_tokens', 0) for u in usage.usage_metadata.values()) or reserved
+            entry.update(data=output['data'], errors=[str(e) for e in output.get('errors') or []], tokens=used)
+            self._count('extracted')
+            self._count('tokens', used)
+        except Exception as e:
+            entry['error'] = f"{e.__class__.__name__}: {e}"
+            self._count('failed')
+        finally:
+            self.budget.settle(reserved, used)
+        entry['seconds'] = round(time.perf_counter() - start, 3)
+        self.checkpoint.write(entry)
+        return entry
+
+    def run(self, records, limit=None, progress_every=20):
+        """处理 records，已在检查点中 (或本次已提交) 的输入哈希跳过；返回统计信息"""
+        start = time.perf_counter()
+        submitted = set()
+        in_flight = set()
+        finished = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for record in records:
+                if record.input_hash in self.checkpoint.done or record.input_hash in submitted:
+                    self._count('skipped')
+                    continue
+                if limit is not None and len(submitted) >= limit:
+                    break
+                submitted.add(record.input_hash)
+                in_flight.add(pool.submit(self.extract, record))
+                # 在途任务有上限，读取语料的速度跟随抽取速度
+                if len(in_flight) >= 2 * self.concurrency:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    finished = self._report(done, finished, start, progress_every)
+            done, _ = wait(in_flight)
+            self._report(done, finished, start, progress_every, final=True)
+        return dict(self.stats, seconds=time.perf_counter() - start)
+
+    def _report(self, done, finished, start, progress_every, final=False):
+        for future in done:
+            future.result()
+            finished += 1
+            if finished % progress_every == 0:
+                elapsed = time.perf_counter() - start
+                print(f"  已完成 {finished} 条 ({finished / elapsed:.1f} 条/秒, 累计 {self.stats['tokens']} tokens)")
+        if final:
+            print(f"  全部完成: {finished} 条，耗时 {time.perf_counter() - start:.1f}s")
+        return finished
+
+    def close(self):
+        self.checkpoint.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发、可断点续跑的疾病成因/症状抽取")
+    parser.add_argument("sources", nargs="*", default=SOURCES, help="CSV 文件 (默认详情表和主表)")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="JSONL 检查点/结果文件")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tpm", type=int, default=100_000, help="每分钟 token 上限")
+    parser.add_argument("--rpm", type=int, default=600, help="每分钟请求数上限")
+    parser.add_argument("--limit", type=int, help="本次最多抽取的记录数")
+    parser.add_argument("--model", default=MODEL)
+    parser.add_argument("--temperature", type=float, default=0)
+    parser.add_argument("--base-url", default=BASE_URL)
+    args = parser.parse_args()
+
+    api_key = os.getenv('DASHSCOPE_API_KEY')
+    if not api_key:
+        raise SystemExit("未找到 API Key，请检查环境变量 DASHSCOPE_API_KEY")
+
+    pipeline = ExtractionPipeline(api_key, args.base_url, args.model, args.temperature, args.concurrency,
+                                  args.tpm, args.rpm, args.checkpoint)
+    print(f"检查点 {args.checkpoint} 中已有 {len(pipeline.checkpoint.done)} 条成功结果")
+    print(f"开始抽取 (并发 {args.concurrency}, {args.tpm} tokens/分钟, {args.rpm} 请求/分钟)...")
+    try:
+        stats = pipeline.run(iter_corpus(args.sources, args.model, args.temperature), limit=args.limit)
+    finally:
+        pipeline.close()
+    print(f"抽取 {stats['extracted']} 条, 跳过 {stats['skipped']} 条, 失败 {stats['failed']} 条, "
+          f"共 {stats['tokens']} tokens, 耗时 {stats['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
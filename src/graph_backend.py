@@ -0,0 +1,501 @@
+"""
+Graph backends behind one interface, so the QA engine does not care which database answers.
+
+A backend runs Cypher as run(cypher, params) -> list of dicts (record.data()
+shaped), runs several statements over one session with run_batch(), explains
+a query for the Cypher guard, serves the prompt schema from measured graph
+statistics (GraphStatsCache, one computation per graph version) and carries
+a Dialect: the Cypher hints added to the Text-to-Cypher prompt and the LIMIT
+generated queries should use.
+
+* Neo4jBackend / TuGraphBackend: bolt driver and SessionPool from graph_pool
+* MemoryBackend: the template shapes over a GraphSnapshot (or a
+  SnapshotManager that follows the graph version), for snapshot reads and
+  offline runs
+
+ShapeRouter keeps an exponentially weighted moving average of latency per
+(query shape, backend) and sends each read to the fastest backend that can
+serve that shape, trying every candidate once and exploring now and then so
+a backend that got faster is noticed.
+
+ReplicaBackend spreads one database's reads over several endpoints (primary
+plus read replicas): least loaded healthy endpoint by latency EWMA and
+requests in flight, a hedged second request when the first is slow, and
+failover with a cooldown on connection errors. Writes always go to the primary.
+"""
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from neo4j.exceptions import ServiceUnavailable, SessionExpired
+
+from cypher_guard import CALL_PROCEDURE, READ_PROCEDURES, WRITE_CLAUSES, mask_literals
+
+from graph_pool import POOL_SIZE, SessionPool, close_driver, get_driver, template_rows_batch
+from graph_schema import session_explain
+from graph_snapshot import GraphSnapshot, SnapshotManager, read_version
+from graph_stats import GraphStatsCache, compute_stats, load_stats, snapshot_stats
+from graph_sync import VERSION_QUERY
+from intent_router import DATA_DIR, SYMPTOM_DISEASE_LIST, TEMPLATE_LIMIT, TEMPLATES
+from telemetry import log
+
+Dialect = namedtuple('Dialect', ['name', 'hints', 'result_limit'])
+
+NEO4J_DIALECT = Dialect('neo4j', [
+    "Neo4j 5 Cypher: use elementId() instead of id(); EXISTS {} subqueries and list comprehensions are allowed",
+    "Symptom.diseases is a precomputed list of the diseases with that symptom",
+], 20)
+
+TUGRAPH_DIALECT = Dialect('tugraph', [
+    "TuGraph Cypher: no APOC procedures, CALL subqueries, EXISTS {} or list/pattern comprehensions",
+    "Match names exactly with {name: '...'}; CONTAINS and regular expressions scan every vertex",
+    "Symptom.diseases is a JSON string, not a list; traverse HAS_SYMPTOM instead of reading it",
+], 10)
+
+MEMORY_DIALECT = Dialect('memory', [], TEMPLATE_LIMIT)
+
+# Shape of every LLM-generated query; only backends with the primary's dialect can run those
+GENERATED = "generated"
+
+# The two query shapes of the templates and gold queries, with $name or a literal
+FORWARD_QUERY = re.compile(r"^MATCH \(d:Disease \{name: (?:\$name|'((?:[^'\\]|\\.)*)')\}\)-\[:HAS_SYMPTOM\]->"
+                           r"\(s:Symptom\) RETURN s\.name(?: ORDER BY s\.name)?(?: LIMIT (\d+))?$")
+REVERSE_QUERY = re.compile(r"^MATCH \(d:Disease\)-\[:HAS_SYMPTOM\]->\(s:Symptom \{name: (?:\$name|'((?:[^'\\]|\\.)*)')\}\) "
+                           r"RETURN d\.name(?: ORDER BY d\.name)?(?: LIMIT (\d+))?$")
+
+
+# Errors that say the endpoint is unreachable, as opposed to a bad query
+CONNECTION_ERRORS = (ServiceUnavailable, SessionExpired, OSError)
+
+
+def query_text(cypher):
+    return " ".join(getattr(cypher, 'text', cypher).split())
+
+
+def is_write(cypher):
+    """True for statements that change the graph (write clauses or procedures not known to be read-only)."""
+    masked = mask_literals(getattr(cypher, 'text', cypher))
+    if WRITE_CLAUSES.search(masked):
+        return True
+    return any(name.lower() not in READ_PROCEDURES for name in CALL_PROCEDURE.findall(masked))
+
+
+class GraphBackend:
+    """Base class; subclasses provide run() and explain()."""
+
+    name = "graph"
+    dialect = MEMORY_DIALECT
+
+    def __init__(self, schema_refresh_interval=60.0):
+        # The version is read every schema_refresh_interval seconds; statistics are only reloaded when it moved
+        self.statistics = GraphStatsCache(self.version, self.stored_stats, self.compute_stats, f"{self.name}_stats",
+                                          check_interval=schema_refresh_interval)
+
+    def run(self, cypher, params=None):
+        raise NotImplementedError
+
+    def run_batch(self, statements):
+        """Row lists for [(cypher, params), ...]."""
+        return [self.run(cypher, params) for cypher, params in statements]
+
+    def explain(self, cypher, params=None):
+        raise NotImplementedError
+
+    def stored_stats(self):
+        """Statistics the importer stored with the graph version, or None."""
+        return load_stats(self.run)
+
+    def compute_stats(self, version):
+        return compute_stats(self.run, version)
+
+    def graph_stats(self):
+        return self.statistics.get()
+
+    def schema(self, detail=True):
+        """Prompt schema text; detail=False is the structure only (labels, properties, relationship types)."""
+        return self.statistics.render(detail)
+
+    def version(self):
+        return read_version(self.run)
+
+    def supports(self, shape):
+        return True
+
+    def template_rows(self, intent, params):
+        return self.template_rows_batch([(intent, params)])[0]
+
+    def template_rows_batch(self, requests):
+        return template_rows_batch(self.run_batch, requests)
+
+    def close(self):
+        pass
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.name!r})"
+
+
+class BoltBackend(GraphBackend):
+    """A database reached through a shared neo4j driver and a SessionPool."""
+
+    def __init__(self, uri, user, password, database=None, pool_size=POOL_SIZE, warmup=True,
+                 schema_refresh_interval=60.0, name=None):
+        self.name = name or self.name
+        self.uri = uri
+        self.driver = get_driver(uri, user, password, pool_size=pool_size)
+        self.sessions = SessionPool(self.driver, database=database, size=pool_size)
+        if warmup:
+            log.info(f"Warmed up {pool_size} {self.name} connections in {self.sessions.warmup():.2f}s")
+        super().__init__(schema_refresh_interval)
+
+    def run(self, cypher, params=None):
+        return self.sessions.run(cypher, params)
+
+    def run_batch(self, statements):
+        """All statements over one pooled session, so a batch costs one session checkout."""
+        with self.sessions.session() as session:
+            return [[record.data() for record in session.run(cypher, params)] for cypher, params in statements]
+
+    def explain(self, cypher, params=None):
+        with self.sessions.session() as session:
+            return session_explain(session)(cypher, params)
+
+    def close(self):
+        self.sessions.close()
+        close_driver(self.driver)
+
+
+class Neo4jBackend(BoltBackend):
+    name = "neo4j"
+    dialect = NEO4J_DIALECT
+
+
+class TuGraphBackend(BoltBackend):
+    name = "tugraph"
+    dialect = TUGRAPH_DIALECT
+
+    def __init__(self, uri, user, password, database='default', **kwargs):
+        super().__init__(uri, user, password, database=database, **kwargs)
+
+
+class MemoryBackend(GraphBackend):
+    """
+    The template query shapes over a GraphSnapshot, or over a SnapshotManager's current snapshot.
+
+    Rows look like Neo4j's record.data(). Every call sleeps `latency` seconds
+    to stand in for a network round trip (a batch is one call). explain()
+    returns an index-seek plan so the Cypher guard's plan check passes as it
+    would against a provisioned database.
+    """
+
+    name = "memory"
+    dialect = MEMORY_DIALECT
+
+    def __init__(self, snapshots, latency=0.0, version=1, name=None):
+        self.name = name or self.name
+        self.snapshots = snapshots
+        self.latency = latency
+        self.fixed_version = version
+        self.lock = threading.Lock()
+        self.calls = 0
+        # Statistics come from the snapshot itself, so the version is checked on every use and nothing is kept on disk
+        self.statistics = GraphStatsCache(self.version, lambda: None, self.compute_stats, f"{self.name}_stats",
+                                          check_interval=0.0, cache_dir=None)
+
+    @classmethod
+    def from_csv(cls, data_dir=DATA_DIR, latency=0.0, profile="neo4j"):
+        return cls(GraphSnapshot.from_csv(data_dir, profile), latency)
+
+    @property
+    def snapshot(self):
+        if isinstance(self.snapshots, SnapshotManager):
+            return self.snapshots.get()
+        return self.snapshots
+
+    def _wait(self):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _rows(self, snapshot, cypher, params):
+        text = query_text(cypher)
+        if text == query_text(VERSION_QUERY):
+            return [{'version': self.version()}]
+        if text == SYMPTOM_DISEASE_LIST:
+            name = (params or {}).get('name')
+            if name not in snapshot.symptom_ids:
+                return []
+            return [{'diseases': snapshot.diseases_with(name)}]
+        for pattern, lookup, key in ((FORWARD_QUERY, snapshot.symptoms_of, 's.name'),
+                                     (REVERSE_QUERY, snapshot.diseases_with, 'd.name')):
+            m = pattern.match(text)
+            if m:
+                name = m.group(1).replace("\\'", "'") if m.group(1) is not None else (params or {}).get('name')
+                limit = int(m.group(2)) if m.group(2) else None
+                return [{key: value} for value in lookup(name, limit)]
+        raise ValueError(f"MemoryBackend does not support this query: {text}")
+
+    def run(self, cypher, params=None):
+        self._wait()
+        return self._rows(self.snapshot, cypher, params)
+
+    def run_batch(self, statements):
+        self._wait()
+        snapshot = self.snapshot
+        return [self._rows(snapshot, cypher, params) for cypher, params in statements]
+
+    def template_rows_batch(self, requests):
+        self._wait()
+        snapshot = self.snapshot
+        return [snapshot.execute(intent, params, TEMPLATE_LIMIT) for intent, params in requests]
+
+    def explain(self, cypher, params=None):
+        self._wait()
+        seek = {'operatorType': 'NodeUniqueIndexSeek@neo4j', 'args': {'EstimatedRows': 1.0}, 'children': []}
+        expand = {'operatorType': 'Expand(All)@neo4j', 'args': {'EstimatedRows': 5.0}, 'children': [seek]}
+        return {'operatorType': 'ProduceResults@neo4j', 'args': {'EstimatedRows': 5.0}, 'children': [expand]}
+
+    def compute_stats(self, version):
+        return snapshot_stats(self.snapshot, version)
+
+    def version(self):
+        version = self.snapshot.version
+        return self.fixed_version if version is None else version
+
+    def supports(self, shape):
+        return shape in TEMPLATES
+
+
+class ShapeRouter:
+    """
+    Picks the backend for a read by the latency each candidate has shown for that query shape.
+
+    alpha: weight of the newest sample in the moving average; explore: share
+    of reads sent to a random candidate instead of the current fastest.
+    """
+
+    def __init__(self, alpha=0.2, explore=0.05, seed=None):
+        self.alpha = alpha
+        self.explore = explore
+        self.rng = random.Random(seed)
+        self.ewma = {}
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def choose(self, shape, candidates):
+        if len(candidates) == 1:
+            return candidates[0]
+        with self.lock:
+            untried = [b for b in candidates if (shape, b.name) not in self.ewma]
+            if untried:
+                return untried[0]
+            if self.rng.random() < self.explore:
+                return self.rng.choice(candidates)
+            return min(candidates, key=lambda b: self.ewma[(shape, b.name)])
+
+    def record(self, shape, backend, seconds):
+        key = (shape, backend.name)
+        with self.lock:
+            previous = self.ewma.get(key)
+            self.ewma[key] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def stats(self):
+        """{shape: {backend: {'ewma_ms', 'reads'}}}"""
+        with self.lock:
+            report = {}
+            for (shape, name), seconds in sorted(self.ewma.items()):
+                report.setdefault(shape, {})[name] = {'ewma_ms': round(seconds * 1000, 3),
+                                                      'reads': self.counts[(shape, name)]}
+            return report
+
+
+class Endpoint:
+    """Latency and health bookkeeping for one endpoint of a ReplicaBackend."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.label = getattr(backend, 'uri', backend.name)
+        self.ewma = None
+        self.in_flight = 0
+        self.down_until = 0.0
+        self.reads = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def healthy(self, now):
+        return now >= self.down_until
+
+    def load(self):
+        """Expected wait: the latency average scaled by the requests already queued on the endpoint."""
+        return (self.ewma or 0.0) * (self.in_flight + 1)
+
+
+class ReplicaBackend(GraphBackend):
+    """
+    One logical graph served by several endpoints; endpoints[0] is the primary.
+
+    Reads go to the healthy endpoint with the lowest load (latency EWMA x
+    requests in flight); endpoints without a sample yet are tried first, and
+    an `explore` share of reads goes to another healthy endpoint so its
+    average stays current. A
+    connection error marks the endpoint down for `cooldown` seconds and the
+    read fails over to the next endpoint; other errors are the query's fault
+    and are raised. With hedging on, a read still running after
+    max(hedge_min, hedge_factor x its endpoint's EWMA) is sent to the next
+    endpoint as well and the first answer wins. Writes always go to the
+    primary; with read_from_primary=False reads only use it when no replica is up.
+    """
+
+    def __init__(self, endpoints, alpha=0.2, explore=0.05, cooldown=30.0, hedge=True, hedge_factor=3.0,
+                 hedge_min=0.01, read_from_primary=True, max_workers=32, seed=None, name=None):
+        self.primary = endpoints[0]
+        self.name = name or self.primary.name
+        self.dialect = self.primary.dialect
+        self.endpoints = [Endpoint(backend) for backend in endpoints]
+        self.alpha = alpha
+        self.explore = explore
+        self.rng = random.Random(seed)
+        self.cooldown = cooldown
+        self.hedge = hedge and len(endpoints) > 1
+        self.hedge_factor = hedge_factor
+        self.hedge_min = hedge_min
+        self.read_from_primary = read_from_primary
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="replica-read")
+
+    def ranked(self):
+        """Endpoints in the order a read should try them."""
+        now = time.monotonic()
+        with self.lock:
+            endpoints = self.endpoints if self.read_from_primary or len(self.endpoints) == 1 else self.endpoints[1:]
+            healthy = [e for e in endpoints if e.healthy(now)]
+            if not self.read_from_primary and not healthy:
+                healthy = [e for e in self.endpoints[:1] if e.healthy(now)]
+            down = sorted((e for e in self.endpoints if e not in healthy), key=lambda e: e.down_until)
+            ranked = sorted(healthy, key=lambda e: (e.ewma is not None, e.load()))
+            # An endpoint that had one slow read is otherwise never sampled again and keeps its stale average
+            if len(ranked) > 1 and self.rng.random() < self.explore:
+                ranked.insert(0, ranked.pop(self.rng.randrange(1, len(ranked))))
+            # Nothing healthy: still try the ones that went down longest ago rather than fail outright
+            return ranked + down
+
+    def _attempt(self, endpoint, call):
+        with self.lock:
+            endpoint.in_flight += 1
+        start = time.perf_counter()
+        try:
+            result = call(endpoint.backend)
+        except CONNECTION_ERRORS:
+            with self.lock:
+                endpoint.failures += 1
+                endpoint.down_until = time.monotonic() + self.cooldown
+            raise
+        finally:
+            with self.lock:
+                endpoint.in_flight -= 1
+        seconds = time.perf_counter() - start
+        with self.lock:
+            endpoint.reads += 1
+            endpoint.ewma = seconds if endpoint.ewma is None else endpoint.ewma + self.alpha * (seconds - endpoint.ewma)
+        return result
+
+    def _hedge_delay(self, endpoint):
+        return max(self.hedge_min, self.hedge_factor * endpoint.ewma) if endpoint.ewma is not None else None
+
+    def read(self, call):
+        """call(backend) on the best endpoint, with failover and (if enabled) one hedged request."""
+        candidates = self.ranked()
+        if not self.hedge:
+            error = None
+            for endpoint in candidates:
+                try:
+                    return self._attempt(endpoint, call)
+                except CONNECTION_ERRORS as e:
+                    log.warning(f"Graph endpoint {endpoint.label} unreachable ({e.__class__.__name__}), failing over")
+                    error = e
+            raise error
+
+        pending = {self.pool.submit(self._attempt, candidates[0], call): (candidates[0], False)}
+        following = iter(candidates[1:])
+        hedged = False
+        error = None
+        while pending:
+            first = next(iter(pending.values()))[0]
+            delay = self._hedge_delay(first) if not hedged and len(pending) == 1 else None
+            done, _ = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+            if not done:
+                endpoint = next(following, None)
+                hedged = True
+                if endpoint is not None:
+                    with self.lock:
+                        endpoint.hedges += 1
+                    pending[self.pool.submit(self._attempt, endpoint, call)] = (endpoint, True)
+                continue
+            for future in done:
+                endpoint, is_hedge = pending.pop(future)
+                try:
+                    result = future.result()
+                except CONNECTION_ERRORS as e:
+                    log.warning(f"Graph endpoint {endpoint.label} unreachable ({e.__class__.__name__}), failing over")
+                    error = e
+                    replacement = next(following, None)
+                    if replacement is not None:
+                        pending[self.pool.submit(self._attempt, replacement, call)] = (replacement, is_hedge)
+                    continue
+                # The slower request of a hedged pair finishes in the background and still updates its EWMA
+                if is_hedge:
+                    with self.lock:
+                        endpoint.hedge_wins += 1
+                return result
+        raise error
+
+    def run(self, cypher, params=None):
+        if is_write(cypher):
+            return self.primary.run(cypher, params)
+        return self.read(lambda backend: backend.run(cypher, params))
+
+    def run_batch(self, statements):
+        if any(is_write(cypher) for cypher, _ in statements):
+            return self.primary.run_batch(statements)
+        return self.read(lambda backend: backend.run_batch(statements))
+
+    def write(self, cypher, params=None):
+        return self.primary.run(cypher, params)
+
+    def template_rows_batch(self, requests):
+        return self.read(lambda backend: backend.template_rows_batch(requests))
+
+    def explain(self, cypher, params=None):
+        return self.read(lambda backend: backend.explain(cypher, params))
+
+    def graph_stats(self):
+        # The primary's statistics cache; replicas carry the same graph
+        return self.primary.graph_stats()
+
+    def schema(self, detail=True):
+        return self.primary.schema(detail)
+
+    def version(self):
+        return self.read(lambda backend: backend.version())
+
+    def supports(self, shape):
+        return all(endpoint.backend.supports(shape) for endpoint in self.endpoints)
+
+    def stats(self):
+        """{endpoint: {'ewma_ms', 'in_flight', 'reads', 'failures', 'hedges', 'hedge_wins', 'healthy'}}"""
+        now = time.monotonic()
+        with self.lock:
+            return {e.label: {'ewma_ms': round(e.ewma * 1000, 3) if e.ewma is not None else None,
+                              'in_flight': e.in_flight, 'reads': e.reads, 'failures': e.failures,
+                              'hedges': e.hedges, 'hedge_wins': e.hedge_wins, 'healthy': e.healthy(now)}
+                    for e in self.endpoints}
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+        for endpoint in self.endpoints:
+            endpoint.backend.close()
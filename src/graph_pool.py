@@ -0,0 +1,249 @@
+"""
+Shared connection management for the QA workers.
+
+* one driver per (uri, user) per process, with a configurable pool size and
+  liveness checks on idle connections, closed when its last user releases it
+* a pool of long-lived sessions so each query reuses an open session instead
+  of creating one
+* warmup that opens the pool's connections at startup instead of on the first
+  questions
+* pre-built parameterized queries for the fixed query shapes, with symptom ->
+  disease lookups and multi-symptom diagnosis ranking served from the
+  precomputed Symptom.diseases property
+"""
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from neo4j import GraphDatabase, Query
+
+from diagnosis import rank_lists
+from graph_sync import decode_list
+from intent_router import (DIAGNOSIS, DISEASE_SYMPTOMS, SYMPTOM_DISEASE_LIST, SYMPTOM_DISEASES, TEMPLATE_LIMIT,
+                           TEMPLATES)
+
+POOL_SIZE = 16
+LIVENESS_CHECK_TIMEOUT = 30.0
+QUERY_TIMEOUT = 10.0
+
+# Fixed query shapes, built once; parameters keep the server-side plan cache warm
+PREPARED_QUERIES = {
+    DISEASE_SYMPTOMS: Query(TEMPLATES[DISEASE_SYMPTOMS], timeout=QUERY_TIMEOUT),
+    SYMPTOM_DISEASES: Query(TEMPLATES[SYMPTOM_DISEASES], timeout=QUERY_TIMEOUT),
+    DIAGNOSIS: Query(TEMPLATES[DIAGNOSIS], timeout=QUERY_TIMEOUT),
+    "symptom_disease_list": Query(SYMPTOM_DISEASE_LIST, timeout=QUERY_TIMEOUT),
+    # Diagnosis over graphs imported before Symptom.diseases existed
+    "diagnosis_traversal": Query("UNWIND $names AS name MATCH (d:Disease)-[:HAS_SYMPTOM]->(s:Symptom {name: name}) "
+                                 "RETURN s.name AS name, collect(d.name) AS diseases", timeout=QUERY_TIMEOUT),
+    "ping": Query("RETURN 1", timeout=QUERY_TIMEOUT),
+}
+
+# (uri, user) -> SharedDriver
+_drivers = {}
+_drivers_lock = threading.Lock()
+
+SharedDriver = namedtuple('SharedDriver', ['driver', 'password', 'pool_size', 'refs'])
+
+
+def template_rows(run, intent, params, limit=TEMPLATE_LIMIT):
+    """
+    Rows of a template intent through run(query, params) -> list of dicts, keyed like the template's RETURN.
+
+    symptom -> diseases reads the list the importers precompute on the Symptom node
+    (one index seek, no expand); a graph imported before that property existed
+    falls back to the traversal template.
+    """
+    return template_rows_batch(lambda statements: [run(query, params) for query, params in statements],
+                               [(intent, params)], limit)[0]
+
+
+def template_statement(intent, params, traversal=False):
+    """(query, params) for a template read; traversal=True for graphs without the precomputed lists."""
+    if intent == DIAGNOSIS:
+        return PREPARED_QUERIES["diagnosis_traversal" if traversal else DIAGNOSIS], {'names': params['names']}
+    if intent == SYMPTOM_DISEASES:
+        return PREPARED_QUERIES[SYMPTOM_DISEASES if traversal else "symptom_disease_list"], params
+    return PREPARED_QUERIES[intent], params
+
+
+def template_result(intent, params, rows, limit=TEMPLATE_LIMIT):
+    """
+    Rows of a template intent from what its template_statement() returned.
+
+    None when the graph has no precomputed disease lists (imported before
+    Symptom.diseases existed); read the traversal statement and pass its rows to
+    traversal_result() instead. The list is sorted here too, so graphs imported
+    while it was ordered by edge sources answer like the template's ORDER BY.
+    """
+    if intent == SYMPTOM_DISEASES and rows:
+        diseases = decode_list(rows[0]['diseases'])
+        return None if diseases is None else [{'d.name': name} for name in sorted(diseases)[:limit]]
+    if intent == DIAGNOSIS:
+        lists = {row['name']: decode_list(row['diseases']) for row in rows}
+        if any(diseases is None for diseases in lists.values()):
+            return None
+        return rank_lists(lists, params.get('total'), limit)
+    return rows
+
+
+def traversal_result(intent, params, rows, limit=TEMPLATE_LIMIT):
+    """Rows of a template intent from its traversal statement (template_statement(..., traversal=True))."""
+    if intent == DIAGNOSIS:
+        return rank_lists({row['name']: row['diseases'] for row in rows}, params.get('total'), limit)
+    return rows
+
+
+def template_rows_batch(run_batch, requests, limit=TEMPLATE_LIMIT):
+    """
+    template_rows() for a list of (intent, params) through run_batch([(query, params), ...]) -> row lists.
+
+    Diagnosis params are {'names': [...], 'total': Disease count or None}; the
+    symptoms' disease lists are ranked here with diagnosis.rank_lists.
+    """
+    statements = [template_statement(intent, params) for intent, params in requests]
+    results = [template_result(intent, params, rows, limit)
+               for (intent, params), rows in zip(requests, run_batch(statements))]
+    fallback = [i for i, rows in enumerate(results) if rows is None]
+    if fallback:
+        traversals = run_batch([template_statement(*requests[i], traversal=True) for i in fallback])
+        for i, rows in zip(fallback, traversals):
+            results[i] = traversal_result(*requests[i], rows, limit)
+    return results
+
+
+def get_driver(uri, user, password, pool_size=POOL_SIZE, liveness_check_timeout=LIVENESS_CHECK_TIMEOUT):
+    """
+    Process-wide driver for (uri, user); later calls reuse the first one.
+
+    Every call takes a reference that close_driver() gives back. A later call
+    with another password or pool size raises ValueError instead of silently
+    getting the first caller's settings.
+    """
+    key = (uri, user)
+    with _drivers_lock:
+        shared = _drivers.get(key)
+        if shared is None:
+            driver = GraphDatabase.driver(
+                uri, auth=(user, password),
+                max_connection_pool_size=pool_size,
+                liveness_check_timeout=liveness_check_timeout,
+                connection_acquisition_timeout=QUERY_TIMEOUT,
+            )
+            shared = SharedDriver(driver, password, pool_size, 0)
+        elif shared.password != password:
+            raise ValueError(f"A driver for {user}@{uri} is already open with a different password")
+        elif shared.pool_size != pool_size:
+            raise ValueError(f"A driver for {user}@{uri} is already open with pool size {shared.pool_size}, "
+                             f"not {pool_size}")
+        _drivers[key] = shared._replace(refs=shared.refs + 1)
+        return shared.driver
+
+
+def close_driver(driver):
+    """Release a reference from get_driver(); the driver closes when the last one is released."""
+    with _drivers_lock:
+        for key, shared in list(_drivers.items()):
+            if shared.driver is driver:
+                if shared.refs > 1:
+                    _drivers[key] = shared._replace(refs=shared.refs - 1)
+                    return
+                del _drivers[key]
+    driver.close()
+
+
+def close_drivers():
+    with _drivers_lock:
+        for shared in _drivers.values():
+            shared.driver.close()
+        _drivers.clear()
+
+
+class SessionPool:
+    """Long-lived sessions handed out one caller at a time."""
+
+    def __init__(self, driver, database=None, size=POOL_SIZE):
+        self.driver = driver
+        self.database = database
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def _new_session(self):
+        return self.driver.session(database=self.database)
+
+    @contextmanager
+    def session(self):
+        try:
+            session = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_create = self.created < self.size
+                if can_create:
+                    self.created += 1
+            session = self._new_session() if can_create else self.idle.get(timeout=QUERY_TIMEOUT)
+
+        healthy = True
+        try:
+            yield session
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            if healthy:
+                self.idle.put(session)
+            else:
+                # The session may hold a broken connection; replace it on the next acquire
+                session.close()
+                with self.lock:
+                    self.created -= 1
+
+    def run(self, query, params=None):
+        """Records as dicts."""
+        with self.session() as session:
+            return [record.data() for record in session.run(query, params)]
+
+    def warmup(self, connections=None):
+        """Open `connections` sessions concurrently so the driver pool holds that many live connections."""
+        start = time.perf_counter()
+        self.driver.verify_connectivity()
+        with self.lock:
+            count = max(0, min(connections or self.size, self.size) - self.created)
+            self.created += count
+        if not count:
+            return time.perf_counter() - start
+
+        def ping(_):
+            # Each session holds its connection while the ping runs, so the pings open distinct connections
+            session = self._new_session()
+            try:
+                session.run(PREPARED_QUERIES["ping"]).consume()
+            except Exception:
+                session.close()
+                raise
+            return session
+
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            futures = [executor.submit(ping, i) for i in range(count)]
+        # Every ping has finished: keep each session that opened and give back the slots of the others
+        errors = []
+        for future in futures:
+            try:
+                self.idle.put(future.result())
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            with self.lock:
+                self.created -= len(errors)
+            raise errors[0]
+        return time.perf_counter() - start
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
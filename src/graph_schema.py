@@ -0,0 +1,159 @@
+"""
+Schema provisioning and query-plan checks for Neo4j and TuGraph.
+
+Creates unique constraints on the node keys (Disease.name, Symptom.name,
+GraphMeta.key) and full-text indexes over names and aliases, then runs EXPLAIN
+on the canonical query shapes and raises PlanError if any of them would scan a
+whole label instead of seeking through an index. Both importers call this
+before writing, so MATCH/MERGE by name stays an index lookup as the graph grows.
+"""
+import argparse
+import os
+import re
+
+from dotenv import load_dotenv
+from neo4j import GraphDatabase
+
+from graph_sync import HASH_PROPERTY, VERSION_QUERY
+from intent_router import DIAGNOSIS, DISEASE_SYMPTOMS, SYMPTOM_DISEASE_LIST, SYMPTOM_DISEASES, TEMPLATES
+
+NEO4J_SCHEMA = [
+    "CREATE CONSTRAINT disease_name IF NOT EXISTS FOR (n:Disease) REQUIRE n.name IS UNIQUE",
+    "CREATE CONSTRAINT symptom_name IF NOT EXISTS FOR (n:Symptom) REQUIRE n.name IS UNIQUE",
+    "CREATE CONSTRAINT graph_meta_key IF NOT EXISTS FOR (n:GraphMeta) REQUIRE n.key IS UNIQUE",
+    "CREATE FULLTEXT INDEX entity_names IF NOT EXISTS FOR (n:Disease|Symptom) ON EACH [n.name, n.aliases]",
+]
+
+# TuGraph: the primary field of a vertex label is already unique and indexed; only add full-text
+TUGRAPH_SCHEMA = [
+    "CALL db.addFullTextIndex(true, 'Disease', 'name')",
+    "CALL db.addFullTextIndex(true, 'Symptom', 'name')",
+]
+
+# Operators that mean a lookup by key is not using an index
+FORBIDDEN_OPERATORS = ('NodeByLabelScan', 'AllNodesScan', 'AllNodeScan')
+
+# Query shapes the QA side runs on every request, with placeholder parameters for EXPLAIN
+QA_SHAPES = {
+    DISEASE_SYMPTOMS: (TEMPLATES[DISEASE_SYMPTOMS], {'name': ''}),
+    SYMPTOM_DISEASES: (TEMPLATES[SYMPTOM_DISEASES], {'name': ''}),
+    DIAGNOSIS: (TEMPLATES[DIAGNOSIS], {'names': ['']}),
+    'symptom_disease_list': (SYMPTOM_DISEASE_LIST, {'name': ''}),
+    'graph_version': (VERSION_QUERY, None),
+}
+
+TUGRAPH_IMPORT_SHAPES = {
+    'merge_has_symptom': ("""
+        UNWIND $rows AS row
+        MATCH (d:Disease {name: row.d_name})
+        MATCH (s:Symptom {name: row.s_name})
+        MERGE (d)-[r:HAS_SYMPTOM]->(s)
+        SET r.sources = row.sources
+    """, {'rows': [{'d_name': '', 's_name': '', 'sources': ''}]}),
+    'upsert_disease': (f"UNWIND $rows AS row MERGE (n:Disease {{name: row.name}}) "
+                       f"SET n.{HASH_PROPERTY} = row.{HASH_PROPERTY}", {'rows': [{'name': '', HASH_PROPERTY: ''}]}),
+}
+
+
+class PlanError(RuntimeError):
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__("; ".join(f"{name} plans {', '.join(ops)}" for name, ops in failures.items()))
+
+
+def session_explain(session):
+    """explain(query, params) for a neo4j driver session; returns the plan tree, or TuGraph's text plan."""
+    def explain(query, params=None):
+        result = session.run("EXPLAIN " + query, params)
+        records = list(result)
+        plan = result.consume().plan
+        if plan:
+            return plan
+        return "\n".join(str(value) for record in records for value in record.values())
+    return explain
+
+
+def operator_name(name):
+    """'Node By Label Scan' and 'Expand(All)' (TuGraph) compare as 'NodeByLabelScan' and 'ExpandAll'."""
+    return re.sub(r'[\s()]', '', name)
+
+
+def plan_operators(plan):
+    """Operator names in a plan, from Neo4j's plan dict or a text plan (one operator per line)."""
+    if isinstance(plan, dict):
+        operators = [operator_name(plan.get('operatorType', '').split('@')[0])]
+        for child in plan.get('children', []):
+            operators.extend(plan_operators(child))
+        return operators
+    # The operator is everything before its arguments, e.g. "Node By Label Scan [n:Disease]"
+    return [operator_name(m.group(1)) for m in re.finditer(r'^\s*([A-Za-z][A-Za-z ()]*)', plan or '', re.MULTILINE)]
+
+
+def provision(run, statements, ignore_errors=False):
+    """Run schema statements; TuGraph raises for indexes that already exist, so it passes ignore_errors."""
+    for statement in statements:
+        try:
+            run(statement)
+            print(f"  ✓ {statement}")
+        except Exception as e:
+            if not ignore_errors:
+                raise
+            print(f"  - {statement} ({e.__class__.__name__}: {str(e).splitlines()[0] if str(e) else ''})")
+
+
+def verify_plans(explain, shapes, forbidden=FORBIDDEN_OPERATORS):
+    """EXPLAIN every shape; raise PlanError naming those whose plan contains a forbidden operator."""
+    failures = {}
+    for name, (query, params) in shapes.items():
+        operators = plan_operators(explain(query, params))
+        bad = sorted({op for op in operators if op in forbidden})
+        print(f"  {'✗' if bad else '✓'} {name}: {' <- '.join(operators)}")
+        if bad:
+            failures[name] = bad
+    if failures:
+        raise PlanError(failures)
+
+
+def provision_neo4j(run, explain, import_shapes=None):
+    print("Provisioning Neo4j constraints and indexes...")
+    provision(run, NEO4J_SCHEMA)
+    print("Checking query plans...")
+    verify_plans(explain, dict(QA_SHAPES, **(import_shapes or {})))
+
+
+def provision_tugraph(session):
+    print("配置 TuGraph 索引...")
+    provision(lambda q: session.run(q).consume(), TUGRAPH_SCHEMA, ignore_errors=True)
+    print("检查查询计划...")
+    verify_plans(session_explain(session), dict(QA_SHAPES, **TUGRAPH_IMPORT_SHAPES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create graph constraints/indexes and check the query plans")
+    parser.add_argument("--backend", choices=["neo4j", "tugraph"], default="neo4j")
+    args = parser.parse_args()
+
+    if args.backend == "neo4j":
+        from import_to_neo4j import IMPORT_PLAN_SHAPES, NEO4J_PASSWORD, NEO4J_URI, NEO4J_USER
+        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+        database = None
+    else:
+        load_dotenv()
+        driver = GraphDatabase.driver(os.getenv('TUGRAPH_URI', 'bolt://59.110.166.54:7687'),
+                                      auth=(os.getenv('TUGRAPH_USERNAME', 'admin'),
+                                            os.getenv('TUGRAPH_PASSWORD', '73@TuGraph')))
+        database = 'default'
+
+    try:
+        with driver.session(database=database) as session:
+            if args.backend == "neo4j":
+                provision_neo4j(lambda q: session.run(q).consume(), session_explain(session), IMPORT_PLAN_SHAPES)
+            else:
+                provision_tugraph(session)
+        print("Schema and query plans OK")
+    finally:
+        driver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+In-process read engine over a snapshot of the Disease-Symptom graph.
+
+Names are interned to integer IDs and HAS_SYMPTOM is stored as CSR adjacency
+arrays in both directions, so the template query shapes, multi-symptom
+diagnosis ranking and k-hop neighbourhoods are answered without a database
+round trip. SnapshotManager reloads the snapshot when the importers bump the
+graph version.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from bulk_export import build_neo4j_graph, build_tugraph_graph
+from diagnosis import ranked_rows
+from graph_sync import VERSION_QUERY
+from intent_router import DIAGNOSIS, DISEASE_SYMPTOMS, SYMPTOM_DISEASES, TEMPLATES
+from telemetry import log
+
+NODES_QUERY = "MATCH (n:{label}) RETURN n.name AS name"
+EDGES_QUERY = "MATCH (d:Disease)-[:HAS_SYMPTOM]->(s:Symptom) RETURN d.name AS disease, s.name AS symptom"
+
+# Column alias each template returns, so rows look like Neo4j's record.data()
+RETURN_KEYS = {DISEASE_SYMPTOMS: 's.name', SYMPTOM_DISEASES: 'd.name'}
+
+
+def build_csr(sources, targets, n_sources, target_keys):
+    """indptr/indices arrays for edges sorted by source, then by target_keys."""
+    order = np.lexsort((target_keys, sources))
+    indices = targets[order].astype(np.int32)
+    counts = np.bincount(sources, minlength=n_sources)
+    indptr = np.zeros(n_sources + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    return indptr, indices
+
+
+def name_ranks(names):
+    """Position of each name in sorted order, indexed by ID."""
+    ranks = np.empty(len(names), dtype=np.int64)
+    ranks[sorted(range(len(names)), key=names.__getitem__)] = np.arange(len(names))
+    return ranks
+
+
+class GraphSnapshot:
+    def __init__(self, disease_names, symptom_names, edges, version=None):
+        self.version = version
+        self.diseases = list(dict.fromkeys(disease_names))
+        self.symptoms = list(dict.fromkeys(symptom_names))
+        self.disease_ids = {name: i for i, name in enumerate(self.diseases)}
+        self.symptom_ids = {name: i for i, name in enumerate(self.symptoms)}
+
+        pairs = {(self.disease_ids[d], self.symptom_ids[s]) for d, s in edges
+                 if d in self.disease_ids and s in self.symptom_ids}
+        pairs = np.array(sorted(pairs), dtype=np.int32).reshape(-1, 2)
+        # Adjacency lists in name order, the order the templates ask the database for (ORDER BY ... LIMIT)
+        disease_ranks, symptom_ranks = name_ranks(self.diseases), name_ranks(self.symptoms)
+        self.forward_indptr, self.forward_indices = build_csr(pairs[:, 0], pairs[:, 1], len(self.diseases),
+                                                              symptom_ranks[pairs[:, 1]])
+        self.reverse_indptr, self.reverse_indices = build_csr(pairs[:, 1], pairs[:, 0], len(self.symptoms),
+                                                              disease_ranks[pairs[:, 0]])
+        # diagnosis.symptom_idf for every symptom, from its in-degree
+        degrees = np.diff(self.reverse_indptr)
+        self.symptom_idf = np.where(degrees > 0, np.log1p(len(self.diseases) / np.maximum(degrees, 1)), 0.0)
+
+    @classmethod
+    def from_csv(cls, data_dir, profile="neo4j"):
+        """Build the same graph the given importer would load."""
+        diseases_csv = os.path.join(data_dir, "diseases.csv")
+        details_csv = os.path.join(data_dir, "disease_details.csv")
+        if profile == "neo4j":
+            diseases, symptoms, edges = build_neo4j_graph(diseases_csv, os.path.join(data_dir, "symptoms.csv"),
+                                                          details_csv)
+        else:
+            diseases, symptoms, edges = build_tugraph_graph(diseases_csv, details_csv,
+                                                            os.path.join(data_dir, "symptoms.csv"))
+        return cls(diseases, symptoms, edges)
+
+    @classmethod
+    def from_graph(cls, run):
+        """Load from a live database; run(cypher, params) returns a list of dicts."""
+        version = read_version(run)
+        diseases = [r['name'] for r in run(NODES_QUERY.format(label="Disease"), None)]
+        symptoms = [r['name'] for r in run(NODES_QUERY.format(label="Symptom"), None)]
+        edges = [(r['disease'], r['symptom']) for r in run(EDGES_QUERY, None)]
+        return cls(diseases, symptoms, edges, version=version)
+
+    @property
+    def edge_count(self):
+        return len(self.forward_indices)
+
+    def symptoms_of(self, disease, limit=None):
+        i = self.disease_ids.get(disease)
+        if i is None:
+            return []
+        ids = self.forward_indices[self.forward_indptr[i]:self.forward_indptr[i + 1]][:limit]
+        return [self.symptoms[j] for j in ids]
+
+    def diseases_with(self, symptom, limit=None):
+        i = self.symptom_ids.get(symptom)
+        if i is None:
+            return []
+        ids = self.reverse_indices[self.reverse_indptr[i]:self.reverse_indptr[i + 1]][:limit]
+        return [self.diseases[j] for j in ids]
+
+    def rank_diseases(self, symptoms, limit=20):
+        """
+        Diseases ranked by IDF-weighted overlap with `symptoms` (names; unknown ones are ignored).
+
+        Rows {'d.name', 'score', 'matched'}, best first; see diagnosis.py for the scoring.
+        """
+        ids = np.array([self.symptom_ids[s] for s in dict.fromkeys(symptoms) if s in self.symptom_ids], dtype=np.int64)
+        if len(ids) == 0:
+            return []
+        starts, ends = self.reverse_indptr[ids], self.reverse_indptr[ids + 1]
+        diseases = np.concatenate([self.reverse_indices[a:b] for a, b in zip(starts, ends)])
+        owners = np.repeat(ids, ends - starts)
+        # Sparse row sum: each matched symptom adds its IDF to every disease that lists it
+        scores = np.bincount(diseases, weights=self.symptom_idf[owners], minlength=len(self.diseases))
+        matched = {}
+        for disease, symptom in zip(diseases.tolist(), owners.tolist()):
+            matched.setdefault(disease, []).append(self.symptoms[symptom])
+        return ranked_rows({self.diseases[d]: (float(scores[d]), names) for d, names in matched.items()}, limit)
+
+    def neighbourhood(self, name, label, hops=2):
+        """
+        Nodes within `hops` HAS_SYMPTOM steps of (label, name), ignoring direction.
+
+        Returns {'Disease': [...], 'Symptom': [...]} without the start node.
+        """
+        ids = self.disease_ids if label == 'Disease' else self.symptom_ids
+        start = ids.get(name)
+        if start is None:
+            return {'Disease': [], 'Symptom': []}
+
+        seen = {'Disease': np.zeros(len(self.diseases), bool), 'Symptom': np.zeros(len(self.symptoms), bool)}
+        seen[label][start] = True
+        frontier, side = np.array([start]), label
+        for _ in range(hops):
+            if side == 'Disease':
+                indptr, indices, other = self.forward_indptr, self.forward_indices, 'Symptom'
+            else:
+                indptr, indices, other = self.reverse_indptr, self.reverse_indices, 'Disease'
+            if len(frontier) == 0:
+                break
+            nxt = np.concatenate([indices[indptr[i]:indptr[i + 1]] for i in frontier])
+            nxt = np.unique(nxt)
+            nxt = nxt[~seen[other][nxt]]
+            seen[other][nxt] = True
+            frontier, side = nxt, other
+
+        seen[label][start] = False
+        return {
+            'Disease': [self.diseases[i] for i in np.flatnonzero(seen['Disease'])],
+            'Symptom': [self.symptoms[i] for i in np.flatnonzero(seen['Symptom'])],
+        }
+
+    def execute(self, intent, params, limit=20):
+        """Rows for a template intent, shaped like Neo4j's record.data(); None if unsupported."""
+        if intent == DISEASE_SYMPTOMS:
+            names = self.symptoms_of(params['name'], limit)
+        elif intent == SYMPTOM_DISEASES:
+            names = self.diseases_with(params['name'], limit)
+        elif intent == DIAGNOSIS:
+            return self.rank_diseases(params['names'], limit)
+        else:
+            return None
+        return [{RETURN_KEYS[intent]: name} for name in names]
+
+
+def read_version(run):
+    rows = run(VERSION_QUERY, None)
+    return rows[0]['version'] if rows else None
+
+
+def compare_with_graph(snapshot, run, sample=50):
+    """
+    Check the snapshot against a live database for the template shapes.
+
+    Runs each template without its LIMIT for up to `sample` names per direction and
+    returns a list of (intent, name, missing, extra) for every mismatch.
+    """
+    mismatches = []
+    for intent, names in ((DISEASE_SYMPTOMS, snapshot.diseases), (SYMPTOM_DISEASES, snapshot.symptoms)):
+        cypher = TEMPLATES[intent].rsplit(' LIMIT', 1)[0]
+        key = RETURN_KEYS[intent]
+        for name in names[:sample]:
+            expected = {row[key] for row in run(cypher, {'name': name})}
+            actual = {row[key] for row in snapshot.execute(intent, {'name': name}, limit=None)}
+            if expected != actual:
+                mismatches.append((intent, name, sorted(expected - actual), sorted(actual - expected)))
+    return mismatches
+
+
+class SnapshotManager:
+    """Hands out the current snapshot and reloads it when the graph version changes."""
+
+    def __init__(self, run, check_interval=5.0):
+        self.run = run
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.snapshot = GraphSnapshot.from_graph(run)
+        self.checked_at = time.monotonic()
+
+    def get(self):
+        if time.monotonic() - self.checked_at >= self.check_interval:
+            with self.lock:
+                if time.monotonic() - self.checked_at >= self.check_interval:
+                    self.checked_at = time.monotonic()
+                    self.refresh()
+        return self.snapshot
+
+    def refresh(self):
+        """Reload on a version change; when the graph cannot be read the current snapshot stays in use."""
+        try:
+            version = read_version(self.run)
+            if version == self.snapshot.version:
+                return
+            log.info(f"Graph version {self.snapshot.version} -> {version}, reloading snapshot")
+            start = time.perf_counter()
+            self.snapshot = GraphSnapshot.from_graph(self.run)
+            log.info(f"Reloaded snapshot of version {self.snapshot.version} in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            log.warning(f"Snapshot reload failed ({e.__class__.__name__}: {e}), keeping version "
+                        f"{self.snapshot.version}")
@@ -0,0 +1,292 @@
+"""
+Measured graph statistics for the Text-to-Cypher prompt, kept per graph version.
+
+compute_stats() runs a handful of portable Cypher queries (Neo4j and TuGraph)
+and returns, per node label, the count, property keys and a few sample values,
+and per relationship type its endpoints, count, property keys and the degree
+distribution on both sides (mean, median, p90, max, nodes without edges)
+with the highest-degree nodes. The importers compute them right after bumping
+the graph version and store them as JSON on the GraphMeta node, next to the
+version they describe.
+
+GraphStatsCache serves them to the QA workers: one version read per check
+interval, the GraphMeta copy when the version moved (computing only when it
+is missing or older), and a copy under cache/ so a restarted worker renders
+the same prompt text without recomputing. render() writes the compact schema
+block for the prompt, including which side of a relationship is the
+selective one to anchor a MATCH on; choose_anchor() picks that node among the
+entities linked in a question.
+"""
+import json
+import os
+import threading
+import time
+
+from graph_snapshot import read_version
+from graph_sync import HASH_PROPERTY
+from telemetry import log
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cache")
+
+# Bookkeeping the prompt should not mention
+INTERNAL_LABELS = {'GraphMeta'}
+INTERNAL_PROPERTIES = {HASH_PROPERTY}
+
+SAMPLE_ROWS = 20
+SAMPLE_VALUES = 3
+# Longer values (descriptions, JSON lists) are not useful as examples
+SAMPLE_CHARS = 16
+HUBS = 5
+
+LABEL_COUNTS = "MATCH (n) RETURN labels(n)[0] AS label, count(*) AS count"
+RELATIONSHIP_COUNTS = ("MATCH (a)-[r]->(b) "
+                       "RETURN type(r) AS type, labels(a)[0] AS source, labels(b)[0] AS target, count(*) AS count")
+NODE_SAMPLE = "MATCH (n:{label}) RETURN properties(n) AS props LIMIT {limit}"
+RELATIONSHIP_SAMPLE = "MATCH ()-[r:{type}]->() RETURN properties(r) AS props LIMIT {limit}"
+OUT_DEGREES = "MATCH (n:{source})-[:{type}]->(:{target}) RETURN n.name AS name, count(*) AS degree"
+IN_DEGREES = "MATCH (:{source})-[:{type}]->(n:{target}) RETURN n.name AS name, count(*) AS degree"
+
+STATS_QUERY = "MATCH (m:GraphMeta {key: 'graph'}) RETURN m.stats AS stats"
+STORE_STATS_QUERY = "MATCH (m:GraphMeta {key: 'graph'}) SET m.stats = $stats RETURN m.version AS version"
+
+
+def degree_summary(degrees, total):
+    """Distribution of {name: degree} over `total` nodes, the ones missing from it having degree 0."""
+    zero = max(total - len(degrees), 0)
+    values = [0] * zero + sorted(degrees.values())
+    if not values:
+        return {'mean': 0.0, 'median': 0, 'p90': 0, 'max': 0, 'zero': 0}
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {'mean': round(sum(values) / len(values), 2), 'median': pick(0.5), 'p90': pick(0.9),
+            'max': values[-1], 'zero': zero}
+
+
+def top_degrees(degrees, n=HUBS):
+    return [[name, degree] for name, degree in sorted(degrees.items(), key=lambda item: (-item[1], item[0]))[:n]]
+
+
+def property_summary(rows):
+    """(property keys in first-seen order, {key: a few short sample values}) from sampled property maps."""
+    keys = {}
+    for row in rows:
+        for key, value in (row.get('props') or {}).items():
+            samples = keys.setdefault(key, [])
+            if (isinstance(value, (str, int, float)) and not isinstance(value, bool) and value != ''
+                    and len(str(value)) <= SAMPLE_CHARS and value not in samples and len(samples) < SAMPLE_VALUES):
+                samples.append(value)
+    return list(keys), {key: samples for key, samples in keys.items() if samples}
+
+
+def compute_stats(run, version=None):
+    """Statistics of the graph behind run(cypher, params) -> list of dicts."""
+    start = time.perf_counter()
+    nodes = {}
+    for row in run(LABEL_COUNTS, None):
+        if row['label'] and row['label'] not in INTERNAL_LABELS:
+            properties, samples = property_summary(run(NODE_SAMPLE.format(label=row['label'], limit=SAMPLE_ROWS), None))
+            nodes[row['label']] = {'count': row['count'], 'properties': properties, 'samples': samples}
+
+    relationships = []
+    for row in run(RELATIONSHIP_COUNTS, None):
+        if row['source'] in INTERNAL_LABELS or row['target'] in INTERNAL_LABELS:
+            continue
+        properties, _ = property_summary(run(RELATIONSHIP_SAMPLE.format(type=row['type'], limit=SAMPLE_ROWS), None))
+        out_degrees = {r['name']: r['degree'] for r in run(OUT_DEGREES.format(**row), None)}
+        in_degrees = {r['name']: r['degree'] for r in run(IN_DEGREES.format(**row), None)}
+        relationships.append(relationship_stats(row['type'], row['source'], row['target'], row['count'], properties,
+                                                out_degrees, nodes.get(row['source'], {}).get('count', 0),
+                                                in_degrees, nodes.get(row['target'], {}).get('count', 0)))
+    return {'version': version, 'computed_at': time.time(), 'seconds': round(time.perf_counter() - start, 3),
+            'nodes': nodes, 'relationships': relationships}
+
+
+def relationship_stats(rel_type, source, target, count, properties, out_degrees, sources, in_degrees, targets):
+    return {'type': rel_type, 'source': source, 'target': target, 'count': count, 'properties': properties,
+            'out_degree': degree_summary(out_degrees, sources), 'in_degree': degree_summary(in_degrees, targets),
+            'hubs': {'source': top_degrees(out_degrees), 'target': top_degrees(in_degrees)}}
+
+
+def snapshot_stats(snapshot, version=None):
+    """The same statistics from a GraphSnapshot's CSR arrays (names only, no other properties)."""
+    def degrees(names, indptr):
+        counts = indptr[1:] - indptr[:-1]
+        return {name: int(n) for name, n in zip(names, counts) if n}
+
+    nodes = {label: {'count': len(names), 'properties': ['name'], 'samples': {'name': names[:SAMPLE_VALUES]}}
+             for label, names in (('Disease', snapshot.diseases), ('Symptom', snapshot.symptoms))}
+    relationship = relationship_stats('HAS_SYMPTOM', 'Disease', 'Symptom', snapshot.edge_count, [],
+                                      degrees(snapshot.diseases, snapshot.forward_indptr), len(snapshot.diseases),
+                                      degrees(snapshot.symptoms, snapshot.reverse_indptr), len(snapshot.symptoms))
+    return {'version': version, 'computed_at': time.time(), 'seconds': 0.0, 'nodes': nodes,
+            'relationships': [relationship] if relationship['count'] else []}
+
+
+def load_stats(run):
+    """The statistics stored on GraphMeta by the last import, or None."""
+    rows = run(STATS_QUERY, None)
+    if not rows or not rows[0]['stats']:
+        return None
+    try:
+        return json.loads(rows[0]['stats'])
+    except ValueError:
+        return None
+
+
+def publish_stats(run):
+    """Compute the statistics for the current graph version and store them on GraphMeta; returns them."""
+    stats = compute_stats(run, read_version(run))
+    run(STORE_STATS_QUERY, {'stats': json.dumps(stats, ensure_ascii=False)})
+    return stats
+
+
+def format_degrees(summary):
+    return f"median {summary['median']}, p90 {summary['p90']}, max {summary['max']}"
+
+
+def anchor_side(rel):
+    """'source' or 'target': the endpoint whose named nodes expand to fewer rows."""
+    return 'source' if rel['out_degree']['mean'] <= rel['in_degree']['mean'] else 'target'
+
+
+def render(stats, detail=True):
+    """
+    Prompt schema text. detail=False leaves only labels, property keys and
+    relationship types, which change far less often than the counts.
+    """
+    lines = ["Node labels:"]
+    for label, node in stats['nodes'].items():
+        properties = [p for p in node['properties'] if p not in INTERNAL_PROPERTIES]
+        line = f"  - {label} (properties: {', '.join(properties)})" if properties else f"  - {label}"
+        if detail:
+            line += f": {node['count']} nodes"
+            samples = node['samples'].get('name')
+            if samples:
+                line += ", e.g. " + ", ".join(f"'{value}'" for value in samples)
+        lines.append(line)
+
+    lines += ["", "Relationship types:"]
+    for rel in stats['relationships']:
+        properties = [p for p in rel['properties'] if p not in INTERNAL_PROPERTIES]
+        line = f"  - (:{rel['source']})-[:{rel['type']}]->(:{rel['target']})"
+        if properties:
+            line += f" (properties: {', '.join(properties)})"
+        if detail:
+            line += (f": {rel['count']} relationships; per {rel['source']} {format_degrees(rel['out_degree'])}; "
+                     f"per {rel['target']} {format_degrees(rel['in_degree'])}")
+        lines.append(line)
+
+    if detail:
+        hints = []
+        for rel in stats['relationships']:
+            side = anchor_side(rel)
+            other = 'target' if side == 'source' else 'source'
+            hubs = ", ".join(f"{name} ({degree})" for name, degree in rel['hubs'][other][:3])
+            hints.append(f"  - {rel['type']}: when both ends are named, start the MATCH from the {rel[side]}"
+                         f" (fewer relationships per node)" + (f"; {rel[other]} hubs: {hubs}" if hubs else ""))
+        if hints:
+            lines += ["", "Selective anchors:"] + hints
+    return "\n".join(lines)
+
+
+def choose_anchor(stats, entities):
+    """
+    The (name, label) among linked entities expected to match the fewest relationships.
+
+    A hub uses its measured degree, any other node the median of its side.
+    None for fewer than two entities, when there is nothing to choose.
+    """
+    entities = list(dict.fromkeys(entities))
+    if len(entities) < 2:
+        return None
+
+    def expected(name, label):
+        degrees = []
+        for rel in stats['relationships']:
+            for side, summary in (('source', 'out_degree'), ('target', 'in_degree')):
+                if rel[side] == label:
+                    degrees.append(dict(rel['hubs'][side]).get(name, rel[summary]['median']))
+        return max(degrees) if degrees else None
+
+    ranked = [(degree, i, entity) for i, entity in enumerate(entities)
+              for degree in [expected(*entity)] if degree is not None]
+    return min(ranked)[2] if ranked else None
+
+
+class GraphStatsCache:
+    """
+    Statistics for the version version() reports, rendered once per version.
+
+    check_interval: seconds between version reads. On a version change
+    stored() (the importer's GraphMeta copy) is used when it matches,
+    otherwise compute(version). With a cache_dir the current statistics are
+    kept in <cache_dir>/<name>.json for the next process.
+    """
+
+    def __init__(self, version, stored, compute, name, check_interval=60.0, cache_dir=CACHE_DIR):
+        self.version = version
+        self.stored = stored
+        self.compute = compute
+        self.check_interval = check_interval
+        self.path = os.path.join(cache_dir, f"{name}.json") if cache_dir else None
+        self.lock = threading.Lock()
+        self.stats = self._load()
+        self.checked_at = None
+        self.rendered = {}
+        self.computed = 0
+
+    def _load(self):
+        if not self.path:
+            return None
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.stats, f, ensure_ascii=False)
+
+    def _due(self):
+        return self.checked_at is None or time.monotonic() - self.checked_at >= self.check_interval
+
+    def get(self):
+        if self._due():
+            with self.lock:
+                if self._due():
+                    self.refresh()
+        return self.stats
+
+    def refresh(self):
+        self.checked_at = time.monotonic()
+        try:
+            version = self.version()
+        except Exception as e:
+            if self.stats is None:
+                raise
+            log.warning(f"Graph version check failed ({e.__class__.__name__}), keeping statistics of version "
+                        f"{self.stats.get('version')}")
+            return self.stats
+        if self.stats is not None and self.stats.get('version') == version:
+            return self.stats
+
+        stats = self.stored()
+        if not stats or stats.get('version') != version:
+            stats = self.compute(version)
+            stats['version'] = version
+            self.computed += 1
+            log.info(f"Computed graph statistics for version {version} in {stats['seconds']:.2f}s")
+        self.stats = stats
+        self.rendered = {}
+        self._save()
+        return stats
+
+    def render(self, detail=True):
+        stats = self.get()
+        key = (stats.get('version'), detail)
+        if key not in self.rendered:
+            self.rendered[key] = render(stats, detail)
+        return self.rendered[key]
@@ -0,0 +1,153 @@
+"""
+Incremental sync helpers shared by the Neo4j and TuGraph importers.
+
+Every node carries a ``content_hash`` property fingerprinting the CSV row it was
+built from plus its precomputed adjacency properties (and, for diseases, the
+symptoms it links to and which files each edge came from). A refresh reads
+the stored fingerprints, diffs them against the CSVs and only writes what changed,
+so the graph never goes empty and the cost of a refresh tracks the size of the change.
+The streaming full imports compute the same properties and hashes from what
+they wrote, a page of nodes at a time (read_pages).
+"""
+import hashlib
+import json
+
+HASH_PROPERTY = "content_hash"
+
+# Importers bump this counter after every write so readers (e.g. graph_snapshot) know to refresh
+VERSION_QUERY = "MATCH (m:GraphMeta {key: 'graph'}) RETURN m.version AS version"
+BUMP_VERSION_QUERY = """
+MERGE (m:GraphMeta {key: 'graph'})
+SET m.version = coalesce(m.version, 0) + 1
+RETURN m.version AS version
+"""
+
+
+def content_hash(props, symptoms=()):
+    """
+    Stable fingerprint of a node's properties plus its outgoing HAS_SYMPTOM targets.
+
+    symptoms is an iterable of names, or a {symptom: sources} map to also cover edge provenance.
+    """
+    if isinstance(symptoms, dict):
+        symptoms = sorted([name, sorted(sources)] for name, sources in symptoms.items())
+    else:
+        symptoms = sorted(set(symptoms))
+    payload = json.dumps({"props": props, "symptoms": symptoms}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def group_edges(edges):
+    """{disease: {symptom, ...}} from an iterable of (disease, symptom) pairs."""
+    grouped = {}
+    for disease, symptom in edges:
+        grouped.setdefault(disease, set()).add(symptom)
+    return grouped
+
+
+def merge_edge_sources(*sources):
+    """
+    {(disease, symptom): [source, ...]} from (source, pairs) arguments, in first-seen order.
+
+    A pair found in several files (a disease listing the symptom and the symptom
+    listing the disease back) becomes one edge that records every file.
+    """
+    edges = {}
+    for source, pairs in sources:
+        for pair in pairs:
+            found = edges.setdefault(pair, [])
+            if source not in found:
+                found.append(source)
+    return edges
+
+
+def group_edge_sources(edges):
+    """{disease: {symptom: sources}} from an {(disease, symptom): sources} map."""
+    grouped = {}
+    for (disease, symptom), sources in edges.items():
+        grouped.setdefault(disease, {})[symptom] = sources
+    return grouped
+
+
+def adjacency_properties(edges, diseases=(), symptoms=()):
+    """
+    Degree and reverse-lookup properties precomputed from an {(disease, symptom): sources} map.
+
+    Returns ({disease: {'symptom_count': n}}, {symptom: {'diseases': [...], 'disease_count': n}}),
+    with zero-degree entries for the given diseases/symptoms that have no edges. A
+    symptom's diseases are ordered by name, like the SYMPTOM_DISEASES template and
+    the snapshot, so every read path keeps the same ones under a LIMIT.
+    """
+    disease_props = {name: {'symptom_count': 0} for name in diseases}
+    linked = {name: [] for name in symptoms}
+    for disease, symptom in edges:
+        disease_props.setdefault(disease, {'symptom_count': 0})['symptom_count'] += 1
+        linked.setdefault(symptom, []).append(disease)
+    symptom_props = {name: {'diseases': sorted(names), 'disease_count': len(names)}
+                     for name, names in linked.items()}
+    return disease_props, symptom_props
+
+
+def encode_list(values):
+    """List property value for TuGraph, which has no list type: a JSON array string."""
+    return json.dumps(list(values), ensure_ascii=False)
+
+
+def decode_list(value):
+    """A list property as read back from either backend (Neo4j list or TuGraph JSON string); None if unset."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value)
+
+
+def read_pages(run, query, page_size):
+    """
+    Yield the rows of `query` a page of nodes at a time, paging on name.
+
+    The query takes $after and $limit, reads the nodes named after $after in
+    name order (up to $limit of them, then expanded to any number of rows) and
+    returns their name as `name`. run(cypher, params) -> list of dicts.
+    """
+    after = ''
+    while True:
+        rows = run(query, {'after': after, 'limit': page_size})
+        if not rows:
+            return
+        yield rows
+        after = max(row['name'] for row in rows)
+
+
+def diff_nodes(desired, existing):
+    """
+    Compare {name: hash} maps.
+
+    Returns (inserts, updates, deletes) as lists of names.
+    """
+    inserts = [name for name in desired if name not in existing]
+    updates = [name for name, h in desired.items() if name in existing and existing[name] != h]
+    deletes = [name for name in existing if name not in desired]
+    return inserts, updates, deletes
+
+
+def diff_edges(desired, existing):
+    """Compare two collections of (disease, symptom) pairs. Returns (inserts, deletes)."""
+    desired = set(desired)
+    existing = set(existing)
+    return sorted(desired - existing), sorted(existing - desired)
+
+
+def summarize(label, inserts, updates, deletes):
+    return f"{label}: +{len(inserts)} ~{len(updates)} -{len(deletes)}"
+
+
+def summarize_sources(edges):
+    """'diseases.csv: 1119, symptoms.csv: 2888 (2768 only there)' for an {(disease, symptom): sources} map."""
+    counts, only = {}, {}
+    for sources in edges.values():
+        for source in sources:
+            counts[source] = counts.get(source, 0) + 1
+            if len(sources) == 1:
+                only[source] = only.get(source, 0) + 1
+    return ", ".join(f"{source}: {count} ({only.get(source, 0)} only there)" for source, count in counts.items())
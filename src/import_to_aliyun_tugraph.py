@@ -1,12 +1,55 @@
 import os
-import csv
+import argparse
+import time
 from neo4j import GraphDatabase
+from neo4j.exceptions import ClientError, ServiceUnavailable, SessionExpired, TransientError
 from dotenv import load_dotenv
 
+
+from bulk_export import collect_edges, iter_edge_records, tugraph_nodes
+from csv_ingest import batched, iter_records, iter_related_diseases
+from graph_sync import (BUMP_VERSION_QUERY, HASH_PROPERTY, adjacency_properties, content_hash, decode_list, diff_edges,
+                        diff_nodes, encode_list, group_edge_sources, merge_edge_sources, read_pages, summarize,
+                        summarize_sources)
+from graph_schema import provision_tugraph
+from graph_stats import publish_stats, render
+
 load_dotenv()
 
+# 流式导入写完关系后，按名称分页读回节点及其关系，计算度数、反向列表和指纹 (graph_sync.read_pages)
+DISEASE_PAGE_QUERY = """
+MATCH (d:Disease) WHERE d.name > $after
+WITH d ORDER BY d.name LIMIT $limit
+OPTIONAL MATCH (d)-[r:HAS_SYMPTOM]->(s:Symptom)
+RETURN d.name AS name, s.name AS other, r.sources AS sources
+"""
+
+SYMPTOM_PAGE_QUERY = """
+MATCH (s:Symptom) WHERE s.name > $after
+WITH s ORDER BY s.name LIMIT $limit
+OPTIONAL MATCH (d:Disease)-[r:HAS_SYMPTOM]->(s)
+RETURN s.name AS name, d.name AS other, r.sources AS sources
+"""
+
+EDGE_SOURCES_QUERY = """
+UNWIND $rows AS row
+MATCH (d:Disease {name: row.d_name})-[r:HAS_SYMPTOM]->(s:Symptom {name: row.s_name})
+RETURN d.name AS d_name, s.name AS s_name, r.sources AS sources
+"""
+
 class TuGraphImporter:
-    def __init__(self):
+    def __init__(self, batch_size=500, max_retries=3, retry_backoff=1.0, driver=None):
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        # 首次批量 upsert 失败后回退到 UNWIND MERGE
+        self.use_upsert = True
+
+        # 使用调用方提供的 driver (例如基准测试中的内存替身)，不再按环境变量连接
+        if driver is not None:
+            self.driver = driver
+            return
+
         # 配置连接信息
         uri = os.getenv('TUGRAPH_URI', 'bolt://59.110.166.54:7687')
         user = os.getenv('TUGRAPH_USERNAME', 'admin')
@@ -22,115 +65,304 @@ class TuGraphImporter:
             print(f"连接失败: {e}")
             raise e
 
-    def init_schema(self):
-        """初始化数据库 Schema"""
+    def init_schema(self, clear=True):
+        """初始化数据库 Schema，增量同步时传 clear=False 保留已有数据"""
         print("开始初始化 Schema...")
         with self.driver.session(database='default') as session:
             try:
-                # 清除旧数据
-                session.run("MATCH (n) DETACH DELETE n")
+                # 清除旧数据 (保留 GraphMeta 中的版本号，供快照读端判断是否需要刷新)
+                if clear:
+                    session.run("MATCH (n:Disease) DETACH DELETE n")
+                    session.run("MATCH (n:Symptom) DETACH DELETE n")
                 
                 # 创建标签 (TuGraph 必须步骤，忽略已存在错误)
-                try: session.run("CALL db.createVertexLabel('Disease', 'name', 'name', 'STRING', false)")
+                # TuGraph 没有列表类型，Symptom.diseases 以 JSON 数组字符串存储
+                try: session.run(f"CALL db.createVertexLabel('Disease', 'name', 'name', 'STRING', false, '{HASH_PROPERTY}', 'STRING', true, 'symptom_count', 'INT64', true)")
                 except: pass
                 
-                try: session.run("CALL db.createVertexLabel('Symptom', 'name', 'name', 'STRING', false)")
+                try: session.run(f"CALL db.createVertexLabel('Symptom', 'name', 'name', 'STRING', false, '{HASH_PROPERTY}', 'STRING', true, 'diseases', 'STRING', true, 'disease_count', 'INT64', true)")
                 except: pass
+
+                # 旧版本创建的标签没有指纹、度数和反向列表字段，补上 (已存在时忽略)
+                for label, field, field_type, default in (('Disease', HASH_PROPERTY, 'string', "''"),
+                                                          ('Symptom', HASH_PROPERTY, 'string', "''"),
+                                                          ('Disease', 'symptom_count', 'int64', '0'),
+                                                          ('Symptom', 'diseases', 'string', "''"),
+                                                          ('Symptom', 'disease_count', 'int64', '0')):
+                    try: session.run(f"CALL db.alterLabelAddFields('vertex', '{label}', ['{field}', {field_type}, {default}, true])")
+                    except: pass
                 
-                try: session.run("CALL db.createEdgeLabel('HAS_SYMPTOM', '[[\"Disease\", \"Symptom\"]]')")
+                # 关系上的 sources 记录来源文件 (JSON 数组字符串)
+                try: session.run("CALL db.createEdgeLabel('HAS_SYMPTOM', '[[\"Disease\", \"Symptom\"]]', 'sources', 'STRING', true)")
+                except: pass
+
+                try: session.run("CALL db.alterLabelAddFields('edge', 'HAS_SYMPTOM', ['sources', string, '', true])")
+                except: pass
+
+                try: session.run("CALL db.createVertexLabel('GraphMeta', 'key', 'key', 'STRING', false, 'version', 'INT64', true, 'stats', 'STRING', true)")
+                except: pass
+
+                # 图统计信息 (JSON 字符串) 与版本号一起保存，旧版本创建的 GraphMeta 补上该字段
+                try: session.run("CALL db.alterLabelAddFields('vertex', 'GraphMeta', ['stats', string, '', true])")
                 except: pass
                 
                 print("Schema 初始化完成")
             except Exception as e:
                 print(f"Schema 初始化异常: {e}")
 
-    def _get_csv_reader(self, file_path, expected_col):
-        """尝试不同编码读取文件"""
-        encodings = ['utf-8-sig', 'gbk', 'utf-8']
-        
-        for enc in encodings:
+            # 全文索引 + 查询计划检查: 按名称的查找若退化为全标签扫描则抛出 PlanError，停止导入
+            provision_tugraph(session)
+
+    def collect_data(self, diseases_csv, details_csv, symptoms_csv=None):
+        """
+        流式读取疾病表和症状表并在内存中去重，返回 (疾病列表, 症状列表, 关系字典)。
+
+        关系字典为 {(疾病, 症状): [来源文件, ...]}，由 bulk_export.collect_edges 构建 (与 Neo4j
+        导入和离线导出共用)：症状表 Related Disease 列给出的症状 -> 疾病关系与疾病表中的正向关系
+        合并为同一条 HAS_SYMPTOM，来源记录两个文件。
+        """
+        if symptoms_csv and not os.path.exists(symptoms_csv):
+            print(f"跳过症状表导入: {symptoms_csv} 不存在")
+            symptoms_csv = None
+        edges = collect_edges(diseases_csv, details_csv, symptoms_csv)
+        diseases, symptoms = tugraph_nodes(diseases_csv, details_csv, edges)
+        print(f"CSV 读取完成: {len(edges)} 条关系 ({summarize_sources(edges)})")
+        return diseases, symptoms, edges
+
+    def _run_batch(self, session, cypher, params):
+        """在显式事务中写入一个批次，遇到临时性错误时指数退避重试"""
+        for attempt in range(self.max_retries + 1):
             try:
-                f = open(file_path, 'r', encoding=enc)
-                reader = csv.DictReader(f)
-                headers = reader.fieldnames or []
-                
-                # 检查关键列名
-                if expected_col in headers or 'Name' in headers or '疾病名称' in headers:
-                    return f, reader
-                else:
-                    f.close()
-            except UnicodeDecodeError:
-                if 'f' in locals(): f.close()
-                continue
-        
-        print(f"错误: 在 {file_path} 中无法识别表头")
-        return None, None
+                with session.begin_transaction() as tx:
+                    tx.run(cypher, params).consume()
+                    tx.commit()
+                return
+            except (TransientError, ServiceUnavailable, SessionExpired) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_backoff * (2 ** attempt)
+                print(f"    批次写入失败 ({e.__class__.__name__})，{delay:.1f}s 后重试 ({attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
 
-    def import_data(self, diseases_csv, details_csv):
-        print("开始导入数据...")
-        with self.driver.session(database='default') as session:
-            
-            # 1. 处理主要疾病表
-            f, reader = self._get_csv_reader(diseases_csv, '疾病名称')
-            if f and reader:
-                count = 0
-                for row in reader:
-                    d_name = row.get('疾病名称') or row.get('Name')
-                    if not d_name: continue
-                    d_name = d_name.strip()
-
-                    session.run("MERGE (d:Disease {name: $name})", name=d_name)
-                    
-                    # 动态处理分列的症状
-                    for col, val in row.items():
-                        # 筛选包含'症状'的列，且排除元数据列
-                        if col and ('症状' in col or 'Symptom' in col) and val and val.strip():
-                            if col in ['疾病名称', 'Name', '网址', '别名', '描述']: continue
-                            
-                            s_name = val.strip()
-                            session.run("MERGE (s:Symptom {name: $name})", name=s_name)
-                            session.run("""
-                                MATCH (d:Disease {name: $d_name})
-                                MATCH (s:Symptom {name: $s_name})
-                                MERGE (d)-[:HAS_SYMPTOM]->(s)
-                            """, d_name=d_name, s_name=s_name)
-                    
-                    count += 1
-                
-                f.close()
-                print(f"主要疾病表导入完成，共处理 {count} 条数据")
-            else:
-                print("跳过主要疾病表导入")
-
-            # 2. 处理疾病详情表
-            f, reader = self._get_csv_reader(details_csv, '典型症状')
-            if f and reader:
-                count = 0
-                for row in reader:
-                    d_name = row.get('疾病名称') or row.get('Name')
-                    if not d_name: continue
-                    d_name = d_name.strip()
-
-                    session.run("MERGE (d:Disease {name: $name})", name=d_name)
-
-                    # 处理逗号分隔的症状列
-                    s_str = row.get('典型症状') or row.get('症状') or row.get('Typical Symptoms')
-                    if s_str:
-                        s_list = [s.strip() for s in s_str.replace('，', ',').split(',') if s.strip()]
-                        for s_name in s_list:
-                            session.run("MERGE (s:Symptom {name: $name})", name=s_name)
-                            session.run("""
-                                MATCH (d:Disease {name: $d_name})
-                                MATCH (s:Symptom {name: $s_name})
-                                MERGE (d)-[:HAS_SYMPTOM]->(s)
-                            """, d_name=d_name, s_name=s_name)
-                    
-                    count += 1
-                
-                f.close()
-                print(f"详情表导入完成，共处理 {count} 条数据")
+    def _write_phase(self, session, phase, rows, upsert_cypher, unwind_cypher, upsert_params=None, prepare=None):
+        """
+        按 batch_size 分批写入，优先使用 TuGraph 的批量 upsert 存储过程 (upsert_cypher 为 None 时直接 UNWIND)。
+
+        rows 可以是生成器，只按批次读取；prepare(session, batch) 在写入前转换每个批次。
+        """
+        total = 0
+        start = time.perf_counter()
+        for batch in batched(rows, self.batch_size):
+            if prepare is not None:
+                batch = prepare(session, batch)
+            if upsert_cypher is None:
+                self._run_batch(session, unwind_cypher, {'rows': batch})
+            elif self.use_upsert:
+                try:
+                    self._run_batch(session, upsert_cypher, dict(upsert_params or {}, rows=batch))
+                except ClientError as e:
+                    # 服务端不支持批量 upsert 存储过程时，改用 UNWIND + MERGE
+                    print(f"    批量 upsert 不可用 ({e.code})，改用 UNWIND MERGE")
+                    self.use_upsert = False
+            if upsert_cypher is not None and not self.use_upsert:
+                self._run_batch(session, unwind_cypher, {'rows': batch})
+
+            total += len(batch)
+            elapsed = time.perf_counter() - start
+            print(f"  [{phase}] {total} ({total / elapsed if elapsed > 0 else 0:.0f} 行/秒)")
+
+        if total == 0:
+            print(f"  [{phase}] 无需写入")
+            return 0
+        elapsed = time.perf_counter() - start
+        print(f"  [{phase}] 完成 {total} 行，耗时 {elapsed:.2f}s")
+        return total
+
+    def _vertex_properties(self, diseases, symptoms, edges):
+        """
+        预计算的度数和反向列表: 疾病的 symptom_count，症状的 diseases (按来源数、名称排序) 和 disease_count。
+
+        节点指纹覆盖这些属性，疾病指纹还覆盖其症状及每条关系的来源。
+        返回 ({疾病: 属性}, {症状: 属性}, {疾病: {症状: 来源}})，属性中含指纹。
+        """
+        disease_adj, symptom_adj = adjacency_properties(edges, diseases, symptoms)
+        symptoms_by_disease = group_edge_sources(edges)
+        d_props = {}
+        for name in diseases:
+            props = dict(name=name, **disease_adj[name])
+            props[HASH_PROPERTY] = content_hash(dict(props), symptoms_by_disease.get(name, {}))
+            d_props[name] = props
+        s_props = {}
+        for name in symptoms:
+            props = {'name': name, 'diseases': encode_list(symptom_adj[name]['diseases']),
+                     'disease_count': symptom_adj[name]['disease_count']}
+            props[HASH_PROPERTY] = content_hash(dict(props))
+            s_props[name] = props
+        return d_props, s_props, symptoms_by_disease
+
+    def _upsert_vertices(self, session, label, rows, fields, phase=None):
+        """rows: 属性字典 (可以是生成器)，fields: 除 name 外要写入的属性"""
+        self._write_phase(
+            session, phase or f'{label} upsert',
+            rows,
+            f"CALL db.upsertVertex('{label}', $rows)",
+            f"UNWIND $rows AS row MERGE (n:{label} {{name: row.name}}) SET "
+            + ", ".join(f"n.{key} = row.{key}" for key in fields)
+        )
+
+    def _upsert_edges(self, session, rows, prepare=None):
+        """rows: {'d_name', 's_name', 'sources'} 字典 (可以是生成器)"""
+        self._write_phase(
+            session, 'HAS_SYMPTOM',
+            rows,
+            "CALL db.upsertEdge('HAS_SYMPTOM', $start, $end, $rows)",
+            """
+            UNWIND $rows AS row
+            MATCH (d:Disease {name: row.d_name})
+            MATCH (s:Symptom {name: row.s_name})
+            MERGE (d)-[r:HAS_SYMPTOM]->(s)
+            SET r.sources = row.sources
+            """,
+            {'start': {'type': 'Disease', 'key': 'd_name'}, 'end': {'type': 'Symptom', 'key': 's_name'}},
+            prepare
+        )
+
+    def _merge_sources(self, session, batch):
+        """一批 (疾病, 症状, 来源) 记录在批内去重，并合并库中该关系已有的来源 (TuGraph 不能在 Cypher 中追加 JSON 列表)"""
+        edges = merge_edge_sources(*((source, [(d, s)]) for d, s, source in batch))
+        keys = [{'d_name': d, 's_name': s} for d, s in edges]
+        for row in session.run(EDGE_SOURCES_QUERY, rows=keys).data():
+            pair = (row['d_name'], row['s_name'])
+            existing = decode_list(row['sources']) or []
+            edges[pair] = existing + [source for source in edges[pair] if source not in existing]
+        return [{'d_name': d, 's_name': s, 'sources': encode_list(sources)} for (d, s), sources in edges.items()]
+
+    def _adjacency_rows(self, session, label):
+        """按页读回 label 的全部节点及其关系，生成含度数、反向列表和指纹的属性字典"""
+        query = DISEASE_PAGE_QUERY if label == 'Disease' else SYMPTOM_PAGE_QUERY
+        run = lambda cypher, params: session.run(cypher, params).data()
+        for rows in read_pages(run, query, self.batch_size):
+            names = list(dict.fromkeys(row['name'] for row in rows))
+            linked = [row for row in rows if row['other'] is not None]
+            if label == 'Disease':
+                edges = {(row['name'], row['other']): decode_list(row['sources']) or [] for row in linked}
+                props, _, _ = self._vertex_properties(names, [], edges)
             else:
-                print("跳过详情表导入")
+                edges = {(row['other'], row['name']): decode_list(row['sources']) or [] for row in linked}
+                _, props, _ = self._vertex_properties([], names, edges)
+            yield from props.values()
+
+    def import_data(self, diseases_csv, details_csv, symptoms_csv=None):
+        """
+        流式导入: 逐批写入节点和关系，内存中只保留一个批次，不构建完整的图。
+
+        节点按 TuGraph 方式由每行疾病和关系端点生成；同一关系在多个文件中出现时
+        合并来源；最后按页读回节点计算度数、反向列表和指纹。增量同步 (sync_data)
+        需要一次比较全部指纹，仍通过 collect_data 读入完整的图。
+        """
+        print(f"开始流式导入数据 (batch_size={self.batch_size})...")
+        if symptoms_csv and not os.path.exists(symptoms_csv):
+            print(f"跳过症状表导入: {symptoms_csv} 不存在")
+            symptoms_csv = None
+
+        def disease_names():
+            for path in (diseases_csv, details_csv):
+                for record in iter_records(path):
+                    yield record.disease
+            if symptoms_csv:
+                for disease, _ in iter_related_diseases(symptoms_csv):
+                    yield disease
+
+        def symptom_names():
+            for _, symptom, _ in iter_edge_records(diseases_csv, details_csv, symptoms_csv):
+                yield symptom
+
+        def first_seen(names):
+            # 本次导入已写入的名称集合，每个节点只 upsert 一次 (只存名称，不存属性)
+            seen = set()
+            for name in names:
+                if name not in seen:
+                    seen.add(name)
+                    yield {'name': name}
+
+        with self.driver.session(database='default') as session:
+            for label, names in (('Disease', disease_names()), ('Symptom', symptom_names())):
+                self._upsert_vertices(session, label, first_seen(names), [])
+            self._upsert_edges(session, iter_edge_records(diseases_csv, details_csv, symptoms_csv),
+                               prepare=self._merge_sources)
+            self._upsert_vertices(session, 'Disease', self._adjacency_rows(session, 'Disease'),
+                                  ['symptom_count', HASH_PROPERTY], 'Disease 度数与指纹')
+            self._upsert_vertices(session, 'Symptom', self._adjacency_rows(session, 'Symptom'),
+                                  ['diseases', 'disease_count', HASH_PROPERTY], 'Symptom 反向列表与指纹')
+
+    def sync_data(self, diseases_csv, details_csv, symptoms_csv=None):
+        """增量同步: 比较内容指纹，只写入新增/变更/删除的节点和关系，不清空图 (读入完整的图以计算全部指纹)"""
+        print("开始增量同步...")
+        diseases, symptoms, edges = self.collect_data(diseases_csv, details_csv, symptoms_csv)
+        d_props, s_props, symptoms_by_disease = self._vertex_properties(diseases, symptoms, edges)
+        d_hashes = {name: props[HASH_PROPERTY] for name, props in d_props.items()}
+        s_hashes = {name: props[HASH_PROPERTY] for name, props in s_props.items()}
+
+        with self.driver.session(database='default') as session:
+            existing_d = {r['name']: r['hash'] for r in session.run(
+                f"MATCH (n:Disease) RETURN n.name AS name, n.{HASH_PROPERTY} AS hash")}
+            existing_s = {r['name']: r['hash'] for r in session.run(
+                f"MATCH (n:Symptom) RETURN n.name AS name, n.{HASH_PROPERTY} AS hash")}
+
+            d_inserts, d_updates, d_deletes = diff_nodes(d_hashes, existing_d)
+            s_inserts, s_updates, s_deletes = diff_nodes(s_hashes, existing_s)
+            print(summarize('Disease', d_inserts, d_updates, d_deletes))
+            print(summarize('Symptom', s_inserts, s_updates, s_deletes))
+
+            # 疾病指纹包含其症状及来源，只需对变化的疾病比较关系；其全部关系重新写入以更新来源
+            current_edges = []
+            if d_updates:
+                current_edges = [(r['disease'], r['symptom']) for r in session.run("""
+                    UNWIND $names AS name
+                    MATCH (d:Disease {name: name})-[:HAS_SYMPTOM]->(s:Symptom)
+                    RETURN d.name AS disease, s.name AS symptom
+                """, names=d_updates)]
+            wanted_edges = [(d, s) for d in d_inserts + d_updates for s in symptoms_by_disease.get(d, ())]
+            e_inserts, e_deletes = diff_edges(wanted_edges, current_edges)
+            print(f"HAS_SYMPTOM: +{len(e_inserts)} -{len(e_deletes)} (写入 {len(wanted_edges)} 条)")
+
+            self._upsert_vertices(session, 'Disease', [d_props[name] for name in d_inserts + d_updates],
+                                  ['symptom_count', HASH_PROPERTY])
+            self._upsert_vertices(session, 'Symptom', [s_props[name] for name in s_inserts + s_updates],
+                                  ['diseases', 'disease_count', HASH_PROPERTY])
+            self._write_phase(
+                session, 'HAS_SYMPTOM delete',
+                [{'d_name': d, 's_name': s} for d, s in e_deletes],
+                None,
+                """
+                UNWIND $rows AS row
+                MATCH (:Disease {name: row.d_name})-[r:HAS_SYMPTOM]->(:Symptom {name: row.s_name})
+                DELETE r
+                """
+            )
+            self._upsert_edges(session, [{'d_name': d, 's_name': s, 'sources': encode_list(edges[(d, s)])}
+                                         for d, s in wanted_edges])
+            for label, names in (('Disease', d_deletes), ('Symptom', s_deletes)):
+                self._write_phase(
+                    session, f'{label} delete',
+                    [{'name': name} for name in names],
+                    None,
+                    f"UNWIND $rows AS row MATCH (n:{label} {{name: row.name}}) DETACH DELETE n"
+                )
+
+    def bump_version(self):
+        """导入完成后递增图版本号，通知快照读端重新加载"""
+        with self.driver.session(database='default') as session:
+            version = session.run(BUMP_VERSION_QUERY).single()['version']
+        print(f"图版本号更新为 {version}")
+        return version
+
+    def publish_stats(self):
+        """统计标签、属性、数量和度分布并与当前版本号一起写入 GraphMeta，问答进程据此生成 Prompt 中的 Schema"""
+        with self.driver.session(database='default') as session:
+            stats = publish_stats(lambda cypher, params=None: session.run(cypher, params).data())
+        print(f"图统计信息已更新 (版本 {stats['version']}, 耗时 {stats['seconds']:.2f}s):\n{render(stats)}")
+        return stats
 
     def verify(self):
         print("正在验证导入结果...")
@@ -139,8 +371,11 @@ class TuGraphImporter:
                 d_num = session.run("MATCH (n:Disease) RETURN count(n) as c").single()['c']
                 s_num = session.run("MATCH (n:Symptom) RETURN count(n) as c").single()['c']
                 r_num = session.run("MATCH ()-[r:HAS_SYMPTOM]->() RETURN count(r) as c").single()['c']
+                top = session.run("MATCH (s:Symptom) RETURN s.name AS name, s.disease_count AS c "
+                                  "ORDER BY s.disease_count DESC LIMIT 3").data()
                 
                 print(f"统计结果:\n - Disease 节点: {d_num}\n - Symptom 节点: {s_num}\n - 关系数量: {r_num}")
+                print(" - 关联疾病最多的症状: " + "、".join(f"{r['name']} ({r['c']})" for r in top))
                 
                 if d_num == 0:
                     print("警告: 数据库为空")
@@ -151,14 +386,25 @@ class TuGraphImporter:
         self.driver.close()
 
 if __name__ == "__main__":
-    importer = TuGraphImporter()
+    parser = argparse.ArgumentParser(description="导入 CSV 数据到 TuGraph")
+    parser.add_argument('--sync', action='store_true', help="增量同步，不清空已有数据")
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    importer = TuGraphImporter(batch_size=args.batch_size)
     
     file1 = 'data/diseases.csv'
     file2 = 'data/disease_details.csv'
+    file3 = 'data/symptoms.csv'
     
     if os.path.exists(file1) and os.path.exists(file2):
-        importer.init_schema()
-        importer.import_data(file1, file2)
+        importer.init_schema(clear=not args.sync)
+        if args.sync:
+            importer.sync_data(file1, file2, file3)
+        else:
+            importer.import_data(file1, file2, file3)
+        importer.bump_version()
+        importer.publish_stats()
         importer.verify()
     else:
         print("CSV文件未找到，请检查路径")
@@ -1,152 +1,397 @@
-import pandas as pd
-from py2neo import Graph, Node, Relationship
+import argparse
+import time
+from py2neo import Graph
 import os
 
+from bulk_export import (DISEASE_PROPERTIES, NODE_PROPERTIES, SYMPTOM_PROPERTIES, add_adjacency, build_neo4j_graph,
+                         iter_edge_records)
+from csv_ingest import batched, detect_encoding, iter_nodes, iter_related_diseases
+from graph_sync import (BUMP_VERSION_QUERY, HASH_PROPERTY, diff_edges, diff_nodes, group_edge_sources, read_pages,
+                        summarize)
+from graph_schema import PlanError, provision_neo4j
+from graph_stats import publish_stats, render
+
 NEO4J_URI = "bolt://localhost:7687"
 NEO4J_USER = "neo4j"
 NEO4J_PASSWORD = ""
 
 DATA_DIR = "../data"
 
-print("Connecting to Neo4j...")
-graph = Graph(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+# "bulk" sends column-wise UNWIND batches, "row" keeps the original one-query-per-row import,
+# "sync" diffs content hashes against the live graph and only writes what changed
+IMPORT_MODE = "bulk"
+BATCH_SIZE = 1000
+
+# Node columns: CSV properties, the precomputed degree / reverse-lookup properties, then the content hash
+DISEASE_KEYS = DISEASE_PROPERTIES + [HASH_PROPERTY]
+SYMPTOM_KEYS = SYMPTOM_PROPERTIES + [HASH_PROPERTY]
+EDGE_KEYS = ["disease", "symptom", "sources"]
+# What the streaming import writes once the edges are in: adjacency properties and the content hash
+DISEASE_ADJACENCY_KEYS = ["name", "symptom_count", HASH_PROPERTY]
+SYMPTOM_ADJACENCY_KEYS = ["name", "diseases", "disease_count", HASH_PROPERTY]
+EDGE_RECORD_KEYS = ["disease", "symptom", "source"]
+
+# sources: the CSV files that record the edge (diseases.csv / disease_details.csv forward, symptoms.csv reverse)
+MERGE_HAS_SYMPTOM_QUERY = """
+UNWIND range(0, size($disease) - 1) AS i
+MATCH (d:Disease {name: $disease[i]})
+MATCH (s:Symptom {name: $symptom[i]})
+MERGE (d)-[r:HAS_SYMPTOM]->(s)
+SET r.sources = $sources[i]
+"""
+
+# One edge record: a pair already merged from another file (or earlier in this one) gains the source once
+APPEND_HAS_SYMPTOM_QUERY = """
+UNWIND range(0, size($disease) - 1) AS i
+MATCH (d:Disease {name: $disease[i]})
+MATCH (s:Symptom {name: $symptom[i]})
+MERGE (d)-[r:HAS_SYMPTOM]->(s)
+SET r.sources = CASE WHEN $source[i] IN coalesce(r.sources, []) THEN r.sources
+                     ELSE coalesce(r.sources, []) + $source[i] END
+"""
+
+# Pages of nodes with their edges, for the adjacency properties (graph_sync.read_pages)
+DISEASE_PAGE_QUERY = """
+MATCH (d:Disease) WHERE d.name > $after
+WITH d ORDER BY d.name LIMIT $limit
+OPTIONAL MATCH (d)-[r:HAS_SYMPTOM]->(s:Symptom)
+RETURN d.name AS name, d.website AS website, d.aliases AS aliases, d.description AS description,
+       s.name AS symptom, r.sources AS sources
+"""
+
+SYMPTOM_PAGE_QUERY = """
+MATCH (s:Symptom) WHERE s.name > $after
+WITH s ORDER BY s.name LIMIT $limit
+OPTIONAL MATCH (d:Disease)-[r:HAS_SYMPTOM]->(s)
+RETURN s.name AS name, s.website AS website, s.aliases AS aliases, s.description AS description,
+       d.name AS disease, r.sources AS sources
+"""
+
+UPSERT_NODES_QUERY = """
+UNWIND range(0, size($name) - 1) AS i
+MERGE (n:{label} {{name: $name[i]}})
+SET {assignments}
+"""
+
+DELETE_NODES_QUERY = """
+UNWIND $name AS name
+MATCH (n:{label} {{name: name}})
+DETACH DELETE n
+"""
+
+# Related diseases of symptoms.csv that diseases.csv does not list; catalogued ones keep their properties
+MERGE_RELATED_DISEASES_QUERY = """
+UNWIND $name AS name
+MERGE (d:Disease {name: name})
+ON CREATE SET d.website = '', d.aliases = '', d.description = ''
+"""
+
+DELETE_HAS_SYMPTOM_QUERY = """
+UNWIND range(0, size($disease) - 1) AS i
+MATCH (:Disease {name: $disease[i]})-[r:HAS_SYMPTOM]->(:Symptom {name: $symptom[i]})
+DELETE r
+"""
+
+
+def upsert_query(label, keys):
+    return UPSERT_NODES_QUERY.format(label=label, assignments=", ".join(f"n.{key} = ${key}[i]" for key in keys[1:]))
+
+
+# Import query shapes checked with EXPLAIN before writing; each must seek Disease/Symptom by the name constraint
+IMPORT_PLAN_SHAPES = {
+    "merge_has_symptom": (MERGE_HAS_SYMPTOM_QUERY, {"disease": [""], "symptom": [""], "sources": [[""]]}),
+    "append_has_symptom": (APPEND_HAS_SYMPTOM_QUERY, {"disease": [""], "symptom": [""], "source": [""]}),
+    "upsert_disease": (upsert_query("Disease", DISEASE_KEYS), {key: [""] for key in DISEASE_KEYS}),
+    "merge_related_diseases": (MERGE_RELATED_DISEASES_QUERY, {"name": [""]}),
+    "delete_has_symptom": (DELETE_HAS_SYMPTOM_QUERY, {"disease": [""], "symptom": [""]}),
+}
+
+
+def data_files(data_dir):
+    return (os.path.join(data_dir, "diseases.csv"),
+            os.path.join(data_dir, "symptoms.csv"),
+            os.path.join(data_dir, "disease_details.csv"))
+
+
+def node_rows(nodes, keys, names=None):
+    """Rows (tuples aligned with keys) of the given node property dicts, optionally only for `names`."""
+    for name in nodes if names is None else names:
+        yield tuple(nodes[name][key] for key in keys)
+
+
+def edge_rows(edges, pairs=None):
+    for pair in edges if pairs is None else pairs:
+        yield pair + (edges[pair],)
+
+
+def run_batched(graph, query, keys, rows, phase, batch_size=BATCH_SIZE):
+    """Send rows (tuples aligned with keys) as column-wise UNWIND batches, one transaction per batch."""
+    total = 0
+    start = time.perf_counter()
+    for batch in batched(rows, batch_size):
+        columns = {key: list(values) for key, values in zip(keys, zip(*batch))}
+        tx = graph.begin()
+        tx.run(query, columns)
+        graph.commit(tx)
+        total += len(batch)
+        print(f"  [{phase}] sent {total} rows...")
+    if total == 0:
+        print(f"  [{phase}] nothing to send")
+        return 0
+    elapsed = time.perf_counter() - start
+    rate = total / elapsed if elapsed > 0 else float('inf')
+    print(f"  [{phase}] {total} rows in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+    return total
+
+
+def csv_node_rows(path):
+    """Rows (tuples aligned with NODE_PROPERTIES) streamed from a node table."""
+    for props in iter_nodes(path):
+        yield tuple(props[key] for key in NODE_PROPERTIES)
+
+
+def related_disease_rows(symptoms_csv):
+    """(name,) rows for the related diseases of symptoms.csv; MERGE skips the ones already written."""
+    for disease, _ in iter_related_diseases(symptoms_csv):
+        yield (disease,)
+
+
+def adjacency_rows(graph, label, batch_size=BATCH_SIZE):
+    """
+    Rows (tuples aligned with the label's adjacency keys) for every node of `label`, read back a page at a time.
+
+    Each page's nodes come with their edges and sources, which is all bulk_export.add_adjacency needs
+    for their degree, reverse-lookup list and content hash.
+    """
+    query, keys, other = ((DISEASE_PAGE_QUERY, DISEASE_ADJACENCY_KEYS, "symptom") if label == "Disease"
+                          else (SYMPTOM_PAGE_QUERY, SYMPTOM_ADJACENCY_KEYS, "disease"))
+    run = lambda cypher, params: graph.run(cypher, params).data()
+    for rows in read_pages(run, query, batch_size):
+        nodes = {row["name"]: {key: row[key] for key in NODE_PROPERTIES} for row in rows}
+        if label == "Disease":
+            edges = {(row["name"], row[other]): row["sources"] for row in rows if row[other] is not None}
+            add_adjacency(nodes, {}, edges)
+        else:
+            edges = {(row[other], row["name"]): row["sources"] for row in rows if row[other] is not None}
+            add_adjacency({}, nodes, edges)
+        yield from node_rows(nodes, keys)
+
+
+def import_bulk(graph, data_dir, batch_size=BATCH_SIZE):
+    """
+    Stream the CSVs into the graph as UNWIND batches; memory stays at one batch whatever the crawl size.
+
+    Nodes are upserted with their CSV properties, then every edge record is merged (an edge found in
+    several files records each of them in sources) and only then are the adjacency properties and
+    content hashes computed, a page of nodes at a time from what was written. Only sync_incremental
+    builds the whole graph in memory, to diff it against the stored hashes.
+    """
+    diseases_csv, symptoms_csv, details_csv = data_files(data_dir)
+    print(f"\nBulk import with UNWIND batches of {batch_size} rows...")
+
+    print("\nUpserting Disease nodes...")
+    disease_count = run_batched(graph, upsert_query("Disease", NODE_PROPERTIES), NODE_PROPERTIES,
+                                csv_node_rows(diseases_csv), "Disease nodes", batch_size)
+    print(f"Total disease rows sent: {disease_count}")
+    run_batched(graph, MERGE_RELATED_DISEASES_QUERY, ["name"], related_disease_rows(symptoms_csv),
+                "related Disease nodes", batch_size)
+
+    print("\nUpserting Symptom nodes...")
+    symptom_count = run_batched(graph, upsert_query("Symptom", NODE_PROPERTIES), NODE_PROPERTIES,
+                                csv_node_rows(symptoms_csv), "Symptom nodes", batch_size)
+    print(f"Total symptom rows sent: {symptom_count}")
+
+    print("\nMerging Disease-Symptom relationships...")
+    rel_count = run_batched(graph, APPEND_HAS_SYMPTOM_QUERY, EDGE_RECORD_KEYS,
+                            iter_edge_records(diseases_csv, details_csv, symptoms_csv),
+                            "HAS_SYMPTOM records", batch_size)
+    print(f"Sent {rel_count} edge records (pairs without a catalogued Symptom are skipped)")
+
+    print("\nSetting degrees, reverse lookups and content hashes...")
+    for label, keys in (("Disease", DISEASE_ADJACENCY_KEYS), ("Symptom", SYMPTOM_ADJACENCY_KEYS)):
+        run_batched(graph, upsert_query(label, keys), keys, adjacency_rows(graph, label, batch_size),
+                    f"{label} adjacency", batch_size)
+
 
-print("Clearing existing data...")
-graph.run("MATCH (n) DETACH DELETE n")
+def fetch_hashes(graph, label):
+    result = graph.run(f"MATCH (n:{label}) RETURN n.name AS name, n.{HASH_PROPERTY} AS hash").data()
+    return {record['name']: record['hash'] for record in result}
 
-print("\nReading CSV files...")
 
-def read_csv_auto_encoding(filepath):
-    encodings = ['utf-8', 'gbk', 'gb2312', 'gb18030']
-    for encoding in encodings:
+def fetch_edges(graph, disease_names):
+    result = graph.run("""
+    UNWIND $names AS name
+    MATCH (d:Disease {name: name})-[:HAS_SYMPTOM]->(s:Symptom)
+    RETURN d.name AS disease, s.name AS symptom
+    """, names=disease_names).data()
+    return [(record['disease'], record['symptom']) for record in result]
+
+
+def sync_incremental(graph, data_dir, batch_size=BATCH_SIZE):
+    """
+    Apply only the inserts, updates and deletes needed to bring the graph in line with the CSVs.
+
+    Unlike the full imports this builds the whole graph in memory (build_neo4j_graph): the diff
+    needs every desired hash at once.
+    """
+    print(f"\nIncremental sync with UNWIND batches of {batch_size} rows...")
+
+    # Same nodes, edges, adjacency properties and hashes as the bulk import
+    diseases, symptoms, edges = build_neo4j_graph(*data_files(data_dir))
+    desired_diseases = {name: props[HASH_PROPERTY] for name, props in diseases.items()}
+    desired_symptoms = {name: props[HASH_PROPERTY] for name, props in symptoms.items()}
+
+    d_inserts, d_updates, d_deletes = diff_nodes(desired_diseases, fetch_hashes(graph, "Disease"))
+    s_inserts, s_updates, s_deletes = diff_nodes(desired_symptoms, fetch_hashes(graph, "Symptom"))
+    print(summarize("Disease", d_inserts, d_updates, d_deletes))
+    print(summarize("Symptom", s_inserts, s_updates, s_deletes))
+
+    # A disease's hash covers its symptoms and their sources, so only changed diseases need an edge diff;
+    # all their edges are re-merged so the sources of edges that already exist are refreshed too
+    changed = d_inserts + d_updates
+    symptoms_by_disease = group_edge_sources(edges)
+    desired_edges = [(d, s) for d in changed for s in symptoms_by_disease.get(d, {})]
+    e_inserts, e_deletes = diff_edges(desired_edges, fetch_edges(graph, d_updates) if d_updates else [])
+    print(f"HAS_SYMPTOM: +{len(e_inserts)} -{len(e_deletes)} ({len(desired_edges)} merged)")
+
+    run_batched(graph, upsert_query("Symptom", SYMPTOM_KEYS), SYMPTOM_KEYS,
+                node_rows(symptoms, SYMPTOM_KEYS, s_inserts + s_updates), "Symptom upserts", batch_size)
+    run_batched(graph, upsert_query("Disease", DISEASE_KEYS), DISEASE_KEYS,
+                node_rows(diseases, DISEASE_KEYS, changed), "Disease upserts", batch_size)
+    run_batched(graph, DELETE_HAS_SYMPTOM_QUERY, ["disease", "symptom"], e_deletes, "HAS_SYMPTOM deletes", batch_size)
+    run_batched(graph, MERGE_HAS_SYMPTOM_QUERY, EDGE_KEYS, edge_rows(edges, desired_edges),
+                "HAS_SYMPTOM merges", batch_size)
+    run_batched(graph, DELETE_NODES_QUERY.format(label="Disease"), ["name"],
+                ((name,) for name in d_deletes), "Disease deletes", batch_size)
+    run_batched(graph, DELETE_NODES_QUERY.format(label="Symptom"), ["name"],
+                ((name,) for name in s_deletes), "Symptom deletes", batch_size)
+
+
+def import_rows(graph, data_dir, batch_size=BATCH_SIZE):
+    """One query per CSV row, streamed like import_bulk; the adjacency pass still goes in batches."""
+    diseases_csv, symptoms_csv, details_csv = data_files(data_dir)
+
+    for label, path in (("Disease", diseases_csv), ("Symptom", symptoms_csv)):
+        print(f"\nCreating {label} nodes...")
+        query = upsert_query(label, NODE_PROPERTIES)
+        count = 0
+        for row in csv_node_rows(path):
+            graph.run(query, {key: [value] for key, value in zip(NODE_PROPERTIES, row)})
+            count += 1
+            if count % 100 == 0:
+                print(f"  Created {count} {label.lower()} nodes...")
+
+        print(f"Total {label.lower()} rows sent: {count}")
+        if label == "Disease":
+            for row in related_disease_rows(symptoms_csv):
+                graph.run(MERGE_RELATED_DISEASES_QUERY, name=list(row))
+
+    print("\nCreating Disease-Symptom relationships...")
+    rel_count = 0
+    for disease_name, symptom_name, source in iter_edge_records(diseases_csv, details_csv, symptoms_csv):
         try:
-            return pd.read_csv(filepath, encoding=encoding)
+            graph.run(APPEND_HAS_SYMPTOM_QUERY, disease=[disease_name], symptom=[symptom_name], source=[source])
+            rel_count += 1
         except:
-            continue
-    raise Exception(f"Cannot read {filepath} with any encoding")
-
-diseases_df = read_csv_auto_encoding(os.path.join(DATA_DIR, "diseases.csv"))
-symptoms_df = read_csv_auto_encoding(os.path.join(DATA_DIR, "symptoms.csv"))
-disease_details_df = read_csv_auto_encoding(os.path.join(DATA_DIR, "disease_details.csv"))
-
-print(f"Loaded {len(diseases_df)} diseases")
-print(f"Loaded {len(symptoms_df)} symptoms")
-print(f"Loaded {len(disease_details_df)} disease details")
-
-print("\nCreating Disease nodes...")
-disease_count = 0
-for idx, row in diseases_df.iterrows():
-    disease_node = Node(
-        "Disease",
-        name=str(row['Name']),
-        website=str(row.get('Website', '')),
-        aliases=str(row.get('Aliases', '')),
-        description=str(row.get('Description', ''))
-    )
-    graph.create(disease_node)
-    disease_count += 1
-    if disease_count % 100 == 0:
-        print(f"  Created {disease_count} disease nodes...")
-
-print(f"Total disease nodes created: {disease_count}")
-
-print("\nCreating Symptom nodes...")
-symptom_count = 0
-for idx, row in symptoms_df.iterrows():
-    symptom_node = Node(
-        "Symptom",
-        name=str(row['Name']),
-        website=str(row.get('Website', '')),
-        aliases=str(row.get('Aliases', '')),
-        description=str(row.get('Description', ''))
-    )
-    graph.create(symptom_node)
-    symptom_count += 1
-    if symptom_count % 100 == 0:
-        print(f"  Created {symptom_count} symptom nodes...")
-
-print(f"Total symptom nodes created: {symptom_count}")
-
-print("\nCreating Disease-Symptom relationships from diseases.csv...")
-rel_count_1 = 0
-for idx, row in diseases_df.iterrows():
-    disease_name = str(row['Name'])
-    
-    symptom_columns = ['Related Symptom 1', 'Related Symptom 2', 
-                      'Related Symptom 3', 'Related Symptom 4']
-    
-    for col in symptom_columns:
-        if col in row and pd.notna(row[col]) and str(row[col]).strip():
-            symptom_name = str(row[col]).strip()
-            
-            query = """
-            MATCH (d:Disease {name: $disease_name})
-            MATCH (s:Symptom {name: $symptom_name})
-            MERGE (d)-[:HAS_SYMPTOM]->(s)
-            """
-            try:
-                graph.run(query, disease_name=disease_name, symptom_name=symptom_name)
-                rel_count_1 += 1
-            except:
-                pass
-    
-    if (idx + 1) % 100 == 0:
-        print(f"  Processed {idx + 1} diseases...")
-
-print(f"Created {rel_count_1} Disease-Symptom relationships from diseases.csv")
-
-print("\nCreating Disease-Symptom relationships from disease_details.csv...")
-rel_count_2 = 0
-for idx, row in disease_details_df.iterrows():
-    disease_name = str(row['Name'])
-    typical_symptoms = str(row.get('Typical Symptoms', ''))
-    
-    if pd.notna(typical_symptoms) and typical_symptoms.strip():
-        symptom_list = typical_symptoms.replace('\t', '').replace('\n', '').split('、')
-        
-        for symptom in symptom_list:
-            symptom = symptom.strip()
-            if symptom:
-                query = """
-                MATCH (d:Disease {name: $disease_name})
-                MATCH (s:Symptom {name: $symptom_name})
-                MERGE (d)-[:HAS_SYMPTOM]->(s)
-                """
-                try:
-                    graph.run(query, disease_name=disease_name, symptom_name=symptom)
-                    rel_count_2 += 1
-                except:
-                    pass
-    
-    if (idx + 1) % 50 == 0:
-        print(f"  Processed {idx + 1} disease details...")
-
-print(f"Created {rel_count_2} Disease-Symptom relationships from disease_details.csv")
-
-print("\n" + "="*70)
-print("Data import completed!")
-print("="*70)
-
-print("\nVerifying data...")
-result = graph.run("MATCH (d:Disease) RETURN count(d) as count").data()
-print(f"Total Disease nodes: {result[0]['count']}")
-
-result = graph.run("MATCH (s:Symptom) RETURN count(s) as count").data()
-print(f"Total Symptom nodes: {result[0]['count']}")
-
-result = graph.run("MATCH ()-[r:HAS_SYMPTOM]->() RETURN count(r) as count").data()
-print(f"Total HAS_SYMPTOM relationships: {result[0]['count']}")
-
-print("\nSample query test:")
-result = graph.run("""
-MATCH (d:Disease)-[:HAS_SYMPTOM]->(s:Symptom)
-RETURN d.name as disease, s.name as symptom
-LIMIT 5
-""").data()
-
-for record in result:
-    print(f"  {record['disease']} -> {record['symptom']}")
-
-print("\n" + "="*70)
-print("Import and verification successful!")
-print("="*70)
\ No newline at end of file
+            pass
+        if rel_count and rel_count % 100 == 0:
+            print(f"  Processed {rel_count} relationships...")
+
+    print(f"Processed {rel_count} Disease-Symptom records")
+
+    print("\nSetting degrees, reverse lookups and content hashes...")
+    for label, keys in (("Disease", DISEASE_ADJACENCY_KEYS), ("Symptom", SYMPTOM_ADJACENCY_KEYS)):
+        run_batched(graph, upsert_query(label, keys), keys, adjacency_rows(graph, label, batch_size),
+                    f"{label} adjacency", batch_size)
+
+
+def verify(graph):
+    print("\nVerifying data...")
+    result = graph.run("MATCH (d:Disease) RETURN count(d) as count").data()
+    print(f"Total Disease nodes: {result[0]['count']}")
+
+    result = graph.run("MATCH (s:Symptom) RETURN count(s) as count").data()
+    print(f"Total Symptom nodes: {result[0]['count']}")
+
+    result = graph.run("MATCH ()-[r:HAS_SYMPTOM]->() RETURN count(r) as count").data()
+    print(f"Total HAS_SYMPTOM relationships: {result[0]['count']}")
+
+    result = graph.run("MATCH ()-[r:HAS_SYMPTOM]->() WHERE 'symptoms.csv' IN r.sources RETURN count(r) as count").data()
+    print(f"  recorded by symptoms.csv (symptom -> disease): {result[0]['count']}")
+
+    print("\nSample query test:")
+    result = graph.run("""
+    MATCH (d:Disease)-[:HAS_SYMPTOM]->(s:Symptom)
+    RETURN d.name as disease, s.name as symptom
+    LIMIT 5
+    """).data()
+
+    for record in result:
+        print(f"  {record['disease']} -> {record['symptom']}")
+
+    print("\nPrecomputed reverse lookups:")
+    result = graph.run("""
+    MATCH (s:Symptom) WHERE s.disease_count > 0
+    RETURN s.name as symptom, s.disease_count as count, s.diseases[0..3] as diseases
+    ORDER BY s.disease_count DESC
+    LIMIT 3
+    """).data()
+
+    for record in result:
+        print(f"  {record['symptom']} <- {record['count']} diseases, e.g. {', '.join(record['diseases'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import the 39-health CSVs into Neo4j")
+    parser.add_argument("--mode", choices=["bulk", "row", "sync"], default=IMPORT_MODE)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args()
+
+    print("Connecting to Neo4j...")
+    graph = Graph(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+
+    # Unique constraints back every MATCH/MERGE by name; refuse to import if a shape would still scan a label
+    try:
+        provision_neo4j(graph.run, lambda query, params: graph.run("EXPLAIN " + query, params).plan(),
+                        IMPORT_PLAN_SHAPES)
+    except PlanError as e:
+        raise SystemExit(f"Query plan check failed: {e}")
+
+    if args.mode != "sync":
+        print("Clearing existing data...")
+        # GraphMeta keeps the version counter, so snapshot readers still see a bump after a full reload
+        graph.run("MATCH (n:Disease) DETACH DELETE n")
+        graph.run("MATCH (n:Symptom) DETACH DELETE n")
+
+    print("\nStreaming CSV files...")
+    for path in data_files(args.data_dir):
+        print(f"  {path} ({detect_encoding(path)})")
+
+    if args.mode == "bulk":
+        import_bulk(graph, args.data_dir, args.batch_size)
+    elif args.mode == "sync":
+        sync_incremental(graph, args.data_dir, args.batch_size)
+    else:
+        import_rows(graph, args.data_dir, args.batch_size)
+
+    version = graph.run(BUMP_VERSION_QUERY).evaluate()
+    # Stored next to the version, so QA workers render the prompt schema without recomputing it
+    stats = publish_stats(lambda cypher, params=None: graph.run(cypher, params).data())
+
+    print("\n" + "="*70)
+    print(f"Data import completed! (graph version {version})")
+    print("="*70)
+
+    verify(graph)
+
+    print(f"\nGraph statistics ({stats['seconds']:.2f}s):")
+    print(render(stats))
+
+    print("\n" + "="*70)
+    print("Import and verification successful!")
+    print("="*70)
+
+
+if __name__ == "__main__":
+    main()
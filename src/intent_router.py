@@ -0,0 +1,222 @@
+"""
+Template fast path for the common question shapes.
+
+An Aho-Corasick automaton over every Disease and Symptom name and alias in
+data/*.csv links entity mentions in the question; a few cue words decide
+between "disease -> symptoms", "symptom -> diseases" and, for several
+symptoms, "which diseases fit these symptoms" (diagnosis ranking, see
+diagnosis.py). A match is answered with a parameterized Cypher template, and
+only other questions go to the LLM.
+"""
+import os
+import random
+import statistics
+import time
+from collections import deque, namedtuple
+
+from csv_ingest import iter_nodes, iter_records, iter_related_diseases, split_aliases
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+DISEASE_SYMPTOMS = "disease_symptoms"
+SYMPTOM_DISEASES = "symptom_diseases"
+DIAGNOSIS = "diagnosis"
+
+TEMPLATES = {
+    DISEASE_SYMPTOMS: "MATCH (d:Disease {name: $name})-[:HAS_SYMPTOM]->(s:Symptom) RETURN s.name ORDER BY s.name LIMIT 20",
+    SYMPTOM_DISEASES: "MATCH (d:Disease)-[:HAS_SYMPTOM]->(s:Symptom {name: $name}) RETURN d.name ORDER BY d.name LIMIT 20",
+    # The precomputed disease list of every named symptom; the ranking happens client side (diagnosis.rank_lists)
+    DIAGNOSIS: "UNWIND $names AS name MATCH (s:Symptom {name: name}) RETURN s.name AS name, s.diseases AS diseases",
+}
+
+# symptom -> diseases as a single index seek: the disease list the importers precompute on each Symptom,
+# in the same name order as the traversal template
+SYMPTOM_DISEASE_LIST = "MATCH (s:Symptom {name: $name}) RETURN s.diseases AS diseases"
+TEMPLATE_LIMIT = 20
+
+SYMPTOM_CUES = ['症状', '表现', '征兆', '症候', '什么感觉', '哪些不适']
+DISEASE_CUES = ['什么病', '哪些病', '哪些疾病', '什么疾病', '导致', '引起', '原因', '病因', '可能是']
+
+MIN_ENTITY_LENGTH = 2
+
+Mention = namedtuple('Mention', ['start', 'end', 'text', 'name', 'label'])
+Route = namedtuple('Route', ['intent', 'cypher', 'params', 'entities'])
+
+
+class AhoCorasick:
+    """Multi-pattern matcher; each pattern carries a payload returned with its matches."""
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        self.built = False
+
+    def add(self, pattern, payload):
+        node = 0
+        for ch in pattern:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            node = nxt
+        self.output[node].append((len(pattern), payload))
+        self.built = False
+
+    def build(self):
+        queue = deque(self.goto[0].values())
+        for node in queue:
+            self.fail[node] = 0
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+        self.built = True
+
+    def iter_matches(self, text):
+        """Yield (start, end, payload) for every occurrence of every pattern."""
+        if not self.built:
+            self.build()
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for length, payload in self.output[node]:
+                yield i + 1 - length, i + 1, payload
+
+
+class IntentRouter:
+    def __init__(self):
+        self.matcher = AhoCorasick()
+        self.entities = {'Disease': set(), 'Symptom': set()}
+        self.stats = {'template': 0, 'fallback': 0}
+
+    def add_entity(self, name, label, aliases=()):
+        if len(name) >= MIN_ENTITY_LENGTH:
+            self.entities[label].add(name)
+            self.matcher.add(name, (name, label))
+        for alias in aliases:
+            if len(alias) >= MIN_ENTITY_LENGTH and alias != name:
+                self.matcher.add(alias, (name, label))
+
+    @classmethod
+    def from_csv(cls, data_dir=DATA_DIR):
+        router = cls()
+        diseases_csv = os.path.join(data_dir, "diseases.csv")
+        details_csv = os.path.join(data_dir, "disease_details.csv")
+        symptoms_csv = os.path.join(data_dir, "symptoms.csv")
+
+        for path in (diseases_csv, details_csv):
+            for props in iter_nodes(path):
+                router.add_entity(props['name'], 'Disease', split_aliases(props['aliases']))
+            for record in iter_records(path):
+                if record.symptom:
+                    router.add_entity(record.symptom, 'Symptom')
+        for props in iter_nodes(symptoms_csv):
+            router.add_entity(props['name'], 'Symptom', split_aliases(props['aliases']))
+        # Diseases the symptom table links to are graph nodes too, even when no disease table lists them
+        for disease, _ in iter_related_diseases(symptoms_csv):
+            router.add_entity(disease, 'Disease')
+        router.matcher.build()
+        return router
+
+    def link(self, question):
+        """Longest non-overlapping mentions, left to right; one mention may carry both labels."""
+        candidates = {}
+        for start, end, (name, label) in self.matcher.iter_matches(question):
+            candidates.setdefault((start, end), set()).add((name, label))
+
+        mentions = []
+        taken_until = -1
+        for (start, end) in sorted(candidates, key=lambda span: (span[0], -(span[1] - span[0]))):
+            if start < taken_until:
+                continue
+            # Prefer a longer span that starts inside the current one
+            longer = [s for s in candidates if start < s[0] < end and s[1] - s[0] > end - start]
+            if longer:
+                continue
+            for name, label in sorted(candidates[(start, end)]):
+                mentions.append(Mention(start, end, question[start:end], name, label))
+            taken_until = end
+        return mentions
+
+    def classify(self, question, mentions):
+        """(intent, names of the entities it is about), or (None, None)."""
+        diseases = list(dict.fromkeys(m.name for m in mentions if m.label == 'Disease'))
+        symptoms = list(dict.fromkeys(m.name for m in mentions if m.label == 'Symptom'))
+        # Several symptoms mentioned at different places, not one alias that resolves to several names
+        symptom_spans = {(m.start, m.end) for m in mentions if m.label == 'Symptom'}
+        disease_spans = {(m.start, m.end) for m in mentions if m.label == 'Disease'}
+        # A template is about one label; a question naming a disease and a symptom (e.g. "高血压会引起头晕吗")
+        # asks about the pair and goes to the LLM. A mention carrying both labels counts for either.
+        mixed = bool(disease_spans - symptom_spans) and bool(symptom_spans - disease_spans)
+        asks_symptoms = any(cue in question for cue in SYMPTOM_CUES)
+        asks_diseases = any(cue in question for cue in DISEASE_CUES)
+
+        if mixed or asks_symptoms == asks_diseases:
+            return None, None
+        if asks_diseases and len(symptoms) == 1:
+            return SYMPTOM_DISEASES, symptoms
+        if asks_diseases and len(symptom_spans) > 1:
+            return DIAGNOSIS, symptoms
+        if asks_symptoms and len(diseases) == 1:
+            return DISEASE_SYMPTOMS, diseases
+        return None, None
+
+    def route(self, question):
+        """Route for a template question, or None when the LLM should handle it."""
+        mentions = self.link(question)
+        intent, names = self.classify(question, mentions)
+        if intent is None:
+            self.stats['fallback'] += 1
+            return None
+        self.stats['template'] += 1
+        params = {'names': names} if intent == DIAGNOSIS else {'name': names[0]}
+        return Route(intent, TEMPLATES[intent], params, names)
+
+
+def benchmark(questions, router, llm_latency=0.8, seed=0):
+    """Offline comparison of routing latency against a stubbed LLM hop with a fixed latency."""
+    rng = random.Random(seed)
+    latencies = []
+    for question in questions:
+        start = time.perf_counter()
+        route = router.route(question)
+        elapsed = time.perf_counter() - start
+        if route is None:
+            elapsed += llm_latency * rng.uniform(0.8, 1.2)
+        latencies.append(elapsed)
+    latencies.sort()
+    return {
+        'questions': len(questions),
+        'template_ratio': router.stats['template'] / max(1, sum(router.stats.values())),
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+    }
+
+
+if __name__ == "__main__":
+    router = IntentRouter.from_csv()
+    questions = [
+        "宫外孕有哪些症状？",
+        "腰椎间盘突出的症状有哪些？",
+        "哪些疾病会导致胃疼？",
+        "什么病会导致头晕？",
+        "胃脘痛可能是什么病引起的",
+        "头晕、恶心、乏力可能是什么病？",
+        "糖尿病和高血压有什么关系？",
+        "高血压会引起头晕吗？",
+        "头晕是高血压的症状吗？",
+    ]
+    for q in questions:
+        print(q, '->', router.route(q))
+    print(benchmark(questions * 100, IntentRouter.from_csv()))
@@ -0,0 +1,234 @@
+"""
+Deterministic stand-in for the DashScope OpenAI-compatible endpoint.
+
+Serves POST /v1/chat/completions (plain and stream=True) on localhost so the
+QA classes can be pointed at it through their base_url. Replies depend only
+on the prompt: Text-to-Cypher prompts get the gold query from the benchmark
+question set (or a template on the first linked entity), summary prompts get
+an answer built from the result rows. Latency is a fixed time to first token
+plus a per-token delay, with optional jitter seeded by the prompt, so two
+runs with the same settings take the same simulated time.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from answer_cache import estimate_tokens
+from intent_router import DISEASE_SYMPTOMS, SYMPTOM_DISEASES, TEMPLATES
+
+MODEL = "qwen-plus"
+
+# Question line of the Neo4j (LangChain) and TuGraph Text-to-Cypher prompts
+CYPHER_QUESTION = re.compile(r'^Question: (.+)\nLinked entities: (.*)$|^用户问题: "(.+)"\n已链接的实体: (.*)$', re.MULTILINE)
+LINKED_ENTITY = re.compile(r"(Disease|Symptom) '([^']+)'")
+# Summary prompts: everything after the results header is the context
+RESULTS_SECTION = re.compile(r'Database Query Results:\s*(.*?)\n\s*\n|数据库查询结果为：(.*?)。?\s*请用', re.DOTALL)
+CJK_TEXT = re.compile(r'[㐀-鿿]+')
+
+
+def template_cypher(intent, name):
+    return TEMPLATES[intent].replace('$name', "'" + name.replace("'", "\\'") + "'")
+
+
+def cypher_reply(question, entities, gold):
+    """Gold query for a known question, otherwise the template for the first linked entity."""
+    if question in gold:
+        return gold[question]
+    match = LINKED_ENTITY.search(entities or '')
+    if match is None:
+        return "MATCH (d:Disease {name: ''})-[:HAS_SYMPTOM]->(s:Symptom) RETURN s.name ORDER BY s.name LIMIT 20"
+    label, name = match.groups()
+    return template_cypher(DISEASE_SYMPTOMS if label == 'Disease' else SYMPTOM_DISEASES, name)
+
+
+def answer_reply(context, length):
+    """About `length` characters of answer text taken from the names in the results."""
+    names = CJK_TEXT.findall(context)
+    if not names:
+        return "抱歉，数据库中没有找到相关信息。"
+    text = "根据知识图谱，相关结果包括：" + "、".join(names)
+    while len(text) < length:
+        text += "、" + "、".join(names)
+    return text[:max(length, 1)] + "。"
+
+
+class StubLLM:
+    """
+    Reply generator and latency model, independent of the HTTP layer.
+
+    latency: seconds to the first token; token_latency: seconds per further
+    token; jitter: relative spread applied to both, drawn from a generator
+    seeded with (seed, prompt).
+    """
+
+    def __init__(self, gold=None, latency=0.2, token_latency=0.005, jitter=0.0, answer_length=60, seed=0):
+        self.gold = dict(gold or {})
+        self.latency = latency
+        self.token_latency = token_latency
+        self.jitter = jitter
+        self.answer_length = answer_length
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'cypher': 0, 'answer': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+
+    def reply(self, prompt):
+        """(kind, text) for a prompt."""
+        question = CYPHER_QUESTION.search(prompt)
+        if question:
+            text, entities = (question.group(1), question.group(2)) if question.group(1) else question.group(3, 4)
+            return 'cypher', cypher_reply(text, entities, self.gold)
+        results = RESULTS_SECTION.search(prompt)
+        context = (results.group(1) or results.group(2)) if results else ''
+        return 'answer', answer_reply(context, self.answer_length)
+
+    def tokens(self, text):
+        """Split a reply into stream chunks of roughly one token each."""
+        return re.findall(r'[㐀-鿿＀-￯　-〿]|[^㐀-鿿＀-￯　-〿]{1,4}', text)
+
+    def delays(self, prompt):
+        """(time to first token, per-token delay) for this prompt."""
+        rng = random.Random(f"{self.seed}:{prompt}")
+        spread = lambda value: max(0.0, value * (1 + self.jitter * rng.uniform(-1, 1)))
+        return spread(self.latency), spread(self.token_latency)
+
+    def record(self, kind, prompt, text):
+        usage = {'prompt_tokens': estimate_tokens(prompt), 'completion_tokens': estimate_tokens(text)}
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats[kind] += 1
+            self.stats['prompt_tokens'] += usage['prompt_tokens']
+            self.stats['completion_tokens'] += usage['completion_tokens']
+        return usage
+
+
+def make_handler(llm):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            prompt = "\n".join(str(m.get('content', '')) for m in body.get('messages', []))
+            kind, text = llm.reply(prompt)
+            usage = llm.record(kind, prompt, text)
+            tokens = llm.tokens(text)
+            first, per_token = llm.delays(prompt)
+            completion_id = "chatcmpl-" + hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:24]
+            model = body.get('model', MODEL)
+
+            if not body.get('stream'):
+                time.sleep(first + per_token * max(len(tokens) - 1, 0))
+                self._send_json({
+                    'id': completion_id, 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                                 'finish_reason': 'stop'}],
+                    'usage': usage,
+                })
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            time.sleep(first)
+
+            def chunk(choices, **extra):
+                return dict({'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                             'model': model, 'choices': choices}, **extra)
+
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(per_token)
+                delta = {'role': 'assistant', 'content': token} if i == 0 else {'content': token}
+                self._send_event(chunk([{'index': 0, 'delta': delta, 'finish_reason': None}]))
+            self._send_event(chunk([{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]))
+            if (body.get('stream_options') or {}).get('include_usage'):
+                self._send_event(chunk([], usage=usage))
+            self._send_chunk(b'data: [DONE]\n\n')
+            self._send_chunk(b'')
+
+        def _send_json(self, payload):
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_event(self, payload):
+            self._send_chunk(b'data: ' + json.dumps(payload, ensure_ascii=False).encode('utf-8') + b'\n\n')
+
+        def _send_chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+            self.wfile.flush()
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class StubLLMServer:
+    """StubLLM behind a threaded HTTP server; use as a context manager or call start()/stop()."""
+
+    def __init__(self, llm=None, host="127.0.0.1", port=0):
+        self.llm = llm or StubLLM()
+        self.server = ThreadingHTTPServer((host, port), make_handler(self.llm))
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def load_gold(path):
+    """{question: gold Cypher} from a benchmark question set (JSONL)."""
+    with open(path, encoding='utf-8') as f:
+        return {item['question']: item['cypher'] for item in map(json.loads, filter(str.strip, f))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a deterministic OpenAI-compatible chat endpoint")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds to the first token")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="seconds per further token")
+    parser.add_argument("--jitter", type=float, default=0.0, help="relative latency spread, seeded by the prompt")
+    parser.add_argument("--questions", help="benchmark question set whose gold Cypher is returned")
+    args = parser.parse_args()
+
+    llm = StubLLM(load_gold(args.questions) if args.questions else None, args.latency, args.token_latency, args.jitter)
+    server = StubLLMServer(llm, port=args.port).start()
+    print(f"Stub LLM listening on {server.base_url} (model {MODEL}); Ctrl-C to stop")
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,521 @@
+"""
+One QA pipeline over any GraphBackend.
+
+route -> (template | entity link + Text-to-Cypher + guard) -> graph read ->
+answer, with the Cypher cache, answer cache and telemetry spans the Neo4j and
+TuGraph front ends used to duplicate. Reads go to the fastest backend for the
+query shape (ShapeRouter): template intents may be served by any backend that
+supports them, e.g. the primary, a replica of it or an in-memory snapshot;
+generated Cypher only by backends that speak the primary's dialect. The
+primary's dialect hints and result limit go into the Text-to-Cypher prompt,
+with the schema rendered from the primary's measured graph statistics and,
+when a question names several entities, the one to anchor the MATCH on.
+Questions listing several symptoms and asking for the disease go to the
+diagnosis intent (IDF-weighted ranking, diagnosis.py), also callable directly
+as diagnose().
+The rows reach the answer prompt through a ContextPacker (compact table,
+token budget) rather than as indented JSON.
+
+Subclasses change the prompts (cypher_prompt / answer_prompt) and how the
+backend is built; the rest of the pipeline is shared.
+"""
+import time
+
+from langchain_core.prompts import PromptTemplate
+from langchain_openai import ChatOpenAI
+from neo4j import Query
+from openai import OpenAI
+
+from answer_cache import AnswerCache, answer_key
+from context_pack import ContextPacker
+from cypher_cache import CypherCache, cache_path
+from cypher_guard import CypherGuard, GuardError, feedback_prompt
+from entity_index import EntityIndex, format_entities, rewrite_cypher
+from graph_backend import GENERATED, MemoryBackend, ShapeRouter
+from graph_snapshot import SnapshotManager
+from graph_stats import choose_anchor
+from intent_router import DIAGNOSIS, TEMPLATE_LIMIT, TEMPLATES, IntentRouter, Route
+from telemetry import Telemetry, log, openai_usage
+
+MODEL = "qwen-plus"
+NO_RESULT_ANSWER = "抱歉，数据库中没有找到相关信息。"
+
+CYPHER_GENERATION_PROMPT = PromptTemplate(
+    input_variables=["schema", "question", "entities"],
+    partial_variables={"feedback": "", "dialect": ""},
+    template="""
+You are an expert in converting natural language questions to Neo4j Cypher queries.
+
+Graph Schema:
+{schema}
+
+Instructions:
+- Use only the node labels and relationship types from the schema above
+- For Chinese medical terms, use exact string matching with the name property
+- When the question mentions a linked entity below, match it by its exact name, not by the words used in the question
+- Return ONLY the Cypher query without any explanation or markdown formatting
+- Add LIMIT clause to restrict results when appropriate
+{dialect}
+Few-shot Examples:
+
+Question: 糖尿病有哪些症状？
+Cypher: MATCH (d:Disease {{name: '糖尿病'}})-[:HAS_SYMPTOM]->(s:Symptom) RETURN s.name ORDER BY s.name LIMIT 20
+
+Question: 哪些疾病会导致头晕？
+Cypher: MATCH (d:Disease)-[:HAS_SYMPTOM]->(s:Symptom {{name: '头晕'}}) RETURN d.name ORDER BY d.name LIMIT 20
+
+Question: 腰椎间盘突出的症状
+Cypher: MATCH (d:Disease {{name: '腰椎间盘突出'}})-[:HAS_SYMPTOM]->(s:Symptom) RETURN s.name ORDER BY s.name LIMIT 20
+
+Now generate the Cypher query for this question:
+
+Question: {question}
+Linked entities: {entities}
+{feedback}
+Cypher Query:
+"""
+)
+
+ANSWER_GENERATION_PROMPT = PromptTemplate(
+    input_variables=["question", "context"],
+    template="""
+You are a medical knowledge assistant. Based on the query results from the knowledge graph, provide a clear and accurate answer in Chinese.
+
+Question: {question}
+
+Database Query Results:
+{context}
+
+Please provide a natural, informative answer based on the results above. If there are no results, politely state that the information is not available in the database.
+
+Answer:
+"""
+)
+
+
+def dialect_hints(dialect):
+    """Instruction lines for the Text-to-Cypher prompt."""
+    lines = [f"- {hint}" for hint in dialect.hints]
+    lines.append(f"- Use LIMIT {dialect.result_limit} unless the question asks for a different number")
+    return "\n".join(lines) + "\n"
+
+
+class GraphQA:
+    """
+    Question answering over `backend` (the primary, which also takes the guard's EXPLAIN).
+
+    read_backends: further backends reads may be routed to; use_snapshot adds
+    an in-memory snapshot of the primary that reloads on graph version bumps.
+    schema: fixed prompt schema text; when omitted it is rendered from the
+    primary's graph statistics and follows the graph version.
+    """
+
+    answer_temperature = 0
+    # Prompt schema when the statistics cannot be read
+    fallback_schema = "Schema fetch failed"
+
+    def __init__(self, backend, api_key, base_url, model=MODEL, schema=None, read_backends=(), use_snapshot=False,
+                 router=None, cypher_cache=None, answer_cache=None, entity_index=None, guard=None, telemetry=None,
+                 shape_router=None, packer=None):
+        # Stage latencies, token usage and cache hits as metrics, plus one span tree per question
+        self.telemetry = telemetry or Telemetry(backend.name)
+        self.backend = backend
+        self.backends = [backend] + list(read_backends)
+        # Optional in-memory read engine for template queries, reloaded on graph version bumps
+        self.snapshot = MemoryBackend(SnapshotManager(backend.run), name="snapshot") if use_snapshot else None
+        if self.snapshot:
+            self.backends.append(self.snapshot)
+        # Per query shape latency averages that decide which backend serves a read
+        self.shape_router = shape_router or ShapeRouter()
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self._client = None
+        self._chat_model = None
+        self.fixed_schema = schema
+        # The schema structure (not the counts, which move with every import) is part of the cache key,
+        # so a schema change invalidates old Cypher; one cache file per backend
+        self.cypher_cache = cypher_cache or CypherCache(path=cache_path(backend.name), purge=False)
+        self.sync_cache_schema()
+        self.router = router or IntentRouter.from_csv()
+        # Resolves paraphrases and aliases in generated Cypher to exact node names
+        self.entity_index = entity_index or EntityIndex.from_csv()
+        # Checks LLM-generated Cypher (read-only, LIMIT, path bounds, EXPLAIN cost) before it runs
+        self.guard = guard or CypherGuard(explain=backend.explain)
+        # Summaries shared by paraphrases that return the same rows; cleared on graph version bumps
+        self.answer_cache = answer_cache or AnswerCache(version=self.graph_version)
+        # Fits the rows into the answer prompt's token budget
+        self.packer = packer or ContextPacker.from_csv()
+
+    def schema_text(self, detail=True):
+        if self.fixed_schema is not None:
+            return self.fixed_schema
+        try:
+            return self.backend.schema(detail)
+        except Exception as e:
+            log.error(f"Schema fetch failed: {e}")
+            return self.fallback_schema
+
+    @property
+    def schema(self):
+        return self.schema_text()
+
+    def sync_cache_schema(self):
+        """Key the Cypher cache on the current schema structure; the fallback schema purges nothing."""
+        schema = self.schema_text(detail=False)
+        self.cypher_cache.set_schema(schema, purge=schema != self.fallback_schema)
+
+    def anchor(self, matches):
+        """Linked entity to start the MATCH from, by measured degree; None for a single entity or without statistics."""
+        if len(matches) < 2 or self.fixed_schema is not None:
+            return None
+        try:
+            return choose_anchor(self.backend.graph_stats(), [(m.name, m.label) for m in matches])
+        except Exception as e:
+            log.warning(f"Anchor choice skipped: {e}")
+            return None
+
+    @property
+    def client(self):
+        # Built on first use so workers that only serve template questions never create a client
+        if self._client is None:
+            self._client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        return self._client
+
+    @property
+    def chat_model(self):
+        # LangChain chat model for streamed answers, built on first use like the client
+        if self._chat_model is None:
+            self._chat_model = ChatOpenAI(model=self.model, api_key=self.api_key, base_url=self.base_url,
+                                          temperature=self.answer_temperature, streaming=True, stream_usage=True)
+        return self._chat_model
+
+    def close(self):
+        for backend in self.backends:
+            backend.close()
+        self.cypher_cache.close()
+
+    def graph_version(self):
+        return (self.snapshot or self.backend).version()
+
+    def execute_cypher(self, cypher, params=None):
+        """Run a trusted query on the primary; LLM output goes through guarded_cypher() first."""
+        return self.backend.run(cypher, params)
+
+    def explain(self, cypher, params=None):
+        return self.backend.explain(cypher, params)
+
+    # Prompts
+
+    def cypher_prompt(self, question, entities, feedback=""):
+        return CYPHER_GENERATION_PROMPT.format(schema=self.schema, question=question, entities=entities,
+                                               feedback=feedback, dialect=dialect_hints(self.backend.dialect))
+
+    def answer_prompt(self, question, context):
+        """context is a PackedContext."""
+        return ANSWER_GENERATION_PROMPT.format(question=question, context=context.text)
+
+    # Stages
+
+    def generate_cypher(self, question, feedback=""):
+        """Text-to-Cypher from the LLM; feedback (from feedback_prompt) asks for a corrected query."""
+        with self.telemetry.span("entity_link"):
+            matches = self.entity_index.link(question)
+            entities = format_entities(matches)
+            anchor = self.anchor(matches)
+            if anchor:
+                entities += f"; start the MATCH from {anchor[1]} '{anchor[0]}' (fewest relationships)"
+        with self.telemetry.span("cypher_llm", retry=bool(feedback)):
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": self.cypher_prompt(question, entities, feedback)}],
+                temperature=0
+            )
+            self.telemetry.llm_usage("cypher", *openai_usage(response))
+        cypher = response.choices[0].message.content.strip()
+        cypher = cypher.replace("```cypher", "").replace("```", "").strip()
+        # The model may still write CONTAINS or an alias; rewrite to an exact-name match
+        return rewrite_cypher(cypher, self.entity_index)
+
+    def guarded_cypher(self, question, cypher, llm_seconds=None):
+        """
+        Guard-approved query text; a rejected query gets one regeneration with the reason as feedback.
+
+        Text the LLM just wrote (llm_seconds set, or the regeneration) is cached
+        only once approved, as the guard returned it (LIMIT clamped).
+        """
+        try:
+            with self.telemetry.span("guard"):
+                text = self.guard.prepare(cypher).text
+        except GuardError as e:
+            log.warning(f"\n[Guard] Rejected generated Cypher: {e}")
+            self.cypher_cache.invalidate(question)
+            start = time.perf_counter()
+            cypher = self.generate_cypher(question, feedback=feedback_prompt(cypher, e))
+            llm_seconds = (llm_seconds or 0.0) + time.perf_counter() - start
+            with self.telemetry.span("guard", retry=True):
+                text = self.guard.prepare(cypher).text
+        if llm_seconds is not None:
+            self.cypher_cache.put(question, text, llm_seconds=llm_seconds)
+        return text
+
+    def question_cypher(self, question):
+        """Guard-approved Cypher for a question: the cached text, or LLM-generated."""
+        # The statistics are re-read once per check interval, so this follows a schema change after an import
+        self.sync_cache_schema()
+        cached = self.cypher_cache.get(question)
+        self.telemetry.cache("cypher", cached is not None)
+        if cached:
+            return self.guarded_cypher(question, cached)
+        start = time.perf_counter()
+        cypher = self.generate_cypher(question)
+        return self.guarded_cypher(question, cypher, llm_seconds=time.perf_counter() - start)
+
+    def plan(self, question):
+        """(route, cypher, params): a template route when one matches, otherwise LLM-generated Cypher."""
+        with self.telemetry.span("route") as span:
+            route = self.router.route(question)
+            span.set(intent=route.intent if route else None)
+        if route:
+            if route.intent == DIAGNOSIS:
+                # The IDF weights need the number of diseases, which the graph statistics carry
+                route = route._replace(params=dict(route.params, total=self.disease_count()))
+            return route, route.cypher, route.params
+        return None, self.question_cypher(question), None
+
+    def disease_count(self):
+        """Disease nodes in the current graph version, or None when the statistics cannot be read."""
+        try:
+            return self.backend.graph_stats()['nodes']['Disease']['count']
+        except Exception as e:
+            log.warning(f"Disease count unavailable: {e}")
+            return None
+
+    def diagnose(self, symptoms, limit=TEMPLATE_LIMIT):
+        """
+        Diseases ranked for a set of symptom names (exact node names), without an LLM call.
+
+        Up to `limit` (at most TEMPLATE_LIMIT) rows {'d.name', 'score', 'matched'}, best first.
+        """
+        names = list(dict.fromkeys(symptoms))
+        route = Route(DIAGNOSIS, TEMPLATES[DIAGNOSIS], {'names': names, 'total': self.disease_count()}, names)
+        return self.fetch(route, route.cypher, route.params)[:limit]
+
+    def read_backend(self, shape):
+        """The backend a read of `shape` (a template intent or GENERATED) goes to."""
+        if shape == GENERATED:
+            candidates = [b for b in self.backends if b.dialect.name == self.backend.dialect.name]
+        else:
+            candidates = [b for b in self.backends if b.supports(shape)]
+        return self.shape_router.choose(shape, candidates)
+
+    def fetch(self, route, cypher, params):
+        shape = route.intent if route else GENERATED
+        backend = self.read_backend(shape)
+        with self.telemetry.span("db", source=backend.name):
+            start = time.perf_counter()
+            if route:
+                rows = backend.template_rows(route.intent, params)
+            else:
+                # Server-side transaction timeout for generated queries
+                rows = backend.run(Query(cypher, timeout=self.guard.timeout), params)
+            self.shape_router.record(shape, backend, time.perf_counter() - start)
+            self.telemetry.rows(len(rows))
+            return rows
+
+    def fetch_templates(self, routes):
+        """Rows for each template route; the reads going to one backend share a single batch."""
+        results = [None] * len(routes)
+        groups = {}
+        for i, route in enumerate(routes):
+            backend = self.read_backend(route.intent)
+            groups.setdefault(backend.name, (backend, []))[1].append(i)
+        for backend, indexes in groups.values():
+            with self.telemetry.span("db", source=backend.name, batch=len(indexes)):
+                start = time.perf_counter()
+                rows = backend.template_rows_batch([(routes[i].intent, routes[i].params) for i in indexes])
+                seconds = (time.perf_counter() - start) / len(indexes)
+                for i, batch_rows in zip(indexes, rows):
+                    self.shape_router.record(routes[i].intent, backend, seconds)
+                    self.telemetry.rows(len(batch_rows))
+                    results[i] = batch_rows
+        return results
+
+    def pack(self, question, rows):
+        """The rows as a PackedContext for the answer prompt."""
+        context = self.packer.pack(rows, question)
+        self.telemetry.context(context.tokens, context.baseline_tokens)
+        return context
+
+    def answer_key(self, route, cypher, params, context):
+        if route:
+            return answer_key(route.intent, route.entities, context.rows)
+        return answer_key(None, (), context.rows, cypher, params)
+
+    def cached_answer(self, question, route, cypher, params, rows):
+        """The answer for `rows`, through the answer cache; no rows means no LLM call."""
+        if not rows:
+            return NO_RESULT_ANSWER
+        context = self.pack(question, rows)
+        key = self.answer_key(route, cypher, params, context)
+        answer = self.answer_cache.get(key)
+        self.telemetry.cache("answer", answer is not None)
+        if answer is None:
+            prompt = self.answer_prompt(question, context)
+            with self.telemetry.span("answer_llm"):
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=self.answer_temperature
+                )
+                self.telemetry.llm_usage("answer", *openai_usage(response))
+            answer = response.choices[0].message.content.strip()
+            self.answer_cache.put(key, answer, response.usage.total_tokens if response.usage else None,
+                                  prompt=prompt)
+        return answer
+
+    def stream_answer(self, question, context):
+        """Yield answer text chunks as the LLM produces them (LangChain chat model stream)."""
+        with self.telemetry.span("answer_llm", stream=True):
+            for chunk in self.chat_model.stream(self.answer_prompt(question, context)):
+                if chunk.usage_metadata:
+                    self.telemetry.llm_usage("answer", chunk.usage_metadata["input_tokens"],
+                                             chunk.usage_metadata["output_tokens"])
+                if chunk.content:
+                    yield chunk.content
+
+    # Entry points
+
+    def query_stream(self, question):
+        """
+        Answer a question as a stream of events.
+
+        Yields dicts with an "event" key and "elapsed" seconds since the call:
+        "cypher" (cypher, params, intent), "rows" (rows), one "token" (text) per
+        answer chunk, then "done" (answer, timings). On failure the last event is
+        "error" (stage, error). timings holds per-stage durations plus
+        first_token, the time to the first answer chunk. An answer served from
+        the answer cache, or the no-result answer, arrives as a single token event.
+        """
+        with self.telemetry.question(question) as root:
+            started = time.perf_counter()
+            timings = {}
+            stage = "cypher"
+            try:
+                route, cypher, params = self.plan(question)
+                timings["cypher"] = time.perf_counter() - started
+                yield {"event": "cypher", "elapsed": timings["cypher"], "cypher": cypher, "params": params,
+                       "intent": route.intent if route else None}
+
+                stage = "db"
+                t = time.perf_counter()
+                rows = self.fetch(route, cypher, params)
+                timings["db"] = time.perf_counter() - t
+                yield {"event": "rows", "elapsed": time.perf_counter() - started, "rows": rows}
+
+                stage = "answer"
+                t = time.perf_counter()
+                context = self.pack(question, rows) if rows else None
+                key = self.answer_key(route, cypher, params, context) if context else None
+                cached = self.answer_cache.get(key) if context else None
+                if context:
+                    self.telemetry.cache("answer", cached is not None)
+                if not context:
+                    chunks = [NO_RESULT_ANSWER]
+                elif cached is not None:
+                    chunks = [cached]
+                else:
+                    chunks = self.stream_answer(question, context)
+                answer = []
+                for text in chunks:
+                    if not answer:
+                        timings["first_token"] = time.perf_counter() - started
+                        self.telemetry.observe("first_token", timings["first_token"])
+                    answer.append(text)
+                    yield {"event": "token", "elapsed": time.perf_counter() - started, "text": text,
+                           "cached": cached is not None}
+                if context and cached is None:
+                    self.answer_cache.put(key, "".join(answer).strip(), prompt=self.answer_prompt(question, context))
+                timings["answer"] = time.perf_counter() - t
+                timings["total"] = time.perf_counter() - started
+                yield {"event": "done", "elapsed": timings["total"], "answer": "".join(answer).strip(),
+                       "timings": timings}
+            except Exception as e:
+                root.status = f"error: {e.__class__.__name__}"
+                yield {"event": "error", "elapsed": time.perf_counter() - started, "stage": stage,
+                       "error": f"{e.__class__.__name__}: {e}"}
+
+    def result(self, question, route, cypher, params, rows, answer):
+        return {
+            "question": question,
+            "cypher": cypher,
+            "params": params,
+            "intent": route.intent if route else None,
+            "intermediate_steps": [
+                {"query": cypher},
+                {"context": rows}
+            ],
+            "result": answer
+        }
+
+    def query(self, question):
+        """Answer one question; returns the result dict, or None on failure (logged)."""
+        with self.telemetry.question(question) as root:
+            log.info(f"\nQuestion: {question}")
+            try:
+                route, cypher, params = self.plan(question)
+                if route:
+                    log.info(f"\n[Step 1] Template Cypher Query ({route.intent}, no LLM call):")
+                    log.info(f"{cypher}  params={params}")
+                else:
+                    log.info(f"\n[Step 1] Generated Cypher Query:")
+                    log.info(f"{cypher}")
+
+                rows = self.fetch(route, cypher, params)
+                log.info(f"\n[Step 2] Database Query Results:")
+                log.info(f"Found {len(rows)} results")
+                for idx, record in enumerate(rows[:10], 1):
+                    log.info(f"  {idx}. {record}")
+                if len(rows) > 10:
+                    log.info(f"  ... and {len(rows) - 10} more results")
+
+                answer = self.cached_answer(question, route, cypher, params, rows)
+                log.info(f"\n[Step 3] Generated Natural Language Answer:")
+                log.info(f"{answer}")
+                log.info(f"\n✓ Status: SUCCESS")
+                return self.result(question, route, cypher, params, rows, answer)
+            except Exception as e:
+                root.status = f"error: {e.__class__.__name__}"
+                log.error(f"\n✗ Error: {e}", exc_info=True)
+                return None
+
+    def query_batch(self, questions):
+        """
+        query() for several questions at once, without the per-question logging.
+
+        Template lookups are sent as one batch per backend instead of one round
+        trip each. Returns a result dict per question, None where it failed.
+        """
+        with self.telemetry.span("batch", questions=len(questions)):
+            plans = {}
+            for i, question in enumerate(questions):
+                try:
+                    plans[i] = self.plan(question)
+                except Exception as e:
+                    log.error(f"\n✗ Error planning {question!r}: {e}")
+            templates = [i for i, (route, _, _) in plans.items() if route]
+            rows = dict(zip(templates, self.fetch_templates([plans[i][0] for i in templates])))
+            results = [None] * len(questions)
+            for i, (route, cypher, params) in plans.items():
+                try:
+                    if i not in rows:
+                        rows[i] = self.fetch(route, cypher, params)
+                    answer = self.cached_answer(questions[i], route, cypher, params, rows[i])
+                except Exception as e:
+                    log.error(f"\n✗ Error on {questions[i]!r}: {e}")
+                    continue
+                results[i] = self.result(questions[i], route, cypher, params, rows[i], answer)
+            return results
+
+    def backend_stats(self):
+        return self.shape_router.stats()
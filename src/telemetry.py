@@ -0,0 +1,311 @@
+"""
+Instrumentation for the Text-to-Cypher pipeline.
+
+* Prometheus-style counters and histograms in a process-wide registry,
+  rendered in the text exposition format (render_metrics / serve_metrics)
+* a span tree per question: Telemetry.question() opens the root span and
+  Telemetry.span() nests stages under whatever span is current (tracked in a
+  contextvar, so concurrent asyncio tasks keep separate trees)
+* logging: the QA modules log through the "kgqa" logger instead of printing;
+  setup_logging() keeps the old console output at INFO and can add a JSONL
+  file that also receives one finished span tree per question
+"""
+import bisect
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROW_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 500, 1000)
+
+log = logging.getLogger("kgqa")
+trace_log = logging.getLogger("kgqa.trace")
+
+
+def _label_text(labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_label_text(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.series = {}            # labels -> [per-bucket counts (+Inf last), sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.series.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def quantile(self, q, **labels):
+        """Upper bound of the bucket holding the q-quantile (as Prometheus' histogram_quantile, without interpolation)."""
+        series = self.series.get(tuple(sorted(labels.items())))
+        if not series or not series[2]:
+            return None
+        running = 0
+        for bound, count in zip(self.buckets + (float('inf'),), series[0]):
+            running += count
+            if running >= q * series[2]:
+                return bound
+        return float('inf')
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self.series.items()):
+            running = 0
+            for bound, c in zip(self.buckets + ('+Inf',), counts):
+                running += c
+                lines.append(f"{self.name}_bucket{_label_text(key, [('le', bound)])} {running}")
+            lines.append(f"{self.name}_sum{_label_text(key)} {total}")
+            lines.append(f"{self.name}_count{_label_text(key)} {count}")
+        return lines
+
+
+REGISTRY = {}
+
+
+def counter(name, help_text):
+    return REGISTRY.setdefault(name, Counter(name, help_text))
+
+
+def histogram(name, help_text, buckets=LATENCY_BUCKETS):
+    return REGISTRY.setdefault(name, Histogram(name, help_text, buckets))
+
+
+STAGE_SECONDS = histogram("kgqa_stage_seconds", "Latency of each QA pipeline stage")
+DB_ROWS = histogram("kgqa_db_rows", "Rows returned by the graph query", ROW_BUCKETS)
+LLM_TOKENS = counter("kgqa_llm_tokens_total", "LLM tokens by call and kind (prompt/completion)")
+CACHE_EVENTS = counter("kgqa_cache_events_total", "Cache lookups by cache and result (hit/miss)")
+CONTEXT_TOKENS = counter("kgqa_context_tokens_total",
+                         "Answer prompt context tokens by kind (packed, and baseline for the old JSON layout)")
+QUESTIONS = counter("kgqa_questions_total", "Questions answered by outcome")
+
+
+def render_metrics():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY.values():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def serve_metrics(port=9464, host="0.0.0.0"):
+    """Serve /metrics from a daemon thread; returns the server (call shutdown() to stop)."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = render_metrics().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Span:
+    def __init__(self, name, attributes=None):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.children = []
+        self.status = "ok"
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "status": self.status,
+            "attributes": self.attributes,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+_current_span = contextvars.ContextVar("kgqa_span", default=None)
+
+
+class Telemetry:
+    """Per-backend handle on the shared metrics; traces are kept only when tracing is on."""
+
+    def __init__(self, backend, tracing=True):
+        self.backend = backend
+        self.tracing = tracing
+
+    @contextmanager
+    def span(self, stage, **attributes):
+        """Time one stage into kgqa_stage_seconds{stage} and nest it under the current span."""
+        parent = _current_span.get()
+        span = Span(stage, attributes)
+        if parent is not None:
+            parent.children.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            if span.status == "ok":
+                span.status = f"error: {e.__class__.__name__}"
+            raise
+        finally:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # A streaming generator closed from another context; its span is simply not current there
+                pass
+            span.duration = time.perf_counter() - span.started
+            STAGE_SECONDS.observe(span.duration, backend=self.backend, stage=stage)
+
+    @contextmanager
+    def question(self, question):
+        """Root span for one question; the finished tree goes to the kgqa.trace logger."""
+        with self.span("total", question=question) as root:
+            try:
+                yield root
+            except BaseException as e:
+                root.status = f"error: {e.__class__.__name__}"
+                raise
+            finally:
+                QUESTIONS.inc(backend=self.backend, outcome="ok" if root.status == "ok" else "error")
+                if self.tracing:
+                    root.duration = time.perf_counter() - root.started
+                    trace_log.info(root.name, extra={"backend": self.backend, "trace": root.to_dict()})
+
+    def observe(self, stage, seconds):
+        """Record a duration that is not a span of its own, e.g. time to first token."""
+        STAGE_SECONDS.observe(seconds, backend=self.backend, stage=stage)
+        self.annotate(**{f"{stage}_seconds": seconds})
+
+    def current(self):
+        return _current_span.get()
+
+    def annotate(self, **attributes):
+        span = _current_span.get()
+        if span is not None:
+            span.set(**attributes)
+
+    def llm_usage(self, call, prompt_tokens, completion_tokens):
+        if prompt_tokens is not None:
+            LLM_TOKENS.inc(prompt_tokens, backend=self.backend, call=call, kind="prompt")
+        if completion_tokens is not None:
+            LLM_TOKENS.inc(completion_tokens, backend=self.backend, call=call, kind="completion")
+        self.annotate(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def cache(self, cache, hit):
+        CACHE_EVENTS.inc(backend=self.backend, cache=cache, result="hit" if hit else "miss")
+        self.annotate(**{f"{cache}_cache": "hit" if hit else "miss"})
+
+    def context(self, tokens, baseline_tokens):
+        """Tokens of the packed answer context, next to what the unpacked JSON would have cost."""
+        CONTEXT_TOKENS.inc(tokens, backend=self.backend, kind="packed")
+        CONTEXT_TOKENS.inc(baseline_tokens, backend=self.backend, kind="baseline")
+        self.annotate(context_tokens=tokens, context_tokens_saved=baseline_tokens - tokens)
+
+    def rows(self, count):
+        DB_ROWS.observe(count, backend=self.backend)
+        self.annotate(rows=count)
+
+
+def langchain_usage(response):
+    """(prompt, completion) tokens from a LangChain AIMessage, None when not reported."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    return usage.get("input_tokens"), usage.get("output_tokens")
+
+
+def openai_usage(response):
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None, None
+    return usage.prompt_tokens, usage.completion_tokens
+
+
+class JsonlHandler(logging.Handler):
+    """One JSON object per log record; extra fields (e.g. trace) are included."""
+
+    STANDARD = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def __init__(self, path):
+        super().__init__()
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock_file = threading.Lock()
+
+    def emit(self, record):
+        entry = {"ts": record.created, "level": record.levelname, "logger": record.name,
+                 "message": record.getMessage()}
+        entry.update({k: v for k, v in vars(record).items() if k not in self.STANDARD})
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self.lock_file:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+def setup_logging(level=None, jsonl_path=None):
+    """
+    Console output as before (message only); optionally every record and trace as JSONL too.
+
+    Defaults come from KGQA_LOG_LEVEL (INFO) and KGQA_LOG_JSONL (off).
+    """
+    level = level or os.getenv("KGQA_LOG_LEVEL", "INFO")
+    jsonl_path = jsonl_path or os.getenv("KGQA_LOG_JSONL")
+    root = logging.getLogger("kgqa")
+    root.setLevel(logging.DEBUG)
+    if not any(getattr(h, "kgqa_console", False) for h in root.handlers):
+        console = logging.StreamHandler()
+        console.setFormatter(logging.Formatter("%(message)s"))
+        console.addFilter(lambda record: record.name != "kgqa.trace")
+        console.kgqa_console = True
+        root.addHandler(console)
+    for handler in root.handlers:
+        if getattr(handler, "kgqa_console", False):
+            handler.setLevel(level)
+    if jsonl_path:
+        root.addHandler(JsonlHandler(jsonl_path))
+    return root